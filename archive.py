@@ -0,0 +1,125 @@
+# archive.py - ARCHIVO DE CITAS TERMINADAS Y BLOQUES PASADOS
+#
+# `appointments` y `availability_blocks` solo crecen, pero casi todas las
+# consultas calientes (disponibilidad, detección de choques, reservas)
+# miran fechas futuras. Una tarea periódica mueve a las tablas de archivo
+# (appointments_archive, availability_blocks_archive) las citas completadas
+# o canceladas y los bloques que terminaron hace más de ARCHIVE_AFTER_DAYS,
+# así las tablas calientes y sus índices quedan chicos y en caché.
+#
+# Se mueven por tandas de ARCHIVE_BATCH filas, cada una en su transacción
+# (INSERT ... SELECT + DELETE por id). Los ids se conservan, así que los
+# cursores de paginación siguen valiendo; las tablas calientes usan
+# AUTOINCREMENT en SQLite (migración 11) para que un id archivado no se
+# vuelva a asignar. Las citas "agendada" nunca se
+# archivan. El resumen del panel no cambia: sus triggers restan en la tabla
+# caliente y suman en la de archivo (ver dashboard.py).
+#
+# Los historiales leen las dos tablas cuando el rango pedido llega antes
+# del horizonte (may_contain); los rangos futuros no tocan el archivo.
+# Achicar ARCHIVE_AFTER_DAYS es seguro; si se agranda, las filas ya
+# archivadas más nuevas que el nuevo horizonte solo aparecen en los
+# historiales sin rango de fechas.
+#
+# En Postgres se usan las mismas tablas en vez de particiones por rango:
+# una tabla particionada exige la columna de partición en cada restricción
+# única y de exclusión, y los EXCLUDE contra solapes (migración 4) no la
+# pueden incluir.
+#
+# ARCHIVE_AFTER_DAYS        antigüedad (por end_time) a partir de la cual se archiva
+# ARCHIVE_BATCH             filas por transacción
+# ARCHIVE_INTERVAL_SECONDS  cada cuánto corre la tarea de archivo
+
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.types import DateTime
+import database
+import jobs
+import models
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "1000"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", str(24 * 3600)))
+
+# Estados terminales: lo que ya no puede volver a ocupar un turno
+ARCHIVABLE_STATUSES = (models.AppointmentStatus.COMPLETADA.value,) + models.CANCELLED_STATUSES
+
+def horizon(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+def may_contain(start_date: Optional[datetime]) -> bool:
+    """
+    ¿Un rango que empieza en `start_date` (None = sin límite) puede incluir
+    filas archivadas? Todas terminan antes del horizonte.
+    """
+    if start_date is None:
+        return True
+    if start_date.tzinfo is not None:
+        start_date = start_date.replace(tzinfo=None) - start_date.utcoffset()
+    return start_date < horizon()
+
+# --- Movimiento a las tablas de archivo ---
+
+def _move(conn, live, archived, condition, batch, now) -> int:
+    """
+    Mueve hasta `batch` filas de `live` que cumplen `condition` a `archived`.
+    En Postgres las bloquea primero (saltando las tomadas por otra
+    transacción) para que nadie las cambie entre la copia y el borrado.
+    """
+    query = select(live.c.id).where(condition).order_by(live.c.id).limit(batch)
+    if conn.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    ids = conn.execute(query).scalars().all()
+    if not ids:
+        return 0
+    columns = [column.name for column in archived.columns if column.name in live.c]
+    conn.execute(insert(archived).from_select(
+        columns + ["archived_at"],
+        select(*(live.c[name] for name in columns), literal(now, DateTime)).where(live.c.id.in_(ids), condition),
+    ))
+    # Se repite la condición: en SQLite la lectura de ids queda fuera de la
+    # transacción de escritura, y una fila pudo cambiar de estado entretanto
+    return conn.execute(delete(live).where(live.c.id.in_(ids), condition)).rowcount
+
+def archive_batch(engine, batch=ARCHIVE_BATCH, now=None) -> Tuple[int, int]:
+    """
+    Una tanda en una transacción. Devuelve (citas, bloques) movidos.
+    """
+    now = now or datetime.utcnow()
+    cutoff = horizon(now)
+    appointments = models.Appointment.__table__
+    blocks = models.AvailabilityBlock.__table__
+    with engine.begin() as conn:
+        moved_appointments = _move(
+            conn, appointments, models.ArchivedAppointment.__table__,
+            (appointments.c.end_time < cutoff) & appointments.c.status.in_(ARCHIVABLE_STATUSES),
+            batch, now,
+        )
+        moved_blocks = _move(
+            conn, blocks, models.ArchivedAvailabilityBlock.__table__,
+            blocks.c.end_time < cutoff,
+            batch, now,
+        )
+    return moved_appointments, moved_blocks
+
+def archive(engine, batch=ARCHIVE_BATCH, now=None) -> Tuple[int, int]:
+    """
+    Archiva todo lo que pasó el horizonte, tanda por tanda.
+    """
+    total_appointments = total_blocks = 0
+    while True:
+        appointments, blocks = archive_batch(engine, batch, now)
+        total_appointments += appointments
+        total_blocks += blocks
+        if appointments < batch and blocks < batch:
+            return total_appointments, total_blocks
+
+@jobs.job("archive_history", max_attempts=3, concurrency=1, every=ARCHIVE_INTERVAL_SECONDS)
+def archive_job(payload):
+    appointments, blocks = archive(database.get_engine())
+    jobs.logger.info("archive_done", extra={"appointments": appointments, "blocks": blocks})
+
+def schedule_archive():
+    jobs.schedule_periodic("archive_history", ARCHIVE_INTERVAL_SECONDS)
@@ -1,13 +1,18 @@
 # auth.py - VERSIÓN FINAL Y CORRECTA PARA GESTIÓN DE PERFILES
 
 import jwt
-from fastapi import HTTPException, Security, Depends
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import HTTPException, Request, Depends
 from fastapi.security import HTTPBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 import models
 import database
+import hashing
+from cache import TTLCache
 
 # --- Dependencias Reutilizables ---
 
@@ -15,34 +20,47 @@ def get_db():
     """
     Dependencia de FastAPI para obtener una sesión de base de datos.
     """
-    db = database.SessionLocal()
+    db = database.get_session()
     try:
         yield db
     finally:
         db.close()
 
+async def get_async_db():
+    """
+    Versión asíncrona de get_db para los endpoints `async def`.
+    """
+    database.get_async_engine()
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
 # --- Clase de Autenticación ---
 
 class AuthHandler():
     security = HTTPBearer()
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = hashing.pwd_context
     
     # Estos deberían estar en variables de entorno
     SECRET_KEY = "MI_CLAVE_SECRETA_SUPER_SECRETA" 
     ALGORITHM = "HS256"
     
+    # El hashing corre en el pool de procesos de hashing.py
     def get_password_hash(self, password):
-        return self.pwd_context.hash(password)
+        return hashing.hash_password(password)
 
     def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return hashing.verify_password(plain_password, hashed_password)
 
-    def encode_token(self, user_id, user_email):
+    def verify_and_update(self, plain_password, hashed_password):
+        return hashing.verify_and_update(plain_password, hashed_password)
+
+    def encode_token(self, user_id, user_email, user_role=None):
         payload = {
             'exp': datetime.utcnow() + timedelta(days=0, hours=1),
             'iat': datetime.utcnow(),
             'sub': str(user_id), # Es buena práctica asegurar que 'sub' sea un string
-            'email': user_email
+            'email': user_email,
+            'role': user_role, # Permite autorizar sin ir a la BD (ver get_token_claims)
         }
         return jwt.encode(payload, self.SECRET_KEY, algorithm=self.ALGORITHM)
 
@@ -55,31 +73,182 @@ class AuthHandler():
         except jwt.InvalidTokenError:
             raise HTTPException(status_code=401, detail='Token inválido')
 
-# --- Dependencia Principal de Usuario Autenticado ---
+# --- Cachés de autenticación ---
+# Tokens ya decodificados (clave: el token) y filas de usuario (clave: 'sub').
+# Así los endpoints baratos no pagan un SELECT en `users` en cada petición.
+# Toda escritura sobre un usuario o su perfil debe llamar a invalidate_user.
 
-auth_handler = AuthHandler() # Creamos una instancia global para usar en la dependencia
+token_cache = TTLCache(maxsize=10_000, ttl=60)
+user_cache = TTLCache(maxsize=10_000, ttl=60)
 
-def get_current_user(token: str = Depends(auth_handler.security), db: Session = Depends(get_db)):
+# Columnas de User que se guardan en caché
+_USER_COLUMNS = ("id", "email", "hashed_password", "role")
+
+def invalidate_user(user_id):
+    user_cache.pop(int(user_id))
+
+def cache_stats():
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
+
+@dataclass(frozen=True)
+class TokenClaims:
     """
-    Decodifica el token, obtiene el ID del usuario, busca al usuario en la BD
-    y devuelve el objeto completo del usuario.
+    Datos del usuario que viajan dentro del JWT.
+    """
+    id: int
+    email: Optional[str]
+    role: Optional[str]
+
+def _decode_cached(token):
+    payload = token_cache.get(token)
+    # El TTL de la caché puede superar la expiración del propio token
+    if payload is None or payload["exp"] <= time.time():
+        payload = auth_handler.decode_token(token)
+        token_cache.set(token, payload)
+    return payload
+
+def _user_snapshot(db, user_id):
     """
+    Devuelve las columnas del usuario desde la caché o, si no están, desde la BD.
+    """
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        user = db.query(models.User).filter(models.User.id == user_id).first()
+        if user is None:
+            return None
+        snapshot = {column: getattr(user, column) for column in _USER_COLUMNS}
+        user_cache.set(user_id, snapshot)
+    return snapshot
+
+def _claims_from_token(token):
     try:
-        payload = auth_handler.decode_token(token.credentials)
+        payload = _decode_cached(token.credentials)
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Token inválido, 'sub' no encontrado")
-        
-        user = db.query(models.User).filter(models.User.id == int(user_id)).first()
-        
-        if user is None:
-            raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        
-        return user
+        return int(user_id), payload
     except (jwt.PyJWTError, ValueError):
          # Captura errores de decodificación o si 'sub' no es un entero válido
         raise HTTPException(
             status_code=401,
             detail="No se pudo validar las credenciales",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+# --- Dependencia Principal de Usuario Autenticado ---
+
+auth_handler = AuthHandler() # Creamos una instancia global para usar en la dependencia
+
+def get_current_user(token: str = Depends(auth_handler.security), db: Session = Depends(get_db)):
+    """
+    Decodifica el token, obtiene el ID del usuario, busca al usuario en la BD
+    (o en la caché) y devuelve el objeto completo del usuario.
+    """
+    user_id, _ = _claims_from_token(token)
+
+    snapshot = _user_snapshot(db, user_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    user = db.identity_map.get(db.identity_key(models.User, user_id))
+    if user is None:
+        # Reconstruimos el usuario y lo asociamos a la sesión como persistente,
+        # sin SELECT; las relaciones (ej. profile) se siguen cargando a demanda.
+        user = models.User(**snapshot)
+        make_transient_to_detached(user)
+        db.add(user)
+    return user
+
+def get_token_claims(token: str = Depends(auth_handler.security)) -> TokenClaims:
+    """
+    Dependencia liviana: devuelve solo id, email y rol del token, sin tocar
+    la BD. Pensada para endpoints que solo necesitan el id del dueño.
+    """
+    user_id, payload = _claims_from_token(token)
+    role = payload.get("role")
+    if role is None:
+        # Tokens emitidos antes de incluir el rol: lo resolvemos una vez
+        db = database.get_session()
+        try:
+            snapshot = _user_snapshot(db, user_id)
+        finally:
+            db.close()
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        role = snapshot["role"]
+    return TokenClaims(id=user_id, email=payload.get("email"), role=role)
+
+# --- Lecturas desde la réplica ---
+# Los GET que solo leen usan get_read_db / get_async_read_db en lugar de
+# get_db. Tras una escritura exitosa, durante DB_REPLICA_STICKY_SECONDS las
+# lecturas de ese cliente vuelven al primario, así ve lo que acaba de
+# escribir aunque la réplica vaya atrasada. El cliente se reconoce por el
+# usuario del token (en este worker) y por una cookie con el vencimiento
+# (en cualquier worker, y también en los endpoints públicos).
+
+STICKY_COOKIE = "notaio_primary_until"
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+recent_writers = TTLCache(maxsize=10_000, ttl=database.DB_REPLICA_STICKY_SECONDS)
+
+def _bearer_user_id(request: Request) -> Optional[int]:
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not credentials:
+        return None
+    try:
+        return int(_decode_cached(credentials)["sub"])
+    except (HTTPException, KeyError, TypeError, ValueError):
+        return None
+
+def reads_from_primary(request: Request) -> bool:
+    """
+    True si el cliente escribió hace menos de DB_REPLICA_STICKY_SECONDS.
+    """
+    try:
+        if float(request.cookies.get(STICKY_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    user_id = _bearer_user_id(request)
+    return user_id is not None and recent_writers.get(user_id) is not None
+
+async def sticky_writes_middleware(request: Request, call_next):
+    """
+    Marca al cliente que acaba de escribir para que sus próximas lecturas
+    vayan al primario.
+    """
+    response = await call_next(request)
+    sticky_seconds = database.DB_REPLICA_STICKY_SECONDS
+    if request.method not in _SAFE_METHODS and response.status_code < 400 and sticky_seconds > 0:
+        user_id = _bearer_user_id(request)
+        if user_id is not None:
+            recent_writers.set(user_id, True)
+        response.set_cookie(
+            STICKY_COOKIE, f"{time.time() + sticky_seconds:.3f}",
+            max_age=math.ceil(sticky_seconds), httponly=True, samesite="lax",
+        )
+    return response
+
+def get_read_db(request: Request):
+    """
+    Como get_db, pero de solo lectura y desde la réplica (si hay una y el
+    cliente no escribió recién).
+    """
+    db = database.get_session() if reads_from_primary(request) else database.get_replica_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    """
+    Versión asíncrona de get_read_db.
+    """
+    if reads_from_primary(request):
+        database.get_async_engine()
+        session_factory = database.AsyncSessionLocal
+    else:
+        database.get_replica_async_engine()
+        session_factory = database.AsyncReplicaSessionLocal
+    async with session_factory() as db:
+        yield db
@@ -0,0 +1,95 @@
+# benchmarks/bench_async.py - THROUGHPUT: CAMINO SÍNCRONO vs ASÍNCRONO
+#
+# Uso:  python benchmarks/bench_async.py [--requests 2000] [--concurrency 10 50 200]
+#
+# Siembra una base SQLite temporal (o usa DATABASE_URL si está definida),
+# monta un gemelo síncrono del listado /psychologists y dispara ráfagas
+# concurrentes contra ambos a través de un cliente ASGI en proceso.
+# El endpoint síncrono compite por los hilos del threadpool de Starlette;
+# el asíncrono solo espera a la base de datos.
+
+import argparse
+import asyncio
+import time
+
+import checks
+
+checks.configure("bench_async", reuse_database=True)
+
+import httpx
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+import database
+import main
+import migrations
+import models
+import schemas
+from auth import get_db
+
+def seed(n_psychologists=2_000):
+    migrations.upgrade(database.get_engine())
+    db = database.get_session()
+    try:
+        if db.query(models.User).count():
+            return
+        users = [
+            models.User(email=f"psico{i}@bench.local", hashed_password="x", role=models.UserRole.PSICOLOGO.value)
+            for i in range(n_psychologists)
+        ]
+        db.add_all(users)
+        db.flush()
+        db.add_all(
+            models.Profile(nombre_completo=f"Psicólogo {u.id}", descripcion="Terapia cognitiva", user_id=u.id)
+            for u in users
+        )
+        db.commit()
+    finally:
+        db.close()
+
+# Gemelo síncrono del listado, con la misma consulta y sin caché
+@main.app.get("/_bench/psychologists-sync", include_in_schema=False)
+def psychologists_sync(after_user_id: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+    rows = db.query(
+        models.Profile.user_id,
+        models.Profile.nombre_completo,
+        models.Profile.foto_url,
+        models.Profile.descripcion,
+    ).join(models.User, models.Profile.user_id == models.User.id).filter(
+        models.User.role == models.UserRole.PSICOLOGO,
+        models.Profile.user_id > after_user_id,
+    ).order_by(models.Profile.user_id).limit(limit).all()
+    return [schemas.PsychologistPublicProfile.model_validate(row) for row in rows]
+
+async def burst(client, path, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            # after_user_id distinto en cada petición para no medir la caché
+            response = await client.get(path, params={"after_user_id": i % 1500, "limit": 50})
+            response.raise_for_status()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return total / (time.perf_counter() - t0)
+
+async def run(total, levels):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'concurrencia':>12} {'sync req/s':>12} {'async req/s':>12}")
+        for concurrency in levels:
+            main.marketplace_cache.ttl = 0  # sin caché: medimos la base
+            sync_rps = await burst(client, "/_bench/psychologists-sync", total, concurrency)
+            async_rps = await burst(client, "/psychologists", total, concurrency)
+            print(f"{concurrency:>12} {sync_rps:>12.0f} {async_rps:>12.0f}")
+    # Cerramos las conexiones aiosqlite para que sus hilos no bloqueen la salida
+    await database.get_async_engine().dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+    seed()
+    asyncio.run(run(args.requests, args.concurrency))
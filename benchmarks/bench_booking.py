@@ -0,0 +1,150 @@
+# benchmarks/bench_booking.py - PRUEBA DE CARGA DE RESERVAS CONCURRENTES
+#
+# Uso:  python benchmarks/bench_booking.py [--requests 2000] [--concurrency 50] [--slots 20] [--retry-ratio 0.2]
+#
+# Siembra un psicólogo con un único bloque de disponibilidad y muchos
+# pacientes, y dispara reservas concurrentes que compiten por unos pocos
+# turnos (`--slots`). Una fracción de las peticiones se reenvía con la misma
+# Idempotency-Key, como haría un cliente tras un timeout. Al final verifica
+# contra la base que:
+#   - ningún turno quedó reservado dos veces,
+#   - hay exactamente una cita por cada respuesta 201,
+#   - cada reintento devolvió la misma cita que el pedido original.
+# Usa una base SQLite temporal salvo que se defina DATABASE_URL (para medir
+# el bloqueo de filas de verdad conviene apuntarlo a Postgres).
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import checks
+
+checks.configure("bench_booking", reuse_database=True)
+
+import httpx
+from sqlalchemy import text
+
+import database
+import main
+import migrations
+import models
+from auth import auth_handler
+
+DAY = datetime(2031, 3, 3)
+
+def seed(n_patients, n_slots):
+    migrations.upgrade(database.get_engine())
+    db = database.get_session()
+    try:
+        psychologist = models.User(
+            email=f"booking-{time.time_ns()}@bench.local", hashed_password="x", role=models.UserRole.PSICOLOGO.value
+        )
+        db.add(psychologist)
+        db.flush()
+        db.add(models.AvailabilityBlock(
+            psychologist_id=psychologist.id,
+            start_time=DAY,
+            end_time=DAY + timedelta(hours=n_slots),
+        ))
+        patients = [models.Patient(nombre=f"Paciente {i}", edad=30, owner_id=psychologist.id) for i in range(n_patients)]
+        db.add_all(patients)
+        db.commit()
+        token = auth_handler.encode_token(psychologist.id, psychologist.email, psychologist.role)
+        return psychologist.id, [p.id for p in patients], token
+    finally:
+        db.close()
+
+def make_requests(total, n_slots, patient_ids, retry_ratio):
+    """
+    Lista de (clave, cuerpo). Los reintentos repiten clave y cuerpo de un pedido anterior.
+    """
+    requests = []
+    for i in range(total):
+        if requests and random.random() < retry_ratio:
+            requests.append(random.choice(requests))
+            continue
+        slot = random.randrange(n_slots)
+        start = DAY + timedelta(hours=slot)
+        requests.append((f"req-{i}", {
+            "patient_id": random.choice(patient_ids),
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(hours=1)).isoformat(),
+        }))
+    random.shuffle(requests)
+    return requests
+
+async def run(requests, token, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+    results = []
+
+    async def one(key, body):
+        async with semaphore:
+            t0 = time.perf_counter()
+            response = await client.post("/appointments/", json=body, headers={**headers, "Idempotency-Key": key})
+            elapsed = time.perf_counter() - t0
+            appointment_id = response.json().get("id") if response.status_code in (200, 201) else None
+            results.append((key, response.status_code, appointment_id, elapsed))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(key, body) for key, body in requests))
+        wall = time.perf_counter() - t0
+    return results, wall
+
+def verify(psychologist_id, results):
+    with database.get_engine().connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id, start_time, end_time FROM appointments "
+            f"WHERE psychologist_id = :pid AND {models.ACTIVE_APPOINTMENT_CONDITION.text} ORDER BY start_time"
+        ), {"pid": psychologist_id}).all()
+
+    errors = []
+    for previous, current in zip(rows, rows[1:]):
+        if current.start_time < previous.end_time:
+            errors.append(f"turno reservado dos veces: citas {previous.id} y {current.id}")
+
+    created = [r for r in results if r[1] == 201]
+    if len(created) != len(rows):
+        errors.append(f"{len(created)} respuestas 201 pero {len(rows)} citas en la base")
+
+    ids_by_key = {}
+    for key, code, appointment_id, _ in results:
+        if appointment_id is None:
+            continue
+        if ids_by_key.setdefault(key, appointment_id) != appointment_id:
+            errors.append(f"la clave {key} devolvió dos citas distintas")
+    return rows, errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--slots", type=int, default=20)
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--retry-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    psychologist_id, patient_ids, token = seed(args.patients, args.slots)
+    requests = make_requests(args.requests, args.slots, patient_ids, args.retry_ratio)
+    results, wall = asyncio.run(run(requests, token, args.concurrency))
+    rows, errors = verify(psychologist_id, results)
+
+    latencies = sorted(r[3] * 1000 for r in results)
+    codes = Counter(r[1] for r in results)
+    print(f"peticiones: {len(results)} en {wall:.2f}s -> {len(results) / wall:.0f} req/s")
+    print(f"respuestas: {dict(sorted(codes.items()))}  (201 reservada, 200 reintento, 409 ocupado)")
+    print(f"latencia ms: p50={statistics.median(latencies):.1f} p99={latencies[int(len(latencies) * 0.99) - 1]:.1f}")
+    print(f"turnos reservados: {len(rows)}/{args.slots}")
+    if errors:
+        print("FALLÓ:")
+        for error in errors[:20]:
+            print("  -", error)
+        sys.exit(1)
+    print("OK: sin reservas dobles y reintentos idempotentes")
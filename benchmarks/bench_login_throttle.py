@@ -0,0 +1,91 @@
+# benchmarks/bench_login_throttle.py - RÁFAGA DE CREDENTIAL STUFFING CONTRA /token
+#
+# Uso:  python benchmarks/bench_login_throttle.py [--attempts 200] [--concurrency 20]
+#
+# Lanza `--attempts` logins con contraseña incorrecta contra un usuario que
+# existe (el peor caso: cada intento verifica bcrypt) y, en paralelo, mide la
+# latencia de GET / como "resto de la API". Compara con el limitador de
+# ratelimit.py apagado y prendido y reporta cuántos intentos llegaron a
+# bcrypt (401), cuántos se cortaron antes (429), cuántos rechazó el pool de
+# hashing por saturación (503, en "otros") y el tiempo total. Usa una
+# base SQLite temporal y BCRYPT_ROUNDS=10 salvo que se definan.
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import checks
+
+# Costo de bcrypt realista y pool de hashing real (DEFAULTS los apaga)
+checks.configure(
+    "bench_login",
+    reuse_database=True,
+    BCRYPT_ROUNDS=os.getenv("BCRYPT_ROUNDS", "10"),
+    HASH_WORKERS=os.getenv("HASH_WORKERS", "2"),
+)
+
+import httpx
+
+import database
+import main
+import migrations
+import ratelimit
+
+EMAIL = "victima@bench.local"
+PASSWORD = "la-contraseña-correcta"
+
+async def burst(client, attempts, concurrency):
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def attempt(i):
+        async with semaphore:
+            response = await client.post("/token", data={"username": EMAIL, "password": f"intento-{i}"})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async def probe(latencies, done):
+        while not done.is_set():
+            started = time.perf_counter()
+            (await client.get("/")).raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.01)
+
+    latencies, done = [], asyncio.Event()
+    prober = asyncio.create_task(probe(latencies, done))
+    started = time.perf_counter()
+    await asyncio.gather(*(attempt(i) for i in range(attempts)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await prober
+    return statuses, elapsed, latencies
+
+async def run(attempts, concurrency):
+    migrations.upgrade(database.get_engine())
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            await client.post("/register", json={
+                "email": EMAIL, "password": PASSWORD, "full_name": "Víctima", "role": "psicologo",
+            })
+            print(f"{'limitador':>10} {'401 (bcrypt)':>13} {'429':>6} {'otros':>6} {'total s':>8} {'GET / p50 ms':>13} {'p99 ms':>8}")
+            for enabled in (False, True):
+                ratelimit.limiter.enabled = enabled
+                ratelimit.limiter.backend = ratelimit.MemoryBackend()
+                statuses, elapsed, latencies = await burst(client, attempts, concurrency)
+                others = sum(count for code, count in statuses.items() if code not in (401, 429))
+                latencies.sort()
+                p99 = latencies[min(len(latencies) - 1, int(0.99 * (len(latencies) - 1)))] if latencies else 0.0
+                p50 = statistics.median(latencies) if latencies else 0.0
+                print(f"{'sí' if enabled else 'no':>10} {statuses.get(401, 0):>13} {statuses.get(429, 0):>6} "
+                      f"{others:>6} {elapsed:>8.2f} {p50:>13.2f} {p99:>8.2f}")
+            print("\nRechazos en /metrics:")
+            print("\n".join(line for line in ratelimit.rate_limited.render() if not line.startswith("#")))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--attempts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.attempts, args.concurrency))
@@ -0,0 +1,416 @@
+# benchmarks/bench_routes.py - SUITE DE LATENCIA Y CONSULTAS POR RUTA
+#
+# Uso:  python benchmarks/bench_routes.py [--scale 0.01] [--iterations 30]
+#                                         [--json resultado.json] [--compare base.json]
+#
+# Recorre TODAS las rutas de la app (main.py y routers/) a través de un
+# cliente ASGI en proceso, sin red, y reporta por ruta: p50 y p99 de
+# latencia y consultas SQL por petición. Falla si alguna ruta no tiene
+# escenario, si alguna responde con un estado inesperado, si una ruta con
+# `queries=` fijo hace otra cantidad de consultas o, con --compare,
+# si una ruta hace más consultas o su p50 empeora más de --tolerance
+# respecto de una corrida anterior guardada con --json.
+#
+# Usa DATABASE_URL o benchmarks/data/bench.db; si la base está vacía la
+# llena con benchmarks/seed.py a la escala pedida.
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import seed  # fija DATABASE_URL, HASH_WORKERS y BCRYPT_ROUNDS por defecto
+
+os.environ.setdefault("INTERNAL_API_TOKEN", "bench-internal-token")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Todas las peticiones salen de la misma IP y del mismo email: cubetas
+# enormes para medir el costo del limitador sin que corte con 429
+for _rule in ("LOGIN_IP", "LOGIN_EMAIL", "REGISTER_IP", "REGISTER_EMAIL"):
+    os.environ.setdefault(f"{_rule}_BURST", "1000000")
+
+import httpx
+from fastapi.routing import APIRoute
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+
+import database
+import main
+import migrations
+import models
+from auth import auth_handler
+
+# --- Conteo de consultas por petición ---
+# Igual que observability: un contador por petición en un ContextVar, que
+# ven tanto los endpoints síncronos (copia del contexto en el threadpool)
+# como los asíncronos.
+_query_counter = contextvars.ContextVar("bench_query_counter", default=None)
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+# --- Escenarios ---
+# Cada escenario arma la petición i-ésima a partir del contexto compartido
+# y, opcionalmente, guarda algo de la respuesta para escenarios posteriores
+# (ej. los DELETE borran lo que crearon los POST). Se corren en este orden.
+# `queries` fija cuántas consultas debe hacer cada petición medida, sin
+# importar cuántas filas devuelva (ej. listados con relaciones precargadas).
+
+SCENARIOS = []
+
+def scenario(method, path, expect=(200,), queries=None):
+    def register(build):
+        SCENARIOS.append({"method": method, "path": path, "build": build, "expect": expect,
+                          "queries": queries, "after": None})
+        return build
+    return register
+
+def after(callback):
+    SCENARIOS[-1]["after"] = callback
+    return callback
+
+WINDOW = {"start_date": "2025-03-03T00:00:00", "end_date": "2025-03-08T00:00:00"}
+BOOKING_DAY = datetime(2029, 1, 1)
+
+@scenario("GET", "/")
+def _root(ctx, i):
+    return {"url": "/"}
+
+@scenario("GET", "/metrics")
+def _metrics(ctx, i):
+    return {"url": "/metrics", "headers": {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]}}
+
+@scenario("POST", "/register")
+def _register(ctx, i):
+    return {"url": "/register", "json": {
+        "email": f"nuevo{ctx['run']}-{i}@bench.local", "password": seed.BENCH_PASSWORD,
+        "full_name": f"Nuevo Psicólogo {i}", "role": "psicologo",
+    }}
+
+@scenario("POST", "/token")
+def _token(ctx, i):
+    return {"url": "/token", "data": {"username": ctx["email"], "password": seed.BENCH_PASSWORD}}
+
+@scenario("GET", "/users/me")
+def _me(ctx, i):
+    return {"url": "/users/me", "headers": ctx["auth"]}
+
+@scenario("PUT", "/users/me/profile")
+def _profile(ctx, i):
+    return {"url": "/users/me/profile", "headers": ctx["auth"],
+            "json": {"descripcion": f"Terapia cognitivo conductual. Ansiedad y estrés ({i})."}}
+
+@scenario("GET", "/psychologists")
+def _marketplace(ctx, i):
+    return {"url": "/psychologists", "params": {"after_user_id": (i * 37) % ctx["psychologists"], "limit": 50}}
+
+@scenario("GET", "/psychologists/search")
+def _search(ctx, i):
+    return {"url": "/psychologists/search", "params": {"q": ["ansiedad", "pareja", "garcia", "duelo"][i % 4]}}
+
+@scenario("POST", "/patients/", expect=(201,))
+def _create_patient(ctx, i):
+    return {"url": "/patients/", "headers": ctx["auth"], "json": {"nombre": f"Paciente nuevo {i}", "edad": 30}}
+
+@after
+def _remember_patient(ctx, response):
+    ctx["new_patients"].append(response.json()["id"])
+
+@scenario("GET", "/patients/")
+def _list_patients(ctx, i):
+    return {"url": "/patients/", "headers": ctx["auth"], "params": {"limit": 100, "include_total": "true"}}
+
+@scenario("GET", "/patients/{patient_id}")
+def _read_patient(ctx, i):
+    return {"url": f"/patients/{ctx['patients'][i % len(ctx['patients'])]}", "headers": ctx["auth"]}
+
+@scenario("PUT", "/patients/{patient_id}")
+def _update_patient(ctx, i):
+    return {"url": f"/patients/{ctx['patients'][i % len(ctx['patients'])]}", "headers": ctx["auth"],
+            "json": {"telefono": f"11{i:08d}"}}
+
+@scenario("POST", "/patients/bulk")
+def _bulk(ctx, i):
+    body = "nombre,edad,dni,telefono\n" + "".join(f"Importado {i}-{n},40,{n},\n" for n in range(100))
+    return {"url": "/patients/bulk", "headers": {**ctx["auth"], "Content-Type": "text/csv"}, "content": body}
+
+@scenario("GET", "/patients/export")
+def _export(ctx, i):
+    return {"url": "/patients/export", "headers": ctx["auth"], "params": {"format": "ndjson"}}
+
+@scenario("DELETE", "/patients/{patient_id}", expect=(204,))
+def _delete_patient(ctx, i):
+    return {"url": f"/patients/{ctx['new_patients'].pop()}", "headers": ctx["auth"]}
+
+@scenario("POST", "/availability/blocks", expect=(201,))
+def _create_block(ctx, i):
+    # El escenario DELETE borra todos estos bloques: las fechas se pueden repetir entre corridas
+    start = datetime(2030, 1, 1) + timedelta(days=i)
+    return {"url": "/availability/blocks", "headers": ctx["auth"],
+            "json": {"start_time": start.isoformat(), "end_time": (start + timedelta(hours=2)).isoformat()}}
+
+@after
+def _remember_block(ctx, response):
+    ctx["new_blocks"].append(response.json()["id"])
+
+@scenario("GET", "/availability/my-blocks")
+def _my_blocks(ctx, i):
+    return {"url": "/availability/my-blocks", "headers": ctx["auth"], "params": WINDOW}
+
+@scenario("DELETE", "/availability/blocks/{block_id}", expect=(204,))
+def _delete_block(ctx, i):
+    return {"url": f"/availability/blocks/{ctx['new_blocks'].pop()}", "headers": ctx["auth"]}
+
+@scenario("GET", "/availability/psychologist/{psychologist_id}")
+def _availability(ctx, i):
+    return {"url": f"/availability/psychologist/{1 + (i * 13) % ctx['psychologists']}", "params": WINDOW}
+
+@scenario("GET", "/availability/psychologists")
+def _availability_batch(ctx, i):
+    ids = [1 + (i * 50 + k) % ctx["psychologists"] for k in range(50)]
+    return {"url": "/availability/psychologists", "params": {**WINDOW, "psychologist_id": ids}}
+
+@scenario("POST", "/availability/schedules/", expect=(201,))
+def _create_schedule(ctx, i):
+    return {"url": "/availability/schedules/", "headers": ctx["auth"], "json": {
+        "weekdays": [5], "start_time": f"{8 + i % 10:02d}:00", "end_time": f"{8 + i % 10:02d}:30",
+        "valid_from": datetime.now().date().isoformat(),
+    }}
+
+@after
+def _remember_schedule(ctx, response):
+    ctx["new_schedules"].append(response.json()["id"])
+
+@scenario("GET", "/availability/schedules/")
+def _list_schedules(ctx, i):
+    return {"url": "/availability/schedules/", "headers": ctx["auth"]}
+
+@scenario("PUT", "/availability/schedules/{schedule_id}")
+def _update_schedule(ctx, i):
+    schedule_id = ctx["new_schedules"][i % len(ctx["new_schedules"])]
+    return {"url": f"/availability/schedules/{schedule_id}", "headers": ctx["auth"], "json": {"weekdays": [5, 6]}}
+
+@scenario("DELETE", "/availability/schedules/{schedule_id}", expect=(204,))
+def _delete_schedule(ctx, i):
+    return {"url": f"/availability/schedules/{ctx['new_schedules'].pop()}", "headers": ctx["auth"]}
+
+@scenario("POST", "/appointments/", expect=(201,))
+def _book(ctx, i):
+    start = BOOKING_DAY + timedelta(hours=ctx["booked"] + i)
+    return {"url": "/appointments/", "headers": {**ctx["auth"], "Idempotency-Key": f"bench-{ctx['run']}-{i}"},
+            "json": {"patient_id": ctx["patients"][0], "start_time": start.isoformat(),
+                     "end_time": (start + timedelta(minutes=50)).isoformat()}}
+
+@after
+def _remember_appointment(ctx, response):
+    ctx["new_appointments"].append(response.json()["id"])
+
+# Páginas de 10 y de 200 citas alternadas: los pacientes se cargan con una
+# sola consulta, así que la cantidad de consultas no depende del tamaño.
+# Historial: citas + archivo + pacientes. Por paciente: el paciente (permiso,
+# y ya sirve para la página) + citas + archivo.
+@scenario("GET", "/appointments/", queries=3)
+def _appointment_history(ctx, i):
+    return {"url": "/appointments/", "headers": ctx["auth"], "params": {"limit": 10 if i % 2 else 200}}
+
+@scenario("GET", "/appointments/patients/{patient_id}", queries=3)
+def _patient_appointment_history(ctx, i):
+    return {"url": f"/appointments/patients/{ctx['patients'][0]}", "headers": ctx["auth"],
+            "params": {"limit": 10 if i % 2 else 200}}
+
+@scenario("GET", "/appointments/{appointment_id}")
+def _read_appointment(ctx, i):
+    return {"url": f"/appointments/{ctx['new_appointments'][i % len(ctx['new_appointments'])]}", "headers": ctx["auth"]}
+
+@scenario("PATCH", "/appointments/{appointment_id}")
+def _update_appointment(ctx, i):
+    appointment_id = ctx["new_appointments"][i % len(ctx["new_appointments"])]
+    return {"url": f"/appointments/{appointment_id}", "headers": ctx["auth"], "json": {"notes": f"Nota {i}"}}
+
+# Lee el resumen precalculado: una sola consulta sin importar el rango de semanas
+@scenario("GET", "/dashboard/", queries=1)
+def _dashboard(ctx, i):
+    return {"url": "/dashboard/", "headers": ctx["auth"], "params": {"weeks_back": 52 if i % 2 else 4}}
+
+@scenario("GET", "/jobs/")
+def _my_jobs(ctx, i):
+    return {"url": "/jobs/", "headers": ctx["auth"], "params": {"limit": 20}}
+
+@after
+def _remember_jobs(ctx, response):
+    ctx["jobs"] = [job["id"] for job in response.json()["items"]]
+
+@scenario("GET", "/jobs/{job_id}")
+def _read_job(ctx, i):
+    return {"url": f"/jobs/{ctx['jobs'][i % len(ctx['jobs'])]}", "headers": ctx["auth"]}
+
+@scenario("GET", "/internal/job-stats")
+def _job_stats(ctx, i):
+    return {"url": "/internal/job-stats", "headers": {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]}}
+
+@scenario("GET", "/internal/cache-stats")
+def _cache_stats(ctx, i):
+    return {"url": "/internal/cache-stats", "headers": {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]}}
+
+@scenario("GET", "/internal/pool-stats")
+def _pool_stats(ctx, i):
+    return {"url": "/internal/pool-stats", "headers": {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]}}
+
+# --- Preparación ---
+
+def prepare(scale):
+    """
+    Siembra la base si está vacía y arma el contexto: el psicólogo 1 es el
+    usuario autenticado; se le agrega un bloque largo en el futuro para las
+    reservas del benchmark.
+    """
+    migrations.upgrade(database.get_engine())
+    db = database.get_session()
+    try:
+        if not db.execute(select(func.count(models.User.id))).scalar():
+            print(f"Base vacía: generando datos (scale={scale})...")
+            print(seed.seed(scale, quiet=True))
+        psychologists = db.execute(select(func.max(models.Profile.user_id))).scalar()
+        psychologist = db.get(models.User, 1)
+        token = auth_handler.encode_token(psychologist.id, psychologist.email, psychologist.role)
+        email = psychologist.email
+        patients = db.execute(
+            select(models.Patient.id).where(models.Patient.owner_id == 1).order_by(models.Patient.id).limit(50)
+        ).scalars().all()
+        # Las citas no se borran: cada corrida reserva a continuación de la anterior
+        booked = db.execute(select(func.count(models.Appointment.id)).where(
+            models.Appointment.psychologist_id == 1, models.Appointment.start_time >= BOOKING_DAY
+        )).scalar()
+        booking_block = db.execute(select(models.AvailabilityBlock.id).where(
+            models.AvailabilityBlock.psychologist_id == 1, models.AvailabilityBlock.start_time == BOOKING_DAY
+        )).scalar()
+        if booking_block is None:
+            db.add(models.AvailabilityBlock(
+                psychologist_id=1, start_time=BOOKING_DAY, end_time=BOOKING_DAY + timedelta(days=365)
+            ))
+            db.commit()
+    finally:
+        db.close()
+
+    return {
+        "run": time.time_ns(),  # distingue emails y claves de idempotencia entre corridas
+        "booked": booked,
+        "email": email,
+        "auth": {"Authorization": f"Bearer {token}"},
+        "psychologists": psychologists,
+        "patients": patients,
+        "new_patients": [], "new_blocks": [], "new_schedules": [], "new_appointments": [], "jobs": [],
+    }
+
+def check_coverage():
+    routes = {(method, route.path) for route in main.app.routes if isinstance(route, APIRoute) for method in route.methods}
+    covered = {(s["method"], s["path"]) for s in SCENARIOS}
+    return sorted(routes - covered)
+
+# --- Ejecución ---
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+async def run(ctx, iterations, warmup):
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for s in SCENARIOS:
+            latencies, queries, unexpected = [], [], {}
+            for i in range(warmup + iterations):
+                request = s["build"](ctx, i)
+                counter = [0]
+                token = _query_counter.set(counter)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(s["method"], **request)
+                finally:
+                    _query_counter.reset(token)
+                elapsed = time.perf_counter() - started
+                if response.status_code not in s["expect"]:
+                    unexpected[response.status_code] = response.text[:200]
+                elif s["after"]:
+                    s["after"](ctx, response)
+                if i >= warmup:
+                    latencies.append(elapsed * 1000)
+                    queries.append(counter[0])
+            results.append({
+                "route": f"{s['method']} {s['path']}",
+                "p50_ms": round(statistics.median(latencies), 2),
+                "p99_ms": round(percentile(latencies, 0.99), 2),
+                "queries": round(statistics.mean(queries), 2),
+                # La mediana es estable aunque una caché expire a mitad de la corrida
+                "median_queries": statistics.median(queries),
+                "fixed_queries": s["queries"],
+                "query_counts": sorted(set(queries)),
+                "unexpected": unexpected,
+            })
+    await database.dispose()
+    return results
+
+def report(results):
+    print(f"{'ruta':<48} {'p50 ms':>8} {'p99 ms':>8} {'consultas':>10}")
+    for r in results:
+        print(f"{r['route']:<48} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['queries']:>10.2f}")
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = {r["route"]: r for r in json.load(f)}
+    regressions = []
+    for r in results:
+        base = baseline.get(r["route"])
+        if base is None:
+            continue
+        if r["median_queries"] > base["median_queries"]:
+            regressions.append(
+                f"{r['route']}: {base['median_queries']} -> {r['median_queries']} consultas por petición"
+            )
+        if r["p50_ms"] > base["p50_ms"] * tolerance:
+            regressions.append(f"{r['route']}: p50 {base['p50_ms']} -> {r['p50_ms']} ms")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, default=0.01, help="escala del seed si la base está vacía")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--json", help="guarda los resultados para comparar después")
+    parser.add_argument("--compare", help="resultados de una corrida anterior (--json)")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="empeoramiento de p50 tolerado (x)")
+    args = parser.parse_args()
+
+    missing = check_coverage()
+    if missing:
+        sys.exit(f"Rutas sin escenario: {missing}")
+    if os.environ["DATABASE_URL"].endswith(seed.DEFAULT_DB):
+        os.makedirs(os.path.dirname(seed.DEFAULT_DB), exist_ok=True)
+
+    ctx = prepare(args.scale)
+    results = asyncio.run(run(ctx, args.iterations, args.warmup))
+    report(results)
+
+    failures = [f"{r['route']}: estado inesperado {r['unexpected']}" for r in results if r["unexpected"]]
+    failures += [
+        f"{r['route']}: se esperaban {r['fixed_queries']} consultas por petición, hubo {r['query_counts']}"
+        for r in results if r["fixed_queries"] is not None and r["query_counts"] != [r["fixed_queries"]]
+    ]
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        failures += compare(results, args.compare, args.tolerance)
+    if failures:
+        print("\nFALLÓ:")
+        for failure in failures:
+            print("  -", failure)
+        sys.exit(1)
@@ -0,0 +1,86 @@
+# benchmarks/bench_serialization.py - COSTO DE SERIALIZAR LISTADOS GRANDES
+#
+# Uso:  python benchmarks/bench_serialization.py [--rows 10000] [--repeat 20]
+#
+# Monta tres mini-apps con el mismo endpoint que devuelve `--rows` pacientes
+# (objetos ORM en memoria, sin base de datos) y mide, a través de un cliente
+# ASGI en proceso, el costo por ítem de cada camino de serialización:
+#   default   -> response_model + jsonable + json.dumps (FastAPI estándar)
+#   orjson    -> igual, pero con ORJSONResponse como clase de respuesta
+#   adapter   -> serialization.dump_json (TypeAdapter compilado, JSON en Rust)
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+import checks
+
+checks.configure(DATABASE_URL="sqlite://")
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, Response
+
+import models
+import schemas
+import serialization
+
+def make_patients(n):
+    return [
+        models.Patient(id=i, nombre=f"Paciente {i}", edad=20 + i % 60, dni=f"{30_000_000 + i}", telefono=None, owner_id=1)
+        for i in range(n)
+    ]
+
+def build_apps(patients):
+    default_app = FastAPI()
+    orjson_app = FastAPI(default_response_class=ORJSONResponse)
+    adapter_app = FastAPI()
+
+    @default_app.get("/patients", response_model=List[schemas.PatientResponse])
+    def default_route():
+        return patients
+
+    @orjson_app.get("/patients", response_model=List[schemas.PatientResponse])
+    def orjson_route():
+        return patients
+
+    @adapter_app.get("/patients", response_model=List[schemas.PatientResponse])
+    def adapter_route():
+        return Response(serialization.dump_json(List[schemas.PatientResponse], patients), media_type="application/json")
+
+    return {"default": default_app, "orjson": orjson_app, "adapter": adapter_app}
+
+async def measure(app, repeat):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        body = (await client.get("/patients")).content  # calentamiento
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            response = await client.get("/patients")
+            response.raise_for_status()
+        return (time.perf_counter() - t0) / repeat, body
+
+async def run(rows, repeat):
+    patients = make_patients(rows)
+    results = {}
+    for name, app in build_apps(patients).items():
+        results[name] = await measure(app, repeat)
+
+    # Los tres caminos deben producir el mismo contenido
+    import json
+    reference = json.loads(results["default"][1])
+    for name, (_, body) in results.items():
+        assert json.loads(body) == reference, f"{name} devuelve otro contenido"
+
+    base = results["default"][0]
+    print(f"{'camino':>8} {'ms/respuesta':>13} {'µs/ítem':>9} {'vs default':>11}")
+    for name, (seconds, _) in results.items():
+        print(f"{name:>8} {seconds * 1000:>13.1f} {seconds / rows * 1e6:>9.2f} {base / seconds:>10.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.repeat))
@@ -0,0 +1,51 @@
+# benchmarks/bench_slots.py - ESCALABILIDAD DEL MOTOR DE HUECOS LIBRES
+#
+# Uso:  python benchmarks/bench_slots.py
+#
+# Genera calendarios sintéticos de tamaño creciente y mide cuánto tarda
+# slots.compute_free_slots. Si el motor es lineal, el tiempo por intervalo
+# (última columna) se mantiene aproximadamente constante.
+
+import random
+import time
+from datetime import datetime, timedelta
+
+import checks
+
+checks.configure(DATABASE_URL="sqlite://")
+
+import slots
+
+def build_calendar(n_blocks, seed=42):
+    """
+    Devuelve (bloques, citas) ordenados: un bloque de 4 horas por día con
+    algunos solapamientos y ~2 citas de 50 minutos por bloque.
+    """
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1, 9, 0)
+    blocks, busy = [], []
+    for i in range(n_blocks):
+        start = base + timedelta(days=i) + timedelta(minutes=rng.choice([0, 0, 30]))
+        end = start + timedelta(hours=4)
+        blocks.append((start, end))
+        for _ in range(2):
+            appt_start = start + timedelta(minutes=rng.randrange(0, 190, 10))
+            busy.append((appt_start, appt_start + timedelta(minutes=50)))
+    busy.sort()
+    return blocks, busy
+
+def run(sizes=(1_000, 10_000, 100_000, 300_000), repeat=3):
+    print(f"{'bloques':>10} {'intervalos':>12} {'mejor (ms)':>12} {'ns/intervalo':>14}")
+    for n in sizes:
+        blocks, busy = build_calendar(n)
+        window_start, window_end = blocks[0][0], blocks[-1][1]
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            slots.compute_free_slots(blocks, busy, 50, window_start, window_end)
+            best = min(best, time.perf_counter() - t0)
+        total = len(blocks) + len(busy)
+        print(f"{n:>10} {total:>12} {best * 1000:>12.1f} {best / total * 1e9:>14.0f}")
+
+if __name__ == "__main__":
+    run()
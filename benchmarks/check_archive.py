@@ -0,0 +1,182 @@
+# benchmarks/check_archive.py - ARCHIVO DE CITAS Y BLOQUES DE PUNTA A PUNTA
+#
+# Uso:  python benchmarks/check_archive.py [--days 400] [--batch 100]
+#
+# Sobre una base SQLite temporal carga `--days` días de historia (citas en
+# todos los estados y bloques) más un mes futuro, guarda lo que devuelven
+# los historiales, archiva con archive.archive() en tandas de `--batch` y
+# comprueba que:
+#   - en las tablas calientes no queda nada archivable y lo agendado sigue ahí
+#   - el historial de citas (general, por paciente y por rango, paginado con
+#     cursor y con total) y el listado de bloques devuelven exactamente lo mismo
+#   - el panel (dashboard) no cambia
+#   - una cita archivada se puede leer pero no modificar
+#   - los ids nuevos no chocan con los archivados, aun después de borrar la
+#     fila de id máximo
+# Sale con código 1 si alguna comprobación falla.
+
+import argparse
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta
+
+import checks
+checks.configure("check_archive")
+
+import httpx
+from sqlalchemy import func, insert, select
+
+import archive
+import database
+import main
+import migrations
+import models
+
+def load_history(engine, psychologist_id, patient_ids, days, rng):
+    """
+    Un bloque de 8 horas por día hábil y hasta 4 citas por día dentro de él.
+    """
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    blocks, appointments = [], []
+    for offset in range(-days, 30):
+        day = today + timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        blocks.append({"psychologist_id": psychologist_id, "start_time": day.replace(hour=9), "end_time": day.replace(hour=17)})
+        for hour in rng.sample(range(9, 17), 4):
+            start = day.replace(hour=hour)
+            past = start < today
+            appointments.append({
+                "psychologist_id": psychologist_id, "patient_id": rng.choice(patient_ids),
+                "start_time": start, "end_time": start + timedelta(minutes=50), "version": 1,
+                # Algunas citas pasadas quedaron "agendada": nunca se archivan
+                "status": rng.choice(["completada", "completada", "cancelada_paciente", "cancelada_psicologo", "agendada"])
+                          if past else "agendada",
+            })
+    with engine.begin() as conn:
+        conn.execute(insert(models.AvailabilityBlock), blocks)
+        conn.execute(insert(models.Appointment), appointments)
+    return len(appointments), len(blocks)
+
+async def collect(client, auth, url, params, limit):
+    """
+    Recorre todas las páginas con el cursor; devuelve (ítems, total).
+    """
+    items, cursor, total = [], None, None
+    while True:
+        page_params = {**params, "limit": limit, "include_total": "true"}
+        if cursor:
+            page_params["cursor"] = cursor
+        response = await client.get(url, headers=auth, params=page_params)
+        response.raise_for_status()
+        body = response.json()
+        items += body["items"]
+        total = body["total"] if total is None else total
+        cursor = body["next_cursor"]
+        if not cursor:
+            return items, total
+
+async def snapshot(client, auth, patient_id, days):
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    window = {"start_date": (today - timedelta(days=days + 1)).isoformat(), "end_date": (today + timedelta(days=31)).isoformat()}
+    recent = {"start_date": (today - timedelta(days=30)).isoformat()}
+    panel = (await client.get("/dashboard/", headers=auth, params={"weeks_back": days // 7 + 1})).json()
+    return {
+        "historial": await collect(client, auth, "/appointments/", {}, 97),
+        "historial por paciente": await collect(client, auth, f"/appointments/patients/{patient_id}", {}, 53),
+        "historial por estado y rango": await collect(client, auth, "/appointments/", {**window, "status": "completada"}, 71),
+        "historial reciente": await collect(client, auth, "/appointments/", recent, 40),
+        "bloques": await collect(client, auth, "/availability/my-blocks", window, 89),
+        "panel": (panel["weeks"], panel["patient_count"]),
+    }
+
+async def check(days, batch):
+    results = checks.Results()
+    expect = results.expect
+
+    engine = database.get_engine()
+    migrations.upgrade(engine)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=60) as client:
+        user = {"email": "archivo@check.local", "password": "archivo-password", "full_name": "Archivo", "role": "psicologo"}
+        (await client.post("/register", json=user)).raise_for_status()
+        token = (await client.post("/token", data={"username": user["email"], "password": user["password"]})).json()
+        auth = {"Authorization": f"Bearer {token['access_token']}"}
+        me = (await client.get("/users/me", headers=auth)).json()
+        patient_ids = [(await client.post("/patients/", headers=auth, json={"nombre": f"Paciente {n}"})).json()["id"] for n in range(5)]
+
+        appointments, blocks = load_history(engine, me["id"], patient_ids, days, random.Random(11))
+        print(f"Cargadas {appointments} citas y {blocks} bloques")
+        before = await snapshot(client, auth, patient_ids[0], days)
+
+        moved_appointments, moved_blocks = archive.archive(engine, batch=batch)
+        print(f"Archivadas {moved_appointments} citas y {moved_blocks} bloques (horizonte {archive.horizon():%Y-%m-%d})")
+        after = await snapshot(client, auth, patient_ids[0], days)
+
+        cutoff = archive.horizon()
+        with engine.connect() as conn:
+            archivable = conn.execute(select(func.count()).select_from(models.Appointment).where(
+                models.Appointment.end_time < cutoff, models.Appointment.status.in_(archive.ARCHIVABLE_STATUSES),
+            )).scalar()
+            stale_blocks = conn.execute(select(func.count()).select_from(models.AvailabilityBlock).where(
+                models.AvailabilityBlock.end_time < cutoff,
+            )).scalar()
+            old_scheduled = conn.execute(select(func.count()).select_from(models.Appointment).where(
+                models.Appointment.end_time < cutoff, models.Appointment.status == "agendada",
+            )).scalar()
+            archived_id = conn.execute(select(models.ArchivedAppointment.id).limit(1)).scalar()
+            archived_ids = set(conn.execute(select(models.ArchivedAppointment.id)).scalars())
+
+        expect(f"se archivó algo ({moved_appointments} citas, {moved_blocks} bloques)", moved_appointments > 0 and moved_blocks > 0)
+        expect(f"no quedan citas ni bloques archivables en caliente ({archivable}, {stale_blocks})",
+               archivable == 0 and stale_blocks == 0)
+        expect(f"las citas agendadas viejas siguen en caliente ({old_scheduled})", old_scheduled > 0)
+        for name in before:
+            items, total = after[name]
+            expect(f"{name}: mismo resultado ({len(items)} ítems, total {total})", before[name] == after[name])
+
+        response = await client.get(f"/appointments/{archived_id}", headers=auth)
+        expect("una cita archivada se puede leer", response.status_code == 200 and response.json()["id"] == archived_id)
+        response = await client.patch(f"/appointments/{archived_id}", headers=auth, json={"notes": "tarde"})
+        expect("una cita archivada no se puede modificar", response.status_code == 404)
+
+        start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=60)
+        (await client.post("/availability/blocks", headers=auth, json={
+            "start_time": start.isoformat(), "end_time": (start + timedelta(hours=2)).isoformat(),
+        })).raise_for_status()
+        response = await client.post("/appointments/", headers=auth, json={
+            "patient_id": patient_ids[0], "start_time": start.isoformat(),
+            "end_time": (start + timedelta(minutes=50)).isoformat(),
+        })
+        expect("los ids nuevos no chocan con los archivados",
+               response.status_code == 201 and response.json()["id"] not in archived_ids)
+
+        # Baja de todos los bloques en caliente, incluido el de id máximo: sin
+        # AUTOINCREMENT, SQLite volvería a asignar ids ya archivados
+        with engine.connect() as conn:
+            live_blocks = conn.execute(select(models.AvailabilityBlock.id)).scalars().all()
+            archived_blocks = set(conn.execute(select(models.ArchivedAvailabilityBlock.id)).scalars())
+        for block_id in live_blocks:
+            (await client.delete(f"/availability/blocks/{block_id}", headers=auth)).raise_for_status()
+        old_day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days + 10)
+        with engine.begin() as conn:
+            new_id = conn.execute(insert(models.AvailabilityBlock).values(
+                psychologist_id=me["id"], start_time=old_day.replace(hour=9), end_time=old_day.replace(hour=17),
+            )).inserted_primary_key[0]
+        try:
+            _, moved_again = archive.archive(engine, batch=batch)
+            error = None
+        except Exception as exc:
+            moved_again, error = 0, exc
+        expect(f"tras borrar el id máximo, el id nuevo ({new_id}) no repite uno archivado y se archiva "
+               f"({moved_again} bloques{f', error: {error}' if error else ''})",
+               new_id not in archived_blocks and moved_again == 1)
+    return results.ok()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=400)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(check(args.days, args.batch)) else 1)
@@ -0,0 +1,169 @@
+# benchmarks/check_dashboard.py - RESUMEN DEL PANEL: TRIGGERS VS RECONSTRUCCIÓN
+#
+# Uso:  python benchmarks/check_dashboard.py [--operations 2000] [--seed 7]
+#
+# Sobre una base SQLite temporal hace escrituras al azar sobre citas,
+# bloques y pacientes (altas, bajas, cambios de estado y de horario, también
+# cruzando de semana, y bajas en cascada desde las series) y comprueba que
+# el resumen que mantienen los triggers es idéntico al que calcula
+# dashboard.rebuild() desde cero. Después compara GET /dashboard/ contra los
+# totales calculados en Python. Sale con código 1 si algo no coincide.
+
+import argparse
+import asyncio
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+import checks
+checks.configure("check_dashboard")
+
+import httpx
+from sqlalchemy import text
+
+import dashboard
+import database
+import main
+import migrations
+import models
+
+STATUSES = [status.value for status in models.AppointmentStatus]
+
+def snapshot(conn):
+    weeks = {
+        (row[0], str(row[1])): tuple(row[2:])
+        for row in conn.execute(text(f"SELECT psychologist_id, week_start, {', '.join(dashboard.WEEK_COLUMNS)} FROM dashboard_weeks"))
+        if any(row[2:]) # Filas en cero (todo se dio de baja) equivalen a no tener fila
+    }
+    summaries = {row[0]: row[1] for row in conn.execute(text("SELECT psychologist_id, patient_count FROM dashboard_summaries")) if row[1]}
+    return weeks, summaries
+
+def random_writes(engine, psychologist_ids, operations, rng):
+    """
+    Escrituras directas en SQL, como haría cualquier camino que no pase por
+    la API. Las citas y bloques no se solapan: cada uno ocupa su propio
+    turno de dos horas dentro de 12 semanas.
+    """
+    base = datetime.combine(dashboard.week_start(date.today()), datetime.min.time()) - timedelta(weeks=6)
+    turns = 12 * 7 * 12
+    slots = {psychologist_id: iter(rng.sample(range(turns), turns)) for psychologist_id in psychologist_ids}
+    with engine.begin() as conn:
+        for psychologist_id in psychologist_ids:
+            conn.execute(text("INSERT INTO recurring_schedules (psychologist_id, weekdays, start_time, end_time, valid_from, materialized_until) "
+                              "VALUES (:p, '0', '09:00:00', '10:00:00', :d, :d)"), {"p": psychologist_id, "d": base.date()})
+
+    for _ in range(operations):
+        psychologist_id = rng.choice(psychologist_ids)
+        operation = rng.random()
+        with engine.begin() as conn:
+            patients = conn.execute(text("SELECT id FROM patients WHERE owner_id = :p"), {"p": psychologist_id}).scalars().all()
+            appointments = conn.execute(text("SELECT id FROM appointments WHERE psychologist_id = :p"), {"p": psychologist_id}).scalars().all()
+            blocks = conn.execute(text("SELECT id FROM availability_blocks WHERE psychologist_id = :p"), {"p": psychologist_id}).scalars().all()
+            if operation < 0.15 or not patients:
+                conn.execute(text("INSERT INTO patients (nombre, owner_id) VALUES ('Paciente', :p)"), {"p": psychologist_id})
+            elif operation < 0.2:
+                # Baja de paciente: sus citas se borran primero (como la cascada del ORM)
+                patient_id = rng.choice(patients)
+                conn.execute(text("DELETE FROM appointments WHERE patient_id = :id"), {"id": patient_id})
+                conn.execute(text("DELETE FROM patients WHERE id = :id"), {"id": patient_id})
+            elif operation < 0.5:
+                start = base + timedelta(hours=2 * next(slots[psychologist_id]))
+                conn.execute(text(
+                    "INSERT INTO appointments (patient_id, psychologist_id, start_time, end_time, status, version) "
+                    "VALUES (:patient, :p, :start, :end, :status, 1)"
+                ), {"patient": rng.choice(patients), "p": psychologist_id, "start": start,
+                    "end": start + timedelta(minutes=rng.choice((30, 45, 50))), "status": rng.choice(STATUSES)})
+            elif operation < 0.6 and appointments:
+                conn.execute(text("UPDATE appointments SET status = :status WHERE id = :id"),
+                             {"status": rng.choice(STATUSES), "id": rng.choice(appointments)})
+            elif operation < 0.7 and appointments:
+                # Reprogramación, posiblemente a otra semana
+                start = base + timedelta(hours=2 * next(slots[psychologist_id]))
+                conn.execute(text("UPDATE appointments SET start_time = :start, end_time = :end WHERE id = :id"),
+                             {"start": start, "end": start + timedelta(minutes=50), "id": rng.choice(appointments)})
+            elif operation < 0.75 and appointments:
+                conn.execute(text("DELETE FROM appointments WHERE id = :id"), {"id": rng.choice(appointments)})
+            elif operation < 0.92:
+                schedule_id = conn.execute(text("SELECT id FROM recurring_schedules WHERE psychologist_id = :p"), {"p": psychologist_id}).scalar()
+                start = base + timedelta(hours=2 * next(slots[psychologist_id]))
+                conn.execute(text(
+                    "INSERT INTO availability_blocks (psychologist_id, start_time, end_time, schedule_id) VALUES (:p, :start, :end, :s)"
+                ), {"p": psychologist_id, "start": start, "end": start + timedelta(minutes=rng.choice((60, 90))),
+                    "s": schedule_id if rng.random() < 0.5 else None})
+            elif blocks:
+                conn.execute(text("DELETE FROM availability_blocks WHERE id = :id"), {"id": rng.choice(blocks)})
+
+    # Baja de una serie: sus bloques se borran en la base (ON DELETE CASCADE)
+    with engine.begin() as conn:
+        conn.execute(text("PRAGMA foreign_keys = ON"))
+        conn.execute(text("DELETE FROM recurring_schedules WHERE psychologist_id = :p"), {"p": psychologist_ids[0]})
+
+def expected_weeks(conn, psychologist_id):
+    totals = {}
+    for start, end, status in conn.execute(text(
+        "SELECT start_time, end_time, status FROM appointments WHERE psychologist_id = :p"), {"p": psychologist_id}):
+        start, end = datetime.fromisoformat(str(start)), datetime.fromisoformat(str(end))
+        week = totals.setdefault(dashboard.week_start(start.date()), dict.fromkeys(dashboard.WEEK_COLUMNS, 0))
+        week["appointments"] += 1
+        week["cancelled"] += status in models.CANCELLED_STATUSES
+        week["scheduled"] += status == models.AppointmentStatus.AGENDADA.value
+        if status not in models.CANCELLED_STATUSES:
+            week["booked_minutes"] += round((end - start).total_seconds() / 60)
+    for start, end in conn.execute(text(
+        "SELECT start_time, end_time FROM availability_blocks WHERE psychologist_id = :p"), {"p": psychologist_id}):
+        start, end = datetime.fromisoformat(str(start)), datetime.fromisoformat(str(end))
+        week = totals.setdefault(dashboard.week_start(start.date()), dict.fromkeys(dashboard.WEEK_COLUMNS, 0))
+        week["available_minutes"] += round((end - start).total_seconds() / 60)
+    return totals
+
+async def check(operations, seed):
+    results = checks.Results()
+    expect = results.expect
+
+    engine = database.get_engine()
+    migrations.upgrade(engine)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        tokens = []
+        for n in range(3):
+            user = {"email": f"panel{n}@check.local", "password": "panel-password", "full_name": f"Panel {n}", "role": "psicologo"}
+            (await client.post("/register", json=user)).raise_for_status()
+            token = (await client.post("/token", data={"username": user["email"], "password": user["password"]})).json()
+            tokens.append({"Authorization": f"Bearer {token['access_token']}"})
+        with engine.connect() as conn:
+            psychologist_ids = conn.execute(text("SELECT id FROM users ORDER BY id")).scalars().all()
+
+        random_writes(engine, psychologist_ids, operations, random.Random(seed))
+        with engine.connect() as conn:
+            incremental = snapshot(conn)
+        dashboard.rebuild(engine, batch=2) # Varias tandas aunque haya pocos psicólogos
+        with engine.connect() as conn:
+            rebuilt = snapshot(conn)
+            expected = expected_weeks(conn, psychologist_ids[1])
+            patient_count = conn.execute(text("SELECT COUNT(*) FROM patients WHERE owner_id = :p"), {"p": psychologist_ids[1]}).scalar()
+
+        rows = sum(incremental[0][key][0] for key in incremental[0])
+        expect(f"triggers y reconstrucción coinciden en semanas ({len(rebuilt[0])} filas, {rows} citas)", incremental[0] == rebuilt[0])
+        expect(f"triggers y reconstrucción coinciden en pacientes ({sum(rebuilt[1].values())})", incremental[1] == rebuilt[1])
+
+        response = await client.get("/dashboard/", headers=tokens[1], params={"weeks_back": 6, "weeks_ahead": 6})
+        body = response.json()
+        served = {date.fromisoformat(week["week_start"]): week for week in body["weeks"]}
+        matches = all(
+            served[week]["appointments"] == values["appointments"]
+            and served[week]["cancelled"] == values["cancelled"]
+            and served[week]["booked_hours"] == round(values["booked_minutes"] / 60, 2)
+            and served[week]["available_hours"] == round(values["available_minutes"] / 60, 2)
+            for week, values in expected.items() if week in served
+        )
+        expect("GET /dashboard/ coincide con los totales calculados en Python", response.status_code == 200 and matches)
+        expect(f"GET /dashboard/ informa los pacientes ({body['patient_count']})", body["patient_count"] == patient_count)
+        expect("semanas sin actividad van en cero", len(body["weeks"]) == 13)
+    return results.ok()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(check(args.operations, args.seed)) else 1)
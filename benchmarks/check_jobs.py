@@ -0,0 +1,207 @@
+# benchmarks/check_jobs.py - COLA DE TAREAS DE PUNTA A PUNTA
+#
+# Uso:  python benchmarks/check_jobs.py [--bookings 30] [--fail-first 2]
+#
+# Levanta la app con su lifespan (workers incluidos) sobre una base SQLite
+# temporal, con el mailer falso fallando a propósito los primeros
+# `--fail-first` intentos de cada mensaje (menos que max_attempts, así el
+# resultado no depende del azar), y comprueba que:
+#   - reservar no espera a los efectos secundarios (latencia de POST)
+#   - cada cita termina con link de videollamada y su mail de confirmación
+#   - los fallos del mailer se reintentan con backoff hasta salir
+#   - una tarea con límite de concurrencia nunca corre más veces a la vez
+#   - una tarea tomada por un worker que "murió" se retoma al vencer el plazo
+#   - una tarea periódica que agota sus intentos igual queda reprogramada
+#   - /jobs/{id} informa el estado
+# Sale con código 1 si alguna comprobación falla.
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import checks
+
+def configure(fail_first):
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    checks.configure(
+        "check_jobs",
+        FAKE_MAILER_FAIL_FIRST=str(fail_first),
+        JOB_WORKERS="4",
+        JOB_POLL_SECONDS="0.05",
+        JOB_BACKOFF_SECONDS="0.02",
+        JOB_LEASE_SECONDS="1",
+    )
+
+async def wait_until_idle(timeout=60):
+    import database
+    import models
+    from sqlalchemy import and_, func, or_, select
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        async with database.AsyncSessionLocal() as db:
+            # Las programadas para más adelante (ej. dashboard_rebuild) no cuentan
+            busy = (await db.execute(select(func.count(models.Job.id)).where(or_(
+                models.Job.status == models.JobStatus.EN_CURSO.value,
+                and_(models.Job.status == models.JobStatus.PENDIENTE.value, models.Job.run_at <= datetime.utcnow()),
+            )))).scalar()
+        if not busy:
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+def enqueue_probes():
+    """
+    Diez tareas de concurrencia y una "abandonada": en curso con el plazo
+    vencido. Devuelve el id de la abandonada.
+    """
+    import database
+    import jobs
+    import models
+    db = database.get_session()
+    try:
+        for _ in range(10):
+            jobs.enqueue(db, "check_concurrency", owner_id=None)
+        abandoned = jobs.enqueue(db, "check_concurrency")
+        abandoned.status = models.JobStatus.EN_CURSO.value
+        abandoned.attempts = 1
+        abandoned.locked_until = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        return abandoned.id
+    finally:
+        db.close()
+
+def collect_results(appointment_ids, abandoned_id):
+    """
+    (citas con link, tareas fallidas, tareas reintentadas, estado de la
+    abandonada, id de una tarea de mail)
+    """
+    from sqlalchemy import func, select
+    import database
+    import models
+    db = database.get_session()
+    try:
+        links = db.execute(select(func.count(models.Appointment.id)).where(
+            models.Appointment.id.in_(appointment_ids), models.Appointment.video_call_link.isnot(None)
+        )).scalar()
+        failed = db.execute(select(func.count(models.Job.id)).where(
+            models.Job.status == models.JobStatus.FALLIDO.value
+        )).scalar()
+        retried = db.execute(select(func.count(models.Job.id)).where(models.Job.attempts > 1)).scalar()
+        abandoned_status = db.get(models.Job, abandoned_id).status
+        job_id = db.execute(select(models.Job.id).where(models.Job.kind == "appointment_email")).scalars().first()
+        return links, failed, retried, abandoned_status, job_id
+    finally:
+        db.close()
+
+def periodic_states():
+    """
+    Estados de las ejecuciones de la tarea periódica de prueba.
+    """
+    from sqlalchemy import select
+    import database
+    import models
+    db = database.get_session()
+    try:
+        return sorted(db.execute(select(models.Job.status).where(models.Job.kind == "check_periodic")).scalars())
+    finally:
+        db.close()
+
+async def check(bookings):
+    import httpx
+    from starlette.concurrency import run_in_threadpool
+    import database
+    import jobs
+    import main
+    import migrations
+    import models
+    import notifications
+
+    results = checks.Results()
+    expect = results.expect
+
+    # Tipo de tarea de prueba: mide cuántas corren a la vez
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    @jobs.job("check_concurrency", concurrency=2)
+    def _concurrency_probe(payload):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+
+    # Tarea periódica que siempre falla y no se reintenta
+    @jobs.job("check_periodic", max_attempts=1, every=3600)
+    def _failing_periodic(payload):
+        raise RuntimeError("falla a propósito")
+
+    migrations.upgrade(database.get_engine())
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+            user = {"email": "jobs@check.local", "password": "jobs-password", "full_name": "Cola", "role": "psicologo"}
+            (await client.post("/register", json=user)).raise_for_status()
+            token = (await client.post("/token", data={"username": user["email"], "password": user["password"]})).json()
+            auth = {"Authorization": f"Bearer {token['access_token']}"}
+            patient = (await client.post("/patients/", headers=auth, json={"nombre": "Paciente"})).json()
+            day = datetime(2030, 1, 7, 8)
+            (await client.post("/availability/blocks", headers=auth, json={
+                "start_time": day.isoformat(), "end_time": (day + timedelta(hours=bookings)).isoformat(),
+            })).raise_for_status()
+
+            latencies, appointment_ids = [], []
+            for i in range(bookings):
+                start = day + timedelta(hours=i)
+                started = time.perf_counter()
+                response = await client.post("/appointments/", headers=auth, json={
+                    "patient_id": patient["id"], "start_time": start.isoformat(),
+                    "end_time": (start + timedelta(minutes=50)).isoformat(),
+                })
+                latencies.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+                appointment_ids.append(response.json()["id"])
+            print(f"POST /appointments/ p50 {statistics.median(latencies):.1f} ms ({bookings} reservas)")
+
+            # La sesión síncrona va a un hilo: en el event loop bloquearía a
+            # los workers (aiosqlite) y SQLite respondería "database is locked"
+            abandoned_id = await run_in_threadpool(enqueue_probes)
+            jobs.wake()
+
+            expect("la cola se vacía", await wait_until_idle())
+
+            links, failed, retried, abandoned_status, job_id = await run_in_threadpool(
+                collect_results, appointment_ids, abandoned_id,
+            )
+            confirmations = sum(1 for email in notifications.outbox if email.subject == "Cita confirmada")
+
+            expect(f"todas las citas tienen link ({links}/{bookings})", links == bookings)
+            expect(f"un mail de confirmación por cita ({confirmations}/{bookings})", confirmations == bookings)
+            expect(f"hubo reintentos ({retried} tareas) y ninguna quedó fallida ({failed})",
+                   failed == 0 and (retried > 0 or notifications.FAKE_MAILER_FAIL_FIRST == 0))
+            expect(f"límite de concurrencia respetado (pico {peak[0]} de 2)", 0 < peak[0] <= 2)
+            expect("la tarea abandonada se retomó", abandoned_status == models.JobStatus.HECHO.value)
+
+            response = await client.get(f"/jobs/{job_id}", headers=auth)
+            expect("GET /jobs/{id} informa el estado", response.status_code == 200 and response.json()["status"] == "hecho")
+
+            await run_in_threadpool(jobs.schedule_periodic, "check_periodic", 0)
+            jobs.wake()
+            await wait_until_idle()
+            states = await run_in_threadpool(periodic_states)
+            expect(f"la tarea periódica fallida quedó reprogramada ({', '.join(states)})",
+                   states == [models.JobStatus.FALLIDO.value, models.JobStatus.PENDIENTE.value])
+    return results.ok()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=30)
+    parser.add_argument("--fail-first", type=int, default=2)
+    args = parser.parse_args()
+    configure(args.fail_first)
+    sys.exit(0 if asyncio.run(check(args.bookings)) else 1)
@@ -0,0 +1,112 @@
+# benchmarks/check_replica.py - RÉPLICA DE LECTURA CON DOS ARCHIVOS SQLITE
+#
+# Uso:  python benchmarks/check_replica.py
+#
+# Simula un primario y una réplica con dos bases SQLite temporales. La
+# "replicación" es manual (API de backup de sqlite3), así que entre copia y
+# copia la réplica está atrasada a propósito. Comprueba que:
+#   - quien escribe sigue viendo su escritura (lee del primario) durante
+#     DB_REPLICA_STICKY_SECONDS, por usuario del token y por cookie
+#   - pasado ese plazo, los GET leen de la réplica (y ven sus datos viejos)
+#   - el marketplace respeta lo mismo aunque tenga caché en memoria
+#   - las sesiones de réplica rechazan escrituras
+# Sale con código 1 si alguna comprobación falla.
+
+import asyncio
+import os
+import sqlite3
+import sys
+import time
+
+import checks
+
+STICKY_SECONDS = 1.0
+TMP = checks.configure("primary", DB_REPLICA_STICKY_SECONDS=str(STICKY_SECONDS), DB_POOL_WARMUP="0")
+PRIMARY = os.path.join(TMP, "primary.db")
+REPLICA = os.path.join(TMP, "replica.db")
+os.environ["REPLICA_DATABASE_URL"] = f"sqlite:///{REPLICA}"
+
+import httpx
+from sqlalchemy import exc
+
+import database
+import main
+import migrations
+import models
+
+def replicate():
+    """
+    Copia el primario sobre la réplica, como si la réplica se pusiera al día.
+    """
+    source, target = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+def client(**kwargs):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://check", **kwargs)
+
+async def patient_names(http, auth):
+    response = await http.get("/patients/", headers=auth)
+    response.raise_for_status()
+    return {patient["nombre"] for patient in response.json()["items"]}
+
+async def psychologist_names(http):
+    response = await http.get("/psychologists")
+    response.raise_for_status()
+    return {profile["nombre_completo"] for profile in response.json()}
+
+async def check():
+    results = checks.Results()
+    expect = results.expect
+
+    migrations.upgrade(database.get_engine())
+    async with client() as http:
+        credentials = {"email": "replica@check.local", "password": "replica-password"}
+        register = {**credentials, "full_name": "Nombre viejo", "role": "psicologo"}
+        (await http.post("/register", json=register)).raise_for_status()
+        login = {"username": credentials["email"], "password": credentials["password"]}
+        token = (await http.post("/token", data=login)).json()["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+    replicate()
+    time.sleep(STICKY_SECONDS + 0.1)
+
+    # Escritura y lectura inmediata con el mismo cliente (cookie + usuario)
+    async with client() as http:
+        (await http.post("/patients/", headers=auth, json={"nombre": "Paciente nuevo"})).raise_for_status()
+        expect("el que escribe ve su paciente al instante", "Paciente nuevo" in await patient_names(http, auth))
+    async with client() as http:
+        expect("otro cliente del mismo usuario también (por el token)", "Paciente nuevo" in await patient_names(http, auth))
+
+    time.sleep(STICKY_SECONDS + 0.1)
+    async with client() as http:
+        expect("pasado el plazo se lee de la réplica atrasada", "Paciente nuevo" not in await patient_names(http, auth))
+        replicate()
+        expect("cuando la réplica se pone al día aparece", "Paciente nuevo" in await patient_names(http, auth))
+
+    # Marketplace: público, sin token; la cookie marca al que escribió
+    async with client() as anonymous, client() as writer:
+        (await writer.put("/users/me/profile", headers=auth, json={"nombre_completo": "Nombre nuevo"})).raise_for_status()
+        # El anónimo vuelve a cachear desde la réplica; el que editó no usa esa caché
+        expect("un anónimo lee de la réplica (todavía sin el cambio)", "Nombre viejo" in await psychologist_names(anonymous))
+        expect("el que edita su perfil lo ve en el marketplace", "Nombre nuevo" in await psychologist_names(writer))
+
+    db = database.get_replica_session()
+    try:
+        db.add(models.Patient(nombre="No debería guardarse", owner_id=1))
+        db.flush()
+        expect("la sesión de réplica rechaza escrituras", False)
+    except exc.InvalidRequestError:
+        expect("la sesión de réplica rechaza escrituras", True)
+    finally:
+        db.close()
+
+    expect("pool_status informa la réplica", "replica" in database.pool_status())
+    await database.dispose()
+    return results.ok()
+
+if __name__ == "__main__":
+    print(f"Primario: {PRIMARY}\nRéplica:  {REPLICA}")
+    sys.exit(0 if asyncio.run(check()) else 1)
@@ -0,0 +1,54 @@
+# benchmarks/checks.py - LO COMÚN A LOS SCRIPTS check_*.py Y bench_*.py
+#
+# Cada check_*.py levanta la app en proceso sobre bases SQLite temporales e
+# imprime una línea [OK]/[FALLA] por comprobación. Acá se arma el entorno
+# (antes de importar la app: sus módulos leen las variables al importarse)
+# y se lleva la cuenta de resultados. Los bench_*.py usan solo configure().
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Lo que no esté definido en el entorno ni lo fije el script
+DEFAULTS = {
+    "HASH_WORKERS": "0",
+    "BCRYPT_ROUNDS": "4",
+    "LOG_LEVEL": "WARNING",
+    "JOB_WORKERS": "0",
+}
+
+def configure(name=None, reuse_database=False, **env):
+    """
+    Deja la raíz del repo en sys.path y fija el entorno: con `name`,
+    DATABASE_URL apunta a una base `name`.db en un directorio temporal nuevo
+    (con `reuse_database`, solo si DATABASE_URL no está definida); después
+    van las variables de `env` y, para el resto, DEFAULTS.
+    Devuelve el directorio temporal (None si no se creó).
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    directory = None
+    if name and not (reuse_database and "DATABASE_URL" in os.environ):
+        directory = tempfile.mkdtemp(prefix=f"notaio-{name}-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, f'{name}.db')}"
+    os.environ.update(env)
+    for key, value in DEFAULTS.items():
+        os.environ.setdefault(key, value)
+    return directory
+
+class Results:
+    """
+    Una línea [OK]/[FALLA] por comprobación; ok() si pasaron todas.
+    """
+
+    def __init__(self):
+        self.passed = []
+
+    def expect(self, description, condition):
+        self.passed.append(bool(condition))
+        print(f"[{'OK' if condition else 'FALLA'}] {description}")
+
+    def ok(self):
+        return all(self.passed)
@@ -0,0 +1,193 @@
+# benchmarks/seed.py - GENERADOR DE DATOS SINTÉTICOS REPRODUCIBLE
+#
+# Uso:  python benchmarks/seed.py [--scale 1.0] [--seed 42] [--batch 20000]
+#
+# Con --scale 1 genera, a través de las tablas de `models`:
+#   10.000 psicólogos (User + Profile)
+#   1.000.000 pacientes (100 por psicólogo)
+#   2.000.000 bloques de disponibilidad (200 días hábiles de 09:00 a 13:00)
+#   3.000.000 citas (300 por psicólogo, en turnos de una hora dentro de los
+#                    bloques y sin solapes; ~10% canceladas)
+# --scale 0.01 da un dataset chico para correr en segundos. Cada psicólogo
+# usa su propio generador aleatorio (seed + id), así el resultado es idéntico
+# entre corridas y no depende del tamaño del lote.
+#
+# Escribe en DATABASE_URL (o benchmarks/data/bench.db si no está definida),
+# aplica las migraciones y exige una base sin usuarios. Todos los usuarios
+# tienen la contraseña BENCH_PASSWORD.
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DEFAULT_DB}")
+os.environ.setdefault("HASH_WORKERS", "0")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from sqlalchemy import func, insert, select, text
+
+import database
+import hashing
+import migrations
+import models
+
+BENCH_PASSWORD = "bench-password"
+
+PSYCHOLOGISTS = 10_000
+PATIENTS_PER_PSYCHOLOGIST = 100
+BLOCK_DAYS = 200
+APPOINTMENTS_PER_PSYCHOLOGIST = 300
+CANCELLED_RATIO = 0.1
+
+FIRST_DAY = date(2025, 1, 6)  # lunes
+BLOCK_START_HOUR = 9
+BLOCK_HOURS = 4
+SEED_TIME = datetime(2025, 1, 1)
+
+FIRST_NAMES = ["Ana", "Bruno", "Carla", "Diego", "Elena", "Facundo", "Gabriela", "Hernán", "Inés", "Julián",
+               "Lucía", "Martín", "Natalia", "Óscar", "Paula", "Ramiro", "Sofía", "Tomás", "Valeria", "Zoe"]
+LAST_NAMES = ["García", "Pérez", "González", "Rodríguez", "Fernández", "López", "Martínez", "Sánchez",
+              "Romero", "Díaz", "Álvarez", "Torres", "Ruiz", "Ramírez", "Flores", "Benítez"]
+SPECIALTIES = ["ansiedad", "depresión", "terapia de pareja", "niños y adolescentes", "duelo", "estrés laboral",
+               "trastornos alimentarios", "adicciones", "autoestima", "ataques de pánico", "TOC", "insomnio"]
+APPROACHES = ["Terapia cognitivo conductual", "Psicoanálisis", "Terapia sistémica", "Gestalt",
+              "Terapia de aceptación y compromiso", "EMDR", "Terapia breve estratégica"]
+
+def business_days(count):
+    days, day = [], FIRST_DAY
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+def psychologist_rows(psychologist_id, rng, hashed_password, counts, ids):
+    """
+    Filas de todas las tablas para un psicólogo. `ids` lleva los próximos
+    ids de pacientes, bloques y citas (se asignan explícitamente para no
+    tener que leerlos de vuelta).
+    """
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    specialties = ", ".join(rng.sample(SPECIALTIES, 3))
+    user = {"id": psychologist_id, "email": f"psico{psychologist_id}@bench.local",
+            "hashed_password": hashed_password, "role": models.UserRole.PSICOLOGO.value}
+    profile = {"id": psychologist_id, "user_id": psychologist_id, "nombre_completo": name,
+               "descripcion": f"{rng.choice(APPROACHES)}. Especialista en {specialties}.",
+               "numero_licencia": f"MN-{psychologist_id:06d}", "updated_at": SEED_TIME}
+
+    patients = []
+    for _ in range(counts["patients"]):
+        patients.append({"id": ids["patients"], "owner_id": psychologist_id,
+                         "nombre": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                         "edad": rng.randint(12, 85), "dni": str(rng.randint(10_000_000, 45_000_000)),
+                         "telefono": f"11{rng.randint(10_000_000, 99_999_999)}"})
+        ids["patients"] += 1
+
+    blocks, slots_ = [], []
+    for day in counts["days"]:
+        start = datetime.combine(day, datetime.min.time()) + timedelta(hours=BLOCK_START_HOUR)
+        blocks.append({"id": ids["blocks"], "psychologist_id": psychologist_id, "start_time": start,
+                       "end_time": start + timedelta(hours=BLOCK_HOURS), "updated_at": SEED_TIME})
+        ids["blocks"] += 1
+        slots_.extend(start + timedelta(hours=h) for h in range(BLOCK_HOURS))
+
+    appointments = []
+    first_patient = patients[0]["id"] if patients else None
+    for start in sorted(rng.sample(slots_, min(counts["appointments"], len(slots_)))):
+        cancelled = rng.random() < CANCELLED_RATIO
+        appointments.append({
+            "id": ids["appointments"], "psychologist_id": psychologist_id,
+            "patient_id": first_patient + rng.randrange(len(patients)) if patients else None,
+            "start_time": start, "end_time": start + timedelta(hours=1),
+            "status": rng.choice(models.CANCELLED_STATUSES) if cancelled else (
+                models.AppointmentStatus.COMPLETADA.value if start.date() < date(2025, 6, 1)
+                else models.AppointmentStatus.AGENDADA.value),
+            "version": 1,
+        })
+        ids["appointments"] += 1
+    return user, profile, patients, blocks, appointments
+
+def seed(scale=1.0, seed_value=42, batch=20_000, quiet=False):
+    """
+    Llena la base. Devuelve un dict con las cantidades insertadas.
+    """
+    engine = database.get_engine()
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        if conn.execute(select(func.count(models.User.id))).scalar():
+            raise SystemExit("La base ya tiene usuarios: use una base vacía (o borre benchmarks/data/bench.db)")
+
+    n_psychologists = max(1, int(PSYCHOLOGISTS * scale))
+    counts = {"patients": PATIENTS_PER_PSYCHOLOGIST, "days": business_days(BLOCK_DAYS),
+              "appointments": APPOINTMENTS_PER_PSYCHOLOGIST}
+    hashed_password = hashing.hash_password(BENCH_PASSWORD)
+    ids = {"patients": 1, "blocks": 1, "appointments": 1}
+    totals = dict.fromkeys(["users", "patients", "blocks", "appointments"], 0)
+    tables = [models.User, models.Profile, models.Patient, models.AvailabilityBlock, models.Appointment]
+    started = time.perf_counter()
+
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            # Durabilidad off solo durante la carga: si se corta, se vuelve a generar
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        pending = {model: [] for model in tables}
+
+        def flush():
+            for model in tables:
+                if pending[model]:
+                    conn.execute(insert(model), pending[model])
+                    pending[model] = []
+            conn.commit()
+
+        for psychologist_id in range(1, n_psychologists + 1):
+            rng = random.Random(seed_value * 1_000_003 + psychologist_id)
+            user, profile, patients, blocks, appointments = psychologist_rows(
+                psychologist_id, rng, hashed_password, counts, ids
+            )
+            pending[models.User].append(user)
+            pending[models.Profile].append(profile)
+            pending[models.Patient].extend(patients)
+            pending[models.AvailabilityBlock].extend(blocks)
+            pending[models.Appointment].extend(appointments)
+            totals["users"] += 1
+            totals["patients"] += len(patients)
+            totals["blocks"] += len(blocks)
+            totals["appointments"] += len(appointments)
+            if len(pending[models.Appointment]) >= batch:
+                flush()
+                if not quiet:
+                    rate = sum(totals.values()) / (time.perf_counter() - started)
+                    print(f"  {psychologist_id}/{n_psychologists} psicólogos ({rate:,.0f} filas/s)", flush=True)
+        flush()
+
+        if engine.dialect.name == "postgresql":
+            # Los ids se asignaron a mano: sincronizamos las secuencias
+            for model in tables:
+                table = model.__tablename__
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+                ))
+            conn.commit()
+        else:
+            conn.exec_driver_sql("ANALYZE")
+            conn.commit()
+
+    totals["seconds"] = round(time.perf_counter() - started, 1)
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=20_000)
+    args = parser.parse_args()
+    if os.environ["DATABASE_URL"].endswith(DEFAULT_DB):
+        os.makedirs(os.path.dirname(DEFAULT_DB), exist_ok=True)
+    print(f"Generando datos en {os.environ['DATABASE_URL']} (scale={args.scale}, seed={args.seed})")
+    print(seed(args.scale, args.seed, args.batch))
@@ -0,0 +1,96 @@
+# conflicts.py - DETECCIÓN DE SOLAPAMIENTOS EN LA AGENDA
+#
+# Como los bloques (y las citas activas) de un psicólogo nunca se solapan
+# entre sí, ordenados por inicio también quedan ordenados por fin. Entonces
+# el único que puede chocar con un intervalo nuevo [inicio, fin) es su
+# "predecesor": el de mayor start_time < fin. Basta UNA lectura hacia atrás
+# sobre el índice (psychologist_id, start_time) para saberlo, sin importar
+# cuántas filas tenga el calendario.
+#
+# La base de datos aplica la misma regla para cubrir las carreras entre
+# peticiones: restricción EXCLUDE en Postgres y triggers en SQLite
+# (ver la migración 4 en migrations.py).
+
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+import models
+
+def _predecessor(db: Session, model, psychologist_id: int, end: datetime, exclude_id: Optional[int], *extra):
+    query = select(model.id, model.start_time, model.end_time).where(
+        model.psychologist_id == psychologist_id,
+        model.start_time < end,
+        *extra,
+    )
+    if exclude_id is not None:
+        query = query.where(model.id != exclude_id)
+    return db.execute(query.order_by(model.start_time.desc()).limit(1)).first()
+
+def find_block_conflict(
+    db: Session, psychologist_id: int, start: datetime, end: datetime, exclude_id: Optional[int] = None
+):
+    """
+    Devuelve (id, start_time, end_time) del bloque que se solapa con
+    [start, end), o None.
+    """
+    row = _predecessor(db, models.AvailabilityBlock, psychologist_id, end, exclude_id)
+    return row if row is not None and row.end_time > start else None
+
+def find_appointment_conflict(
+    db: Session, psychologist_id: int, start: datetime, end: datetime, exclude_id: Optional[int] = None
+):
+    """
+    Devuelve (id, start_time, end_time) de la cita activa que se solapa con
+    [start, end), o None. Las citas canceladas no ocupan el horario.
+    """
+    # Misma condición literal que el índice parcial, para que el planificador lo use
+    row = _predecessor(db, models.Appointment, psychologist_id, end, exclude_id, models.ACTIVE_APPOINTMENT_CONDITION)
+    return row if row is not None and row.end_time > start else None
+
+def lock_containing_block(db: Session, psychologist_id: int, start: datetime, end: datetime):
+    """
+    Devuelve (id, start_time, end_time) del bloque de disponibilidad que
+    contiene por completo [start, end), o None. En Postgres la fila queda
+    bloqueada (SELECT ... FOR UPDATE) hasta el final de la transacción, así
+    las reservas que compiten por el mismo bloque se ordenan de a una sin
+    frenar al resto de la agenda. SQLite ignora FOR UPDATE: ahí las
+    escrituras ya van de a una y los triggers de la migración 4 hacen de red.
+    """
+    block = models.AvailabilityBlock
+    row = db.execute(
+        select(block.id, block.start_time, block.end_time)
+        .where(block.psychologist_id == psychologist_id, block.start_time <= start)
+        .order_by(block.start_time.desc())
+        .limit(1)
+        .with_for_update()
+    ).first()
+    return row if row is not None and row.end_time >= end else None
+
+def drop_overlapping(db: Session, psychologist_id: int, rows: List[Dict]) -> List[Dict]:
+    """
+    Filtra de un lote de bloques nuevos (ordenados y sin solapes entre sí)
+    los que chocan con bloques existentes. Usa una sola consulta de rango y
+    un barrido lineal, para poder insertar el resto en un único INSERT.
+    """
+    if not rows:
+        return rows
+    block = models.AvailabilityBlock
+    existing = db.execute(
+        select(block.start_time, block.end_time)
+        .where(
+            block.psychologist_id == psychologist_id,
+            block.start_time < rows[-1]["end_time"],
+            block.end_time > rows[0]["start_time"],
+        )
+        .order_by(block.start_time)
+    ).all()
+
+    kept, j = [], 0
+    for row in rows:
+        while j < len(existing) and existing[j].end_time <= row["start_time"]:
+            j += 1
+        if j < len(existing) and existing[j].start_time < row["end_time"]:
+            continue
+        kept.append(row)
+    return kept
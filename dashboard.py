@@ -0,0 +1,233 @@
+# dashboard.py - RESUMEN PRECALCULADO PARA EL PANEL DEL PSICÓLOGO
+#
+# El panel muestra, por semana, citas, cancelaciones, turnos agendados y
+# utilización (horas reservadas / horas de disponibilidad), más la cantidad
+# de pacientes. Calcularlo desde `appointments`, `availability_blocks` y
+# `patients` en cada carga no escala, así que se guarda resumido:
+#
+#   dashboard_weeks      una fila por (psicólogo, lunes de la semana)
+#   dashboard_summaries  una fila por psicólogo (pacientes)
+#
+# Triggers de la base (SQLite y Postgres) aplican cada INSERT/UPDATE/DELETE
+# como una diferencia sobre esas filas, así que ningún camino de escritura
+# (ORM, INSERT masivos, cascadas) puede olvidarse de actualizarlas. Una
+# cita o bloque cuenta en la semana en que empieza. Las tablas de archivo
+# (archive.py) tienen los mismos triggers: archivar resta de la tabla
+# caliente y suma en la de archivo, y el resumen no cambia.
+#
+# rebuild() las recalcula desde cero por tandas de psicólogos. Corre en la
+# migración que las crea, periódicamente en la cola de tareas (reparación
+# ante cualquier deriva) y a mano con `python manage.py rebuild-dashboard`.
+#
+# DASHBOARD_REBUILD_SECONDS  cada cuánto se reconstruye (por defecto 24 h)
+
+import os
+from datetime import date, timedelta
+from typing import Dict, List
+from sqlalchemy import and_, select, text
+import database
+import jobs
+import models
+
+DASHBOARD_REBUILD_SECONDS = int(os.getenv("DASHBOARD_REBUILD_SECONDS", str(24 * 3600)))
+REBUILD_BATCH = 500
+
+WEEK_COLUMNS = ("appointments", "cancelled", "scheduled", "booked_minutes", "available_minutes")
+
+LIVE_TABLES = ("appointments", "availability_blocks", "patients")
+ARCHIVE_TABLES = ("appointments_archive", "availability_blocks_archive")
+
+# --- Expresiones SQL por motor ---
+
+def _week(dialect, column):
+    if dialect == "postgresql":
+        return f"CAST(date_trunc('week', {column}) AS date)"
+    # 'weekday 0' avanza al domingo (o se queda si ya lo es); -6 días = lunes
+    return f"date({column}, 'weekday 0', '-6 days')"
+
+def _minutes(dialect, start, end):
+    if dialect == "postgresql":
+        return f"CAST(ROUND(EXTRACT(EPOCH FROM ({end} - {start})) / 60) AS INTEGER)"
+    return f"CAST(ROUND((julianday({end}) - julianday({start})) * 1440) AS INTEGER)"
+
+def _appointment_values(dialect, row=None):
+    """
+    Aporte de una cita a cada columna de dashboard_weeks. `row` es NEW/OLD
+    en un trigger, o None para leer la tabla directamente.
+    """
+    p = f"{row}." if row else ""
+    active = f"{p}{models.ACTIVE_APPOINTMENT_CONDITION.text}"
+    return {
+        "appointments": "1",
+        "cancelled": f"CASE WHEN {active} THEN 0 ELSE 1 END",
+        "scheduled": f"CASE WHEN {p}status = '{models.AppointmentStatus.AGENDADA.value}' THEN 1 ELSE 0 END",
+        "booked_minutes": f"CASE WHEN {active} THEN {_minutes(dialect, p + 'start_time', p + 'end_time')} ELSE 0 END",
+        "available_minutes": "0",
+    }
+
+def _block_values(dialect, row=None):
+    p = f"{row}." if row else ""
+    return {
+        "appointments": "0",
+        "cancelled": "0",
+        "scheduled": "0",
+        "booked_minutes": "0",
+        "available_minutes": _minutes(dialect, p + "start_time", p + "end_time"),
+    }
+
+# --- Triggers (diferencias fila a fila) ---
+
+def _week_delta(dialect, values, row, sign):
+    columns = ", ".join(WEEK_COLUMNS)
+    deltas = ", ".join(f"{sign}({values[column]})" for column in WEEK_COLUMNS)
+    updates = ", ".join(f"{column} = dashboard_weeks.{column} + excluded.{column}" for column in WEEK_COLUMNS)
+    # INSERT ... SELECT ... WHERE: el WHERE evita la ambigüedad de SQLite con ON CONFLICT
+    return (
+        f"INSERT INTO dashboard_weeks (psychologist_id, week_start, {columns}) "
+        f"SELECT {row}.psychologist_id, {_week(dialect, row + '.start_time')}, {deltas} "
+        f"WHERE {row}.psychologist_id IS NOT NULL "
+        f"ON CONFLICT (psychologist_id, week_start) DO UPDATE SET {updates}"
+    )
+
+def _patient_delta(row, sign):
+    return (
+        "INSERT INTO dashboard_summaries (psychologist_id, patient_count) "
+        f"SELECT {row}.owner_id, {sign}1 WHERE {row}.owner_id IS NOT NULL "
+        "ON CONFLICT (psychologist_id) DO UPDATE SET "
+        "patient_count = dashboard_summaries.patient_count + excluded.patient_count"
+    )
+
+# (tabla, columnas que afectan el resumen, aporte de una fila)
+def _sources(dialect):
+    appointment = lambda row, sign: _week_delta(dialect, _appointment_values(dialect, row), row, sign)
+    block = lambda row, sign: _week_delta(dialect, _block_values(dialect, row), row, sign)
+    return [
+        ("appointments", "start_time, end_time, status, psychologist_id", appointment),
+        ("availability_blocks", "start_time, end_time, psychologist_id", block),
+        ("patients", "owner_id", _patient_delta),
+        ("appointments_archive", "start_time, end_time, status, psychologist_id", appointment),
+        ("availability_blocks_archive", "start_time, end_time, psychologist_id", block),
+    ]
+
+def trigger_ddl(dialect, tables=LIVE_TABLES + ARCHIVE_TABLES) -> List[str]:
+    statements = []
+    for table, columns, delta in _sources(dialect):
+        if table not in tables:
+            continue
+        if dialect == "sqlite":
+            statements += [
+                f"CREATE TRIGGER IF NOT EXISTS trg_dashboard_{table}_insert AFTER INSERT ON {table} "
+                f"BEGIN {delta('NEW', '+')}; END",
+                f"CREATE TRIGGER IF NOT EXISTS trg_dashboard_{table}_delete AFTER DELETE ON {table} "
+                f"BEGIN {delta('OLD', '-')}; END",
+                f"CREATE TRIGGER IF NOT EXISTS trg_dashboard_{table}_update AFTER UPDATE OF {columns} ON {table} "
+                f"BEGIN {delta('OLD', '-')}; {delta('NEW', '+')}; END",
+            ]
+        elif dialect == "postgresql":
+            statements += [
+                f"""
+                CREATE OR REPLACE FUNCTION dashboard_{table}_delta() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP <> 'INSERT' THEN {delta('OLD', '-')}; END IF;
+                    IF TG_OP <> 'DELETE' THEN {delta('NEW', '+')}; END IF;
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+                """,
+                f"DROP TRIGGER IF EXISTS trg_dashboard_{table} ON {table}",
+                f"CREATE TRIGGER trg_dashboard_{table} AFTER INSERT OR DELETE OR UPDATE OF {columns} ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION dashboard_{table}_delta()",
+            ]
+    return statements
+
+# --- Reconstrucción completa ---
+
+def rebuild_range(conn, low, high, archived=True):
+    """
+    Recalcula los psicólogos con low < id <= high en la transacción de `conn`.
+    Con archived=False ignora las tablas de archivo (solo para la migración
+    que creó el resumen, anterior a ellas).
+    """
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        # Espera a las escrituras en curso y frena las nuevas hasta el COMMIT:
+        # sus triggers se aplican después, sobre las filas ya recalculadas
+        conn.execute(text("LOCK TABLE dashboard_weeks, dashboard_summaries IN SHARE ROW EXCLUSIVE MODE"))
+    scope = "{column} > :low AND {column} <= :high"
+    params = {"low": low, "high": high}
+    columns = ", ".join(WEEK_COLUMNS)
+
+    def source(table, values):
+        return (
+            f"SELECT psychologist_id, {_week(dialect, 'start_time')} AS week_start, "
+            + ", ".join(f"{values[column]} AS {column}" for column in WEEK_COLUMNS)
+            + f" FROM {table} WHERE {scope.format(column='psychologist_id')}"
+        )
+
+    sources = [source("appointments", _appointment_values(dialect)), source("availability_blocks", _block_values(dialect))]
+    if archived:
+        sources += [
+            source("appointments_archive", _appointment_values(dialect)),
+            source("availability_blocks_archive", _block_values(dialect)),
+        ]
+    conn.execute(text(f"DELETE FROM dashboard_weeks WHERE {scope.format(column='psychologist_id')}"), params)
+    conn.execute(text(
+        f"INSERT INTO dashboard_weeks (psychologist_id, week_start, {columns}) "
+        f"SELECT psychologist_id, week_start, {', '.join(f'SUM({c})' for c in WEEK_COLUMNS)} FROM ("
+        + " UNION ALL ".join(sources)
+        + ") AS contributions GROUP BY psychologist_id, week_start"
+    ), params)
+    conn.execute(text(f"DELETE FROM dashboard_summaries WHERE {scope.format(column='psychologist_id')}"), params)
+    conn.execute(text(
+        "INSERT INTO dashboard_summaries (psychologist_id, patient_count) "
+        f"SELECT owner_id, COUNT(*) FROM patients WHERE {scope.format(column='owner_id')} GROUP BY owner_id"
+    ), params)
+
+def rebuild(engine, batch=REBUILD_BATCH) -> int:
+    """
+    Recalcula todo el resumen, `batch` psicólogos por transacción para no
+    bloquear las escrituras mucho tiempo. Devuelve cuántas tandas corrió.
+    """
+    with engine.connect() as conn:
+        max_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM users")).scalar()
+    batches = 0
+    for low in range(0, max_id, batch):
+        with engine.begin() as conn:
+            rebuild_range(conn, low, low + batch)
+        batches += 1
+    return batches
+
+@jobs.job("dashboard_rebuild", max_attempts=3, concurrency=1, every=DASHBOARD_REBUILD_SECONDS)
+def rebuild_job(payload):
+    rebuild(database.get_engine())
+
+def schedule_rebuild():
+    jobs.schedule_periodic("dashboard_rebuild", DASHBOARD_REBUILD_SECONDS)
+
+# --- Lectura ---
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+def load(db, psychologist_id: int, first_week: date, last_week: date):
+    """
+    Una sola consulta por clave primaria: el resumen del psicólogo y sus
+    semanas en [first_week, last_week]. Devuelve (pacientes, {lunes: fila}).
+    """
+    weeks = models.DashboardWeek
+    summary = models.DashboardSummary
+    rows = db.execute(
+        select(summary.patient_count, weeks.week_start, *(getattr(weeks, c) for c in WEEK_COLUMNS))
+        .select_from(models.User)
+        .outerjoin(summary, summary.psychologist_id == models.User.id)
+        .outerjoin(weeks, and_(
+            weeks.psychologist_id == models.User.id,
+            weeks.week_start >= first_week,
+            weeks.week_start <= last_week,
+        ))
+        .where(models.User.id == psychologist_id)
+        .order_by(weeks.week_start)
+    ).all()
+    patient_count = rows[0].patient_count if rows and rows[0].patient_count is not None else 0
+    by_week: Dict[date, object] = {row.week_start: row for row in rows if row.week_start is not None}
+    return patient_count, by_week
@@ -1,31 +1,382 @@
 # database.py - CONFIGURADO PARA SUPABASE
+#
+# Importar este módulo no abre conexiones ni lee el .env: el motor se crea
+# la primera vez que se pide (get_engine) y la app lo precalienta en su
+# lifespan. Los puntos de entrada (main.py, manage.py) cargan el .env.
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from dotenv import load_dotenv
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 import os
+import threading
+import time
 
-# 1. Cargar las variables de entorno desde el archivo .env
-load_dotenv()
+def database_url():
+    """
+    URL de la base de datos desde las variables de entorno.
+    """
+    url = os.getenv("DATABASE_URL")
+    # --- Verificación Crucial ---
+    if not url:
+        raise Exception(
+            "No se encontró la variable de entorno DATABASE_URL. "
+            "Asegúrate de que el archivo .env exista en el directorio raíz "
+            "y contenga la variable DATABASE_URL."
+        )
+    return url
 
-# 2. Obtener la URL de la base de datos desde las variables de entorno
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+# --- Configuración del pool de conexiones (desde el .env) ---
+# DB_POOL_SIZE            conexiones permanentes por worker
+# DB_MAX_OVERFLOW         conexiones extra permitidas en picos
+# DB_POOL_TIMEOUT         segundos esperando una conexión libre antes de fallar
+# DB_POOL_RECYCLE         segundos tras los que se recicla una conexión (evita las "viejas")
+# DB_POOL_PRE_PING        valida la conexión antes de usarla (1/0)
+# DB_STATEMENT_TIMEOUT_MS tiempo máximo por sentencia en Postgres (0 = sin límite)
+# DB_APPLICATION_NAME     nombre con el que aparecemos en pg_stat_activity
+# DB_POOL_WARMUP          conexiones que se abren al arrancar (0 = ninguna)
+# DB_REPLICA_STICKY_SECONDS tras una escritura, segundos en que ese cliente
+#                         sigue leyendo del primario (ver "Réplica de lectura")
 
+def _env_bool(name, default):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
 
-# --- Verificación Crucial ---
-if not SQLALCHEMY_DATABASE_URL:
-    raise Exception(
-        "No se encontró la variable de entorno DATABASE_URL. "
-        "Asegúrate de que el archivo .env exista en el directorio raíz "
-        "y contenga la variable DATABASE_URL."
-    )
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "1")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "notaio-api")
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "1"))
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
 
-# 3. Crear el "motor" de SQLAlchemy, ahora sin los argumentos específicos de SQLite
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# --- Telemetría del pool ---
 
-# 4. Configurar la fábrica de sesiones (esto no cambia)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class PoolTelemetry:
+    """
+    Acumula cuánto esperan las peticiones para obtener una conexión del pool.
+    """
 
-# 5. Centralizar la Base declarativa para que los modelos la importen desde aquí
-Base = declarative_base()
\ No newline at end of file
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, seconds, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+class _TimedPoolMixin:
+    telemetry = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.telemetry.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.telemetry.record(time.perf_counter() - started)
+        return connection
+
+def _timed_pool_class(base, telemetry):
+    # Subclase por motor: el pool se recrea con self.__class__ y conserva la telemetría
+    return type(f"Timed{base.__name__}", (_TimedPoolMixin, base), {"telemetry": telemetry})
+
+primary_pool_telemetry = PoolTelemetry()
+async_pool_telemetry = PoolTelemetry()
+replica_pool_telemetry = PoolTelemetry()
+replica_async_pool_telemetry = PoolTelemetry()
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options(url, base_pool, telemetry, is_async=False):
+    """
+    Argumentos de create_engine/create_async_engine según el backend y el .env.
+    """
+    url = make_url(url)
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if not _is_memory_sqlite(url):
+        options.update(
+            poolclass=_timed_pool_class(base_pool, telemetry),
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+
+    connect_args = {}
+    if url.get_backend_name() == "postgresql":
+        if is_async:
+            # asyncpg recibe los parámetros de sesión como server_settings
+            server_settings = {"application_name": DB_APPLICATION_NAME}
+            if DB_STATEMENT_TIMEOUT_MS:
+                server_settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+            connect_args["server_settings"] = server_settings
+        else:
+            connect_args["application_name"] = DB_APPLICATION_NAME
+            if DB_STATEMENT_TIMEOUT_MS:
+                connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    options["connect_args"] = connect_args
+    return options
+
+# La fábrica de sesiones existe desde el inicio; get_engine() la enlaza al
+# motor cuando este se crea.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """
+    Crea (una sola vez) el motor de SQLAlchemy con el pool configurado
+    desde el .env. Crear el motor no conecta: la primera conexión se abre
+    al usarlo o en warm_up().
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = database_url()
+                engine = create_engine(url, **engine_options(url, QueuePool, primary_pool_telemetry))
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+def get_session():
+    """
+    Nueva sesión síncrona, creando el motor si hace falta.
+    """
+    get_engine()
+    return SessionLocal()
+
+# Centralizar la Base declarativa para que los modelos la importen desde aquí
+Base = declarative_base()
+
+# --- Modo asíncrono (AsyncEngine / AsyncSession) ---
+# Los endpoints `async def` usan este motor para no ocupar un hilo del
+# threadpool durante la consulta. Localmente corre sobre aiosqlite y en
+# producción sobre asyncpg. Se puede forzar otra URL con ASYNC_DATABASE_URL.
+
+def to_async_url(url):
+    """
+    Traduce una URL síncrona a su driver asíncrono equivalente.
+    Devuelve (url, connect_args).
+    """
+    url = make_url(url)
+    connect_args = {}
+    if url.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        # asyncpg no entiende `sslmode`; lo pasamos como argumento `ssl`
+        sslmode = url.query.get("sslmode")
+        if sslmode:
+            url = url.difference_update_query(["sslmode"])
+            if sslmode != "disable":
+                connect_args["ssl"] = sslmode
+        url = url.set(drivername="postgresql+asyncpg")
+    elif url.drivername in ("sqlite", "sqlite+pysqlite"):
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url, connect_args
+
+# La fábrica existe desde el inicio; el motor se crea la primera vez que se
+# usa, así los scripts síncronos no necesitan tener instalado el driver async.
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+_async_engine = None
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                url, connect_args = to_async_url(os.getenv("ASYNC_DATABASE_URL") or database_url())
+                options = engine_options(url, AsyncAdaptedQueuePool, async_pool_telemetry, is_async=True)
+                options["connect_args"].update(connect_args)
+                engine = create_async_engine(url, **options)
+                AsyncSessionLocal.configure(bind=engine)
+                _async_engine = engine
+    return _async_engine
+
+# --- Réplica de lectura ---
+# REPLICA_DATABASE_URL (opcional) apunta a una réplica de solo lectura del
+# primario; ASYNC_REPLICA_DATABASE_URL fuerza la URL del motor asíncrono.
+# Los GET que solo leen piden su sesión con auth.get_read_db /
+# get_async_read_db. Sin réplica configurada, esas sesiones usan los motores
+# del primario, así que el código es el mismo en ambos casos.
+#
+# Las sesiones de réplica rechazan cualquier flush: un handler que escriba
+# por error falla también en desarrollo, no solo contra la réplica real.
+# Localmente se prueba con dos archivos SQLite (ver benchmarks/check_replica.py).
+
+class ReadOnlySession(Session):
+    pass
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def _reject_flush(session, flush_context, instances):
+    raise exc.InvalidRequestError("Sesión de solo lectura (réplica): use get_db para escribir")
+
+def replica_url():
+    return os.getenv("REPLICA_DATABASE_URL") or None
+
+ReplicaSessionLocal = sessionmaker(class_=ReadOnlySession, autocommit=False, autoflush=False)
+AsyncReplicaSessionLocal = async_sessionmaker(
+    class_=AsyncSession, sync_session_class=ReadOnlySession, autoflush=False, expire_on_commit=False
+)
+_replica_engine = None
+_replica_async_engine = None
+
+def get_replica_engine():
+    """
+    Motor de la réplica, o el del primario si no hay réplica configurada.
+    """
+    global _replica_engine
+    if _replica_engine is None:
+        url = replica_url()
+        if url is None:
+            engine = get_engine()
+        else:
+            with _engine_lock:
+                if _replica_engine is not None:
+                    return _replica_engine
+                engine = create_engine(url, **engine_options(url, QueuePool, replica_pool_telemetry))
+        ReplicaSessionLocal.configure(bind=engine)
+        _replica_engine = engine
+    return _replica_engine
+
+def get_replica_async_engine():
+    global _replica_async_engine
+    if _replica_async_engine is None:
+        url = os.getenv("ASYNC_REPLICA_DATABASE_URL") or replica_url()
+        if url is None:
+            engine = get_async_engine()
+        else:
+            with _engine_lock:
+                if _replica_async_engine is not None:
+                    return _replica_async_engine
+                url, connect_args = to_async_url(url)
+                options = engine_options(url, AsyncAdaptedQueuePool, replica_async_pool_telemetry, is_async=True)
+                options["connect_args"].update(connect_args)
+                engine = create_async_engine(url, **options)
+        AsyncReplicaSessionLocal.configure(bind=engine)
+        _replica_async_engine = engine
+    return _replica_async_engine
+
+def get_replica_session():
+    get_replica_engine()
+    return ReplicaSessionLocal()
+
+def has_replica():
+    return replica_url() is not None
+
+# --- Arranque y apagado (los llama el lifespan de main.py) ---
+
+def warm_up(connections=None):
+    """
+    Crea el motor y abre `connections` conexiones (DB_POOL_WARMUP por
+    defecto) a la vez, con un SELECT 1 cada una, para que las primeras
+    peticiones no paguen el handshake. Devuelve los segundos que tardó.
+    """
+    connections = DB_POOL_WARMUP if connections is None else connections
+    started = time.perf_counter()
+    engines = [get_engine()] + ([get_replica_engine()] if has_replica() else [])
+    opened = []
+    try:
+        for engine in engines:
+            for _ in range(connections):
+                conn = engine.connect()
+                opened.append(conn)
+                conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+    return time.perf_counter() - started
+
+async def warm_up_async(connections=None):
+    """
+    Igual que warm_up() para el motor asíncrono.
+    """
+    connections = DB_POOL_WARMUP if connections is None else connections
+    started = time.perf_counter()
+    engines = [get_async_engine()] + ([get_replica_async_engine()] if has_replica() else [])
+    opened = []
+    try:
+        for engine in engines:
+            for _ in range(connections):
+                conn = await engine.connect()
+                opened.append(conn)
+                await conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            await conn.close()
+    return time.perf_counter() - started
+
+async def dispose():
+    """
+    Cierra los pools de todos los motores y olvida los motores.
+    """
+    global _engine, _async_engine, _replica_engine, _replica_async_engine
+    if _replica_async_engine is not None:
+        if _replica_async_engine is not _async_engine:
+            await _replica_async_engine.dispose()
+        _replica_async_engine = None
+    if _replica_engine is not None:
+        if _replica_engine is not _engine:
+            _replica_engine.dispose()
+        _replica_engine = None
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+# --- Estadísticas en vivo del pool ---
+
+def _describe_pool(pool, telemetry):
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            # QueuePool cuenta el overflow desde -pool_size; solo nos interesa el exceso
+            overflow=max(pool.overflow(), 0),
+            max_overflow=DB_MAX_OVERFLOW,
+        )
+    stats.update(telemetry.snapshot())
+    return stats
+
+def pool_status():
+    """
+    Conexiones en uso, overflow y tiempos de espera de cada motor.
+    """
+    status = {}
+    if _engine is not None:
+        status["primary"] = _describe_pool(_engine.pool, primary_pool_telemetry)
+    if _async_engine is not None:
+        status["async"] = _describe_pool(_async_engine.sync_engine.pool, async_pool_telemetry)
+    # Sin réplica configurada, los motores de réplica son los del primario
+    if _replica_engine is not None and _replica_engine is not _engine:
+        status["replica"] = _describe_pool(_replica_engine.pool, replica_pool_telemetry)
+    if _replica_async_engine is not None and _replica_async_engine is not _async_engine:
+        status["replica_async"] = _describe_pool(
+            _replica_async_engine.sync_engine.pool, replica_async_pool_telemetry
+        )
+    return status
@@ -0,0 +1,109 @@
+# hashing.py - HASHING DE CONTRASEÑAS EN UN POOL DE PROCESOS DEDICADO
+#
+# bcrypt es caro a propósito. Si corre en los hilos de las peticiones, una
+# ráfaga de logins ocupa todo el threadpool y frena al resto de la API.
+# Aquí el trabajo se envía a un pool de procesos de tamaño fijo y, si hay
+# más peticiones en vuelo de las que admite, respondemos 503 al instante.
+#
+# Variables de entorno:
+#   BCRYPT_ROUNDS         costo de bcrypt (por defecto 12)
+#   HASH_WORKERS          procesos del pool (0 = hashear en el propio hilo)
+#   HASH_MAX_PENDING      máximo de operaciones en vuelo antes de devolver 503
+#   HASH_TIMEOUT_SECONDS  espera máxima por un resultado
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(max(HASH_WORKERS, 1) * 4)))
+HASH_TIMEOUT_SECONDS = float(os.getenv("HASH_TIMEOUT_SECONDS", "10"))
+
+# Contexto único de passlib, compartido por auth.py y security.py.
+# Los hashes con un costo distinto de BCRYPT_ROUNDS quedan marcados
+# como "a actualizar" y se rehashean en el siguiente login.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# --- Funciones que corren dentro de los procesos del pool ---
+
+def _hash(password):
+    return pwd_context.hash(password)
+
+def _verify_and_update(plain_password, hashed_password):
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False, None
+    if pwd_context.needs_update(hashed_password):
+        return True, pwd_context.hash(plain_password)
+    return True, None
+
+# --- Pool y control de concurrencia ---
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(HASH_MAX_PENDING)
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # "spawn" evita copiar con fork los hilos y conexiones del servidor
+                _pool = ProcessPoolExecutor(
+                    max_workers=HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+def _saturated():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="El servicio de autenticación está saturado, intente nuevamente",
+        headers={"Retry-After": "1"},
+    )
+
+def _run(func, *args):
+    if not _pending.acquire(blocking=False):
+        raise _saturated()
+    if HASH_WORKERS <= 0:
+        try:
+            return func(*args)
+        finally:
+            _pending.release()
+    try:
+        future = _get_pool().submit(func, *args)
+    except BaseException:
+        _pending.release()
+        raise
+    # El lugar se libera cuando el pool termina (o descarta) el trabajo, no
+    # cuando se deja de esperar: así HASH_MAX_PENDING acota también la cola
+    # del pool aunque las peticiones venzan
+    future.add_done_callback(lambda _: _pending.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        # Si todavía no empezó, sale de la cola; si ya corre, termina solo
+        future.cancel()
+        raise _saturated()
+
+def hash_password(password):
+    return _run(_hash, password)
+
+def verify_and_update(plain_password, hashed_password):
+    """
+    Verifica la contraseña y, si el hash usa parámetros viejos, devuelve
+    también un hash nuevo. Retorna (es_valida, nuevo_hash_o_None).
+    """
+    return _run(_verify_and_update, plain_password, hashed_password)
+
+def verify_password(plain_password, hashed_password):
+    return verify_and_update(plain_password, hashed_password)[0]
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,86 @@
+# http_cache.py - GET CONDICIONALES (ETag / Last-Modified) Y CACHE-CONTROL
+#
+# Los endpoints públicos calculan primero una "huella" barata de sus datos
+# (conteo + máximo updated_at, en una consulta de agregados). Si el cliente
+# ya tiene esa versión (If-None-Match), se responde 304 sin cargar ni
+# serializar filas. Si no, la respuesta normal lleva ETag y Cache-Control
+# para que el navegador o un CDN puedan revalidar en lugar de descargar.
+#
+# CACHE_MAX_AGE_SECONDS    cuánto puede reutilizar el navegador sin preguntar
+# CACHE_S_MAXAGE_SECONDS   ídem para caches compartidas (CDN)
+# CACHE_STALE_SECONDS      stale-while-revalidate para el CDN
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response, status
+
+CACHE_MAX_AGE_SECONDS = int(os.getenv("CACHE_MAX_AGE_SECONDS", "10"))
+CACHE_S_MAXAGE_SECONDS = int(os.getenv("CACHE_S_MAXAGE_SECONDS", "30"))
+CACHE_STALE_SECONDS = int(os.getenv("CACHE_STALE_SECONDS", "30"))
+
+def cache_control() -> str:
+    return (
+        f"public, max-age={CACHE_MAX_AGE_SECONDS}, s-maxage={CACHE_S_MAXAGE_SECONDS}, "
+        f"stale-while-revalidate={CACHE_STALE_SECONDS}"
+    )
+
+def make_etag(*parts) -> str:
+    """
+    ETag débil a partir de la huella de los datos y de los parámetros de la
+    consulta. Es débil porque el mismo contenido puede serializarse con
+    distinto espaciado (json vs orjson).
+    """
+    digest = hashlib.sha1(json.dumps(parts, default=str, separators=(",", ":")).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+def _http_date(value: datetime) -> str:
+    # Los timestamps se guardan en UTC sin zona horaria
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def _opaque(tag: str) -> str:
+    return tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()
+
+def is_fresh(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    True si la copia del cliente sigue vigente. If-None-Match tiene
+    prioridad; If-Modified-Since solo se mira si no viene ETag.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return _opaque(etag) in {_opaque(tag) for tag in if_none_match.split(",")}
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+def headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    values = {"ETag": etag, "Cache-Control": cache_control()}
+    if last_modified is not None:
+        values["Last-Modified"] = _http_date(last_modified)
+    return values
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers(etag, last_modified))
+
+def attach(result, response: Response, etag: str, last_modified: Optional[datetime] = None):
+    """
+    Agrega los encabezados de caché a lo que devuelve el endpoint: a la
+    Response ya serializada (modo rápido) o a la Response inyectada por
+    FastAPI (camino normal).
+    """
+    target = result if isinstance(result, Response) else response
+    target.headers.update(headers(etag, last_modified))
+    return result
@@ -0,0 +1,399 @@
+# jobs.py - COLA DE TAREAS DURABLE (TABLA jobs + WORKERS ASYNCIO)
+#
+# Los efectos secundarios de una petición (mails, links de videollamada) no
+# corren dentro de la petición. El endpoint los encola con enqueue() en la
+# MISMA transacción que la escritura que los origina: si el COMMIT falla no
+# queda una tarea huérfana, y si sale bien la tarea ya está guardada aunque
+# el proceso muera. Después del COMMIT, wake() avisa a los workers de este
+# proceso para que no esperen al próximo sondeo.
+#
+# Los workers son tareas asyncio que arranca el lifespan de main.py. Toman
+# una tarea con un UPDATE condicionado a su estado, así varios procesos
+# pueden compartir la tabla sin ejecutar dos veces la misma toma. Cada toma
+# tiene un plazo (locked_until): si el worker muere, la tarea vuelve a estar
+# disponible al vencer. La entrega es "al menos una vez", por eso los
+# handlers son idempotentes.
+#
+# Si un handler falla se reintenta con backoff exponencial (con jitter) hasta
+# max_attempts; después la tarea queda "fallido" con el último error.
+# Las tareas periódicas (`every`) las reprograma el runner al terminar cada
+# ejecución, salga bien o quede fallida, así la cadena nunca se corta.
+# La concurrencia total es JOB_WORKERS por proceso; cada tipo de tarea puede
+# además limitar cuántas corren a la vez en el proceso (`concurrency`).
+#
+# JOB_WORKERS              workers por proceso (0 = este proceso no procesa)
+# JOB_POLL_SECONDS         cada cuánto se busca trabajo si no hubo avisos
+# JOB_LEASE_SECONDS        plazo de cada toma
+# JOB_BACKOFF_SECONDS      espera base antes del primer reintento
+# JOB_BACKOFF_MAX_SECONDS  tope de la espera entre reintentos
+# JOB_SHUTDOWN_SECONDS     cuánto se espera a las tareas en curso al apagar
+
+import asyncio
+import contextlib
+import json
+import os
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_, select, update
+import database
+import models
+import notifications
+import observability
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "5"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "600"))
+JOB_SHUTDOWN_SECONDS = float(os.getenv("JOB_SHUTDOWN_SECONDS", "10"))
+
+# Candidatas que se leen por búsqueda; si otro worker gana una, se prueba la siguiente
+CLAIM_BATCH = 10
+
+logger = observability.logger
+
+jobs_processed = observability.registry.register(observability.Counter(
+    "notaio_jobs_total", "Ejecuciones de tareas en segundo plano por resultado", ("kind", "outcome"),
+))
+job_duration = observability.registry.register(observability.Histogram(
+    "notaio_job_duration_seconds", "Duración de las tareas en segundo plano", ("kind",),
+))
+
+# --- Registro de tipos de tarea ---
+
+@dataclass(frozen=True)
+class JobType:
+    kind: str
+    func: Callable
+    max_attempts: int
+    concurrency: Optional[int]
+    every: Optional[float] = None # Segundos entre ejecuciones de una tarea periódica
+
+HANDLERS = {}
+
+def job(kind, max_attempts=5, concurrency=None, every=None):
+    """
+    Decorador que registra el handler de un tipo de tarea. El handler recibe
+    el payload (dict) y puede ser síncrono (corre en el threadpool) o `async`.
+    Con `every`, la tarea es periódica: ver schedule_periodic().
+    """
+    def register(func):
+        HANDLERS[kind] = JobType(kind, func, max_attempts, concurrency, every)
+        return func
+    return register
+
+def enqueue(db, kind, payload=None, owner_id=None, delay_seconds=0):
+    """
+    Agrega la tarea a la sesión; se guarda con el próximo COMMIT de quien
+    llama. Después del COMMIT conviene llamar a wake().
+    """
+    job_type = HANDLERS[kind]
+    row = models.Job(
+        kind=kind,
+        payload=json.dumps(payload or {}, default=str),
+        owner_id=owner_id,
+        max_attempts=job_type.max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay_seconds),
+    )
+    db.add(row)
+    return row
+
+def ensure_pending(db, kind, delay_seconds=0):
+    """
+    Encola `kind` solo si no hay ya una pendiente de ese tipo (para tareas
+    periódicas que se reprograman solas). Devuelve la nueva tarea o None.
+    """
+    pending = db.execute(
+        select(models.Job.id)
+        .where(models.Job.kind == kind, models.Job.status == models.JobStatus.PENDIENTE.value)
+        .limit(1)
+    ).first()
+    if pending is not None:
+        return None
+    return enqueue(db, kind, delay_seconds=delay_seconds)
+
+def schedule_periodic(kind, delay_seconds):
+    """
+    ensure_pending() en su propia sesión. La llaman el lifespan y el runner
+    al terminar cada ejecución de una tarea periódica: como solo encola si no
+    hay otra pendiente, reinicios y varios procesos no multiplican la cadena.
+    """
+    db = database.get_session()
+    try:
+        if ensure_pending(db, kind, delay_seconds=delay_seconds):
+            db.commit()
+    finally:
+        db.close()
+
+def backoff_seconds(attempts):
+    """
+    Espera antes del reintento número `attempts`: se duplica en cada fallo,
+    con tope, y se reparte al azar en la mitad superior para que las tareas
+    que fallaron juntas no vuelvan todas a la vez.
+    """
+    delay = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+# --- Workers ---
+
+@dataclass(frozen=True)
+class _Claimed:
+    id: int
+    kind: str
+    payload: str
+    attempts: int
+    max_attempts: int
+
+def _claimable(now):
+    job = models.Job
+    return or_(
+        and_(job.status == models.JobStatus.PENDIENTE.value, job.run_at <= now),
+        # Tomada por un worker que no terminó a tiempo (murió o se colgó)
+        and_(job.status == models.JobStatus.EN_CURSO.value, job.locked_until < now),
+    )
+
+class JobRunner:
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._tasks = []
+        self._loop = None
+        self._wakeup = None
+        self._stopping = False
+        self._running = {}
+        self._semaphores = {}
+
+    @property
+    def started(self):
+        return bool(self._tasks)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._semaphores = {
+            kind: asyncio.Semaphore(job_type.concurrency)
+            for kind, job_type in HANDLERS.items() if job_type.concurrency
+        }
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout=JOB_SHUTDOWN_SECONDS):
+        """
+        Deja de tomar tareas y espera a las que están en curso hasta
+        `timeout`; las que no terminan se cancelan y se retoman al vencer
+        su plazo.
+        """
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    def wake(self):
+        """
+        Avisa que hay tareas nuevas. Se puede llamar desde cualquier hilo.
+        """
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _worker(self):
+        while not self._stopping:
+            try:
+                claimed = await self._claim()
+            except Exception:
+                logger.exception("job_claim_error")
+                claimed = None
+            if claimed is not None:
+                await self._run(claimed)
+                continue
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_SECONDS)
+            self._wakeup.clear()
+
+    def _full_kinds(self):
+        return [
+            kind for kind, job_type in HANDLERS.items()
+            if job_type.concurrency and self._running.get(kind, 0) >= job_type.concurrency
+        ]
+
+    async def _claim(self) -> Optional[_Claimed]:
+        job = models.Job
+        now = datetime.utcnow()
+        query = select(job.id, job.kind, job.payload, job.attempts, job.max_attempts).where(_claimable(now))
+        full = self._full_kinds()
+        if full:
+            query = query.where(job.kind.not_in(full))
+        database.get_async_engine()
+        async with database.AsyncSessionLocal() as db:
+            candidates = (await db.execute(query.order_by(job.run_at).limit(CLAIM_BATCH))).all()
+            for candidate in candidates:
+                # Solo una toma gana: la condición se vuelve a evaluar en el UPDATE
+                result = await db.execute(
+                    update(job)
+                    .where(job.id == candidate.id, _claimable(now))
+                    .values(
+                        status=models.JobStatus.EN_CURSO.value,
+                        attempts=job.attempts + 1,
+                        locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS),
+                    )
+                )
+                await db.commit()
+                if result.rowcount == 1:
+                    return _Claimed(candidate.id, candidate.kind, candidate.payload,
+                                    candidate.attempts + 1, candidate.max_attempts)
+        return None
+
+    async def _run(self, claimed: _Claimed):
+        job_type = HANDLERS.get(claimed.kind)
+        started = time.perf_counter()
+        error = None
+        try:
+            if job_type is None:
+                raise LookupError(f"Tipo de tarea desconocido: {claimed.kind}")
+            # El filtro de _claim evita casi siempre esta espera; el semáforo lo garantiza
+            async with self._semaphores.get(claimed.kind) or contextlib.nullcontext():
+                self._running[claimed.kind] = self._running.get(claimed.kind, 0) + 1
+                try:
+                    payload = json.loads(claimed.payload)
+                    if asyncio.iscoroutinefunction(job_type.func):
+                        await job_type.func(payload)
+                    else:
+                        await run_in_threadpool(job_type.func, payload)
+                finally:
+                    self._running[claimed.kind] -= 1
+        except Exception as e:
+            error = e
+        job_duration.observe(time.perf_counter() - started, claimed.kind)
+        try:
+            await self._finish(claimed, error, retry=job_type is not None)
+        except Exception:
+            logger.exception("job_finish_error", extra={"job_id": claimed.id, "kind": claimed.kind})
+        if job_type is not None and job_type.every is not None:
+            await self._schedule_next(claimed, job_type)
+
+    async def _schedule_next(self, claimed: _Claimed, job_type: JobType):
+        """
+        Próxima ejecución de una tarea periódica. Si esta se va a reintentar
+        sigue pendiente y ensure_pending no encola otra.
+        """
+        try:
+            await run_in_threadpool(schedule_periodic, claimed.kind, job_type.every)
+        except Exception:
+            logger.exception("job_schedule_error", extra={"job_id": claimed.id, "kind": claimed.kind})
+
+    async def _finish(self, claimed: _Claimed, error, retry=True):
+        job = models.Job
+        now = datetime.utcnow()
+        if error is None:
+            outcome = "ok"
+            values = {"status": models.JobStatus.HECHO.value, "finished_at": now, "last_error": None}
+        elif retry and claimed.attempts < claimed.max_attempts:
+            outcome = "reintento"
+            values = {
+                "status": models.JobStatus.PENDIENTE.value,
+                "run_at": now + timedelta(seconds=backoff_seconds(claimed.attempts)),
+                "last_error": f"{type(error).__name__}: {error}",
+            }
+        else:
+            outcome = "fallido"
+            values = {
+                "status": models.JobStatus.FALLIDO.value,
+                "finished_at": now,
+                "last_error": f"{type(error).__name__}: {error}",
+            }
+        if error is not None:
+            logger.warning(
+                "job_error",
+                extra={"job_id": claimed.id, "kind": claimed.kind, "attempt": claimed.attempts,
+                       "outcome": outcome, "error": values["last_error"]},
+            )
+        jobs_processed.inc(claimed.kind, outcome)
+        database.get_async_engine()
+        async with database.AsyncSessionLocal() as db:
+            # Si el plazo venció y otro worker la retomó, su resultado manda
+            await db.execute(
+                update(job)
+                .where(job.id == claimed.id, job.status == models.JobStatus.EN_CURSO.value,
+                       job.attempts == claimed.attempts)
+                .values(locked_until=None, **values)
+            )
+            await db.commit()
+
+runner = JobRunner()
+
+def wake():
+    runner.wake()
+
+# --- Tareas ---
+
+@job("welcome_email", concurrency=2)
+def send_welcome_email(payload):
+    notifications.send_email(
+        payload["email"],
+        "Bienvenido/a a Notaio",
+        f"Hola {payload['full_name']}, tu cuenta ya está activa.",
+    )
+
+@job("video_call_link", concurrency=4)
+def create_video_call_link(payload):
+    """
+    Genera el link de la cita y, una vez guardado, encola el mail de
+    confirmación (que lo incluye).
+    """
+    appointment = models.Appointment.__table__
+    db = database.get_session()
+    try:
+        # Tabla y no ORM: el link lo pone el sistema, no debe mover la
+        # `version` que tiene el cliente. Nunca pisa un link existente.
+        result = db.execute(
+            update(appointment)
+            .where(appointment.c.id == payload["appointment_id"], appointment.c.video_call_link.is_(None))
+            .values(video_call_link=notifications.generate_video_call_link(payload["appointment_id"]))
+        )
+        if result.rowcount == 1:
+            enqueue(db, "appointment_email", {"appointment_id": payload["appointment_id"], "event": "confirmada"},
+                    owner_id=payload.get("owner_id"))
+        db.commit()
+    finally:
+        db.close()
+    wake()
+
+APPOINTMENT_EMAIL_SUBJECTS = {
+    "confirmada": "Cita confirmada",
+    "reprogramada": "Cita reprogramada",
+    "cancelada": "Cita cancelada",
+}
+
+@job("appointment_email", concurrency=2)
+def send_appointment_email(payload):
+    db = database.get_session()
+    try:
+        row = db.execute(
+            select(
+                models.Appointment.start_time,
+                models.Appointment.end_time,
+                models.Appointment.video_call_link,
+                models.User.email,
+                models.Patient.nombre,
+            )
+            .join(models.User, models.Appointment.psychologist_id == models.User.id)
+            .join(models.Patient, models.Appointment.patient_id == models.Patient.id)
+            .where(models.Appointment.id == payload["appointment_id"])
+        ).first()
+    finally:
+        db.close()
+    if row is None:
+        return  # La cita ya no existe: no hay nada que avisar
+    body = f"{row.nombre}: {row.start_time:%d/%m/%Y %H:%M} - {row.end_time:%H:%M}"
+    if row.video_call_link and payload["event"] != "cancelada":
+        body += f"\nVideollamada: {row.video_call_link}"
+    notifications.send_email(row.email, APPOINTMENT_EMAIL_SUBJECTS[payload["event"]], body)
@@ -1,22 +1,78 @@
 # main.py - ACTUALIZADO PARA INCLUIR EL ROUTER DE PACIENTES
-from typing import List
-from fastapi import FastAPI, Depends, HTTPException, status
+from dotenv import load_dotenv
+
+# Antes que nada: los módulos leen su configuración del entorno al importarse
+load_dotenv()
+
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
 import database
+import hashing
+import http_cache
+import jobs
+import migrations
+import observability
+import ratelimit
 import schemas
-from auth import auth_handler, get_current_user, get_db
-from routers import patients, availability
+import search
+import serialization
+import archive
+import auth
+import dashboard
+import schedules
+from auth import auth_handler, get_current_user, get_db, get_async_read_db, invalidate_user
+from cache import TTLCache
+from pagination import decode_cursor, encode_cursor, split_page
+from routers import patients, availability, schedules as schedules_router, appointments, internal, jobs as jobs_router, dashboard as dashboard_router
 from routers import patients
 
-# Crea las tablas en la base de datos si no existen
-models.Base.metadata.create_all(bind=database.engine)
+observability.configure_logging()
+logger = observability.logger
+
+# --- ARRANQUE Y APAGADO ---
+# Importar este módulo no toca la base de datos. El esquema se gestiona con
+# `python manage.py migrate`; aquí solo se crean y precalientan los motores.
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        seconds = await run_in_threadpool(database.warm_up)
+        seconds += await database.warm_up_async()
+        logger.info("database_ready", extra={"warmup_seconds": round(seconds, 4)})
+        pending = await run_in_threadpool(migrations.pending_versions, database.get_engine())
+        if pending:
+            logger.warning("schema_outdated", extra={"pending_migrations": pending})
+        elif jobs.JOB_WORKERS > 0:
+            # Tareas periódicas (después el runner reprograma cada ejecución)
+            await run_in_threadpool(dashboard.schedule_rebuild)
+            await run_in_threadpool(archive.schedule_archive)
+            await run_in_threadpool(schedules.schedule_extend)
+    except Exception:
+        # Sin base de datos igual arrancamos: las peticiones fallarán hasta que vuelva
+        logger.exception("database_unavailable")
+    # Los workers de la cola reintentan solos si la base todavía no responde
+    if jobs.JOB_WORKERS > 0:
+        await jobs.runner.start()
+    yield
+    await jobs.runner.stop()
+    hashing.shutdown()
+    await database.dispose()
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Notaio API",
-    description="El backend para la plataforma de psicología Notaio."
+    description="El backend para la plataforma de psicología Notaio.",
+    # orjson si FAST_SERIALIZATION=1 (ver serialization.py)
+    default_response_class=serialization.response_class(),
 )
 
 # --- CONFIGURACIÓN DE CORS ---
@@ -30,102 +86,201 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- MÉTRICAS (latencia, estados y consultas SQL por petición) ---
+app.middleware("http")(observability.metrics_middleware)
+# Lecturas desde la réplica: quien escribe lee del primario por un rato
+app.middleware("http")(auth.sticky_writes_middleware)
+observability.registry.register_collector(
+    observability.gauges_from("notaio_db_pool", "engine", database.pool_status, "Estado del pool de conexiones")
+)
+observability.registry.register_collector(
+    observability.gauges_from("notaio_cache", "cache", auth.cache_stats, "Estado de la caché en memoria")
+)
+
 # --- INCLUIMOS EL ROUTER DE PACIENTES ---
 app.include_router(patients.router)
 app.include_router(availability.router)
-
+app.include_router(schedules_router.router)
+app.include_router(appointments.router)
+app.include_router(internal.router)
+app.include_router(jobs_router.router)
+app.include_router(dashboard_router.router)
 
 # --- Endpoints Públicos y de Autenticación (sin cambios) ---
+
+# Caché de respuestas del listado público. Se invalida al registrar un
+# psicólogo o al editar un perfil; el TTL cubre a los demás workers.
+marketplace_cache = TTLCache(maxsize=256, ttl=60)
+
+def invalidate_marketplace(user):
+    if user.role == models.UserRole.PSICOLOGO:
+        marketplace_cache.clear()
+
+async def marketplace_fingerprint(db: AsyncSession, use_cache: bool = True):
+    """
+    (cantidad de perfiles, último updated_at) de los psicólogos, en una
+    consulta de agregados. Se cachea junto con las páginas, así que durante
+    el TTL las revalidaciones no tocan la base.
+    """
+    fingerprint = marketplace_cache.get("fingerprint") if use_cache else None
+    if fingerprint is None:
+        query = select(func.count(models.Profile.id), func.max(models.Profile.updated_at)).join(
+            models.User, models.Profile.user_id == models.User.id
+        ).where(models.User.role == models.UserRole.PSICOLOGO)
+        fingerprint = tuple((await db.execute(query)).one())
+        marketplace_cache.set("fingerprint", fingerprint)
+    return fingerprint
+
 @app.get("/psychologists", response_model=List[schemas.PsychologistPublicProfile], tags=["Marketplace"])
-def get_all_psychologists(db: Session = Depends(get_db)):
+async def get_all_psychologists(
+    request: Request,
+    response: Response,
+    after_user_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_read_db),
+):
     """
-    Devuelve una lista de perfiles públicos de todos los usuarios
-    que tienen el rol de 'psicologo'.
+    Devuelve una página de perfiles públicos de los usuarios con rol
+    'psicologo', ordenados por user_id. Para pedir la siguiente página se
+    envía como `after_user_id` el último user_id recibido.
     """
-    # 1. Buscamos todos los usuarios que son psicólogos
-    psychologist_users = db.query(models.User).filter(models.User.role == models.UserRole.PSICOLOGO).all()
-    
-    # 2. Extraemos sus perfiles (asegurándonos de que no sean nulos)
-    profiles = [user.profile for user in psychologist_users if user.profile is not None]
-    
-    return profiles
+    # Quien acaba de escribir lee del primario: tampoco debe recibir lo que
+    # otro cliente cacheó desde la réplica
+    use_cache = not auth.reads_from_primary(request)
+    count, last_modified = await marketplace_fingerprint(db, use_cache)
+    etag = http_cache.make_etag("psychologists", count, last_modified, after_user_id, limit)
+    if http_cache.is_fresh(request, etag, last_modified):
+        return http_cache.not_modified(etag, last_modified)
+
+    cache_key = (after_user_id, limit)
+    cached = marketplace_cache.get(cache_key) if use_cache else None
+    if cached is not None:
+        return http_cache.attach(
+            serialization.render(List[schemas.PsychologistPublicProfile], cached), response, etag, last_modified
+        )
+
+    # Una sola consulta: profiles JOIN users filtrado por rol (sin N+1)
+    query = select(
+        models.Profile.user_id,
+        models.Profile.nombre_completo,
+        models.Profile.foto_url,
+        models.Profile.descripcion,
+    ).join(models.User, models.Profile.user_id == models.User.id).where(
+        models.User.role == models.UserRole.PSICOLOGO
+    )
+    if after_user_id is not None:
+        query = query.where(models.Profile.user_id > after_user_id)
+
+    rows = (await db.execute(query.order_by(models.Profile.user_id).limit(limit))).all()
+    profiles = [schemas.PsychologistPublicProfile.model_validate(row) for row in rows]
+    marketplace_cache.set(cache_key, profiles)
+    return http_cache.attach(
+        serialization.render(List[schemas.PsychologistPublicProfile], profiles), response, etag, last_modified
+    )
+
+@app.get("/psychologists/search", response_model=schemas.Page[schemas.PsychologistPublicProfile], tags=["Marketplace"])
+async def search_psychologists(
+    q: str = Query(..., min_length=2, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Busca psicólogos por nombre y descripción usando el índice de texto
+    completo (FTS5 en SQLite, tsvector + trigramas en Postgres). Los
+    resultados vienen ordenados por relevancia; para la página siguiente
+    se envía el `next_cursor` recibido.
+    """
+    after = decode_cursor(cursor, float, int) if cursor else None
+    rows, has_more = split_page(await search.search_profiles(db, q, limit + 1, after), limit)
+    page = schemas.Page[schemas.PsychologistPublicProfile](
+        items=rows,
+        next_cursor=encode_cursor(rows[-1].score, rows[-1].user_id) if has_more else None,
+    )
+    return serialization.render(schemas.Page[schemas.PsychologistPublicProfile], page)
 
 @app.get("/", tags=["Root"])
 def read_root():
     return {"message": "¡Bienvenido al backend de Notaio!"}
 
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(internal.require_internal_token)])
+def metrics():
+    """
+    Métricas en formato de texto de Prometheus. Como /internal, exige el
+    header X-Internal-Token (el scraper lo manda como cabecera fija).
+    """
+    return PlainTextResponse(observability.render_metrics(), media_type="text/plain; version=0.0.4")
+
 # ... (el resto de tu código de /register, /token, y /users/me/profile se mantiene igual)
 # ... (asegúrate de pegar el resto de tus funciones aquí)
 # ...
 # En main.py
 
 @app.post("/register", response_model=schemas.UserResponse, tags=["Authentication"])
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    
-    # --- ESPÍA #1: ¿QUÉ LLEGÓ EXACTAMENTE? ---
-    print("=============================================")
-    print(f"PASO 1: Datos recibidos por el endpoint: {user.dict()}")
-    print("=============================================")
+def create_user(user: schemas.UserCreate, request: Request, db: Session = Depends(get_db)):
+    # Nunca logueamos la contraseña, ni siquiera en DEBUG
+    logger.debug("registro recibido", extra={"email": user.email, "role": user.role})
+    # Antes de tocar la base o hashear: el hash de bcrypt es lo caro
+    ratelimit.check_register(request, user.email)
 
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
         raise HTTPException(status_code=400, detail="El email ya está registrado")
     
-    hashed_password = auth_handler.get_password_hash(user.password)
-    
     if user.role not in [e.value for e in models.UserRole]:
         raise HTTPException(status_code=400, detail=f"Rol '{user.role}' inválido.")
 
-    # --- ESPÍA #2: ¿QUÉ ROL VAMOS A USAR? ---
-    try:
-        user_role_enum = models.UserRole(user.role)
-        print(f"PASO 2: El string '{user.role}' se convirtió exitosamente al Enum: {user_role_enum}")
-    except Exception as e:
-        print(f"ERROR EN PASO 2: Falló la conversión del rol. Error: {e}")
-        raise HTTPException(status_code=400, detail="Error interno al procesar el rol.")
+    hashed_password = auth_handler.get_password_hash(user.password)
 
-    # --- ESPÍA #3: ¿QUÉ VAMOS A GUARDAR EN LA BASE DE DATOS? ---
     new_user = models.User(
         email=user.email, 
         hashed_password=hashed_password, 
-        role=user_role_enum
+        role=models.UserRole(user.role).value
     )
-    print(f"PASO 3: Objeto 'User' a punto de ser guardado:")
-    print(f"  - Email: {new_user.email}")
-    print(f"  - Rol: {new_user.role} (Tipo: {type(new_user.role)})")
-    print("=============================================")
-
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-
-    # --- ESPÍA #4: ¿QUÉ SE GUARDÓ REALMENTE? ---
-    print(f"PASO 4: Usuario guardado en la BBDD. ID: {new_user.id}, Rol guardado: {new_user.role}")
-    print("=============================================")
+    db.flush()
 
-    # Creamos el perfil asociado
+    # Creamos el perfil asociado, en la misma transacción: sin perfil el
+    # usuario no aparece en el marketplace
     new_profile = models.Profile(
         nombre_completo=user.full_name,
         user_id=new_user.id
     )
     db.add(new_profile)
+    # El mail de bienvenida sale de la cola, después del COMMIT
+    jobs.enqueue(db, "welcome_email", {"email": new_user.email, "full_name": user.full_name}, owner_id=new_user.id)
     db.commit()
+    jobs.wake()
     db.refresh(new_user)
+    invalidate_marketplace(new_user)
 
+    logger.info("usuario registrado", extra={"user_id": new_user.id, "role": new_user.role})
     return new_user
 
 @app.post('/token', tags=['Authentication'])
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    # Antes de buscar al usuario o verificar bcrypt (ver ratelimit.py)
+    ratelimit.check_login(request, form_data.username)
     user = db.query(models.User).filter(models.User.email == form_data.username).first()
     
-    if not user or not auth_handler.verify_password(form_data.password, user.hashed_password):
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = auth_handler.verify_and_update(form_data.password, user.hashed_password)
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Email o contraseña incorrectos',
             headers={'WWW-Authenticate': 'Bearer'},
         )
+
+    # Rehash transparente si cambió el costo de bcrypt
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+        invalidate_user(user.id)
     
-    token = auth_handler.encode_token(user_id=user.id, user_email=user.email)
+    token = auth_handler.encode_token(user_id=user.id, user_email=user.email, user_role=user.role)
     return {'access_token': token, 'token_type': 'bearer'}
 
 # --- Endpoints de Perfil de Usuario ---
@@ -149,19 +304,21 @@ def update_user_profile(
     """
     # Si el usuario ya tiene un perfil, lo actualizamos
     if current_user.profile:
-        update_data = profile_update.dict(exclude_unset=True)
+        update_data = profile_update.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(current_user.profile, key, value)
         
         db.commit()
         db.refresh(current_user.profile)
+        invalidate_marketplace(current_user)
+        invalidate_user(current_user.id)
         return current_user.profile
     
     # Si no tiene perfil, creamos uno nuevo
     else:
         # Aquí, ProfileCreate asegura que al menos se provea 'nombre_completo'
         # pero como nuestro ProfileUpdate es más flexible, adaptamos los datos.
-        new_profile_data = profile_update.dict(exclude_unset=True)
+        new_profile_data = profile_update.model_dump(exclude_unset=True)
         if not new_profile_data.get("nombre_completo"):
             raise HTTPException(status_code=422, detail="El campo 'nombre_completo' es obligatorio para crear un perfil.")
 
@@ -169,4 +326,6 @@ def update_user_profile(
         db.add(new_profile)
         db.commit()
         db.refresh(new_profile)
+        invalidate_marketplace(current_user)
+        invalidate_user(current_user.id)
         return new_profile
\ No newline at end of file
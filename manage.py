@@ -0,0 +1,87 @@
+# manage.py - COMANDOS DE ADMINISTRACIÓN
+#
+# Reemplaza a create_db.py / create-db.py. La app ya no crea tablas al
+# importarse: el esquema se aplica explícitamente (en el deploy, antes de
+# levantar los workers) con estos comandos.
+#
+# Uso:
+#   python manage.py migrate    -> aplica las migraciones pendientes
+#   python manage.py status     -> versión actual y migraciones pendientes
+#   python manage.py explain    -> verifica que las consultas calientes usan índices
+#   python manage.py check      -> abre una conexión y mide cuánto tarda
+#   python manage.py rebuild-dashboard -> recalcula el resumen del panel desde cero
+#   python manage.py archive    -> archiva ya las citas terminadas y bloques pasados
+#   python manage.py extend-schedules -> materializa las series semanales hasta el horizonte
+
+import argparse
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import database
+import migrations
+
+def migrate(engine):
+    print("Aplicando migraciones...")
+    applied = migrations.upgrade(engine)
+    print(f"Migraciones aplicadas: {applied or 'ninguna'} (versión actual: {migrations.current_version(engine)})")
+    return 0
+
+def status(engine):
+    pending = migrations.pending_versions(engine)
+    print(f"Versión actual: {migrations.current_version(engine)}")
+    print(f"Pendientes: {pending or 'ninguna'}")
+    return 1 if pending else 0
+
+def explain(engine):
+    failures = 0
+    for description, index_name, used, plan in migrations.explain_hot_queries(engine):
+        print(f"[{'OK' if used else 'FALTA'}] {description}: {plan}")
+        failures += not used
+    return 1 if failures else 0
+
+def check(engine):
+    seconds = database.warm_up(connections=1)
+    print(f"Conexión OK en {seconds * 1000:.1f} ms")
+    return 0
+
+def rebuild_dashboard(engine):
+    import dashboard
+    started = time.perf_counter()
+    batches = dashboard.rebuild(engine)
+    print(f"Resumen del panel recalculado en {batches} tandas ({time.perf_counter() - started:.2f} s)")
+    return 0
+
+def archive_history(engine):
+    import archive
+    started = time.perf_counter()
+    appointments, blocks = archive.archive(engine)
+    print(f"Archivadas {appointments} citas y {blocks} bloques anteriores a "
+          f"{archive.horizon():%Y-%m-%d} ({time.perf_counter() - started:.2f} s)")
+    return 0
+
+def extend_schedules(engine):
+    import schedules
+    started = time.perf_counter()
+    created = schedules.extend_all()
+    print(f"Series materializadas hasta {schedules.default_horizon():%Y-%m-%d}: {created} bloques nuevos "
+          f"({time.perf_counter() - started:.2f} s)")
+    return 0
+
+COMMANDS = {
+    "migrate": migrate,
+    "status": status,
+    "explain": explain,
+    "check": check,
+    "rebuild-dashboard": rebuild_dashboard,
+    "archive": archive_history,
+    "extend-schedules": extend_schedules,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Administración de la base de datos de Notaio")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+    sys.exit(COMMANDS[args.command](database.get_engine()))
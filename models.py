@@ -1,9 +1,10 @@
 # models.py - ACTUALIZADO CON CITAS (APPOINTMENTS)
 
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum as SQLAlchemyEnum, Text, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum as SQLAlchemyEnum, Text, DateTime, Date, Time, Index, text
 from sqlalchemy.orm import relationship
 from database import Base 
 import enum
+from datetime import datetime
 
 # --- ENUMS: Para estandarizar valores ---
 
@@ -17,6 +18,19 @@ class AppointmentStatus(str, enum.Enum):
     CANCELADA_PACIENTE = "cancelada_paciente"
     CANCELADA_PSICOLOGO = "cancelada_psicologo"
 
+class JobStatus(str, enum.Enum):
+    PENDIENTE = "pendiente"
+    EN_CURSO = "en_curso"
+    HECHO = "hecho"
+    FALLIDO = "fallido"
+
+# Estados que liberan el horario de la cita
+CANCELLED_STATUSES = (
+    AppointmentStatus.CANCELADA_PACIENTE.value,
+    AppointmentStatus.CANCELADA_PSICOLOGO.value,
+)
+ACTIVE_APPOINTMENT_CONDITION = text("status NOT IN ('{}', '{}')".format(*CANCELLED_STATUSES))
+
 # --- TABLAS PRINCIPALES ---
 
 class User(Base):
@@ -45,6 +59,8 @@ class Profile(Base):
     descripcion = Column(Text, nullable=True)
     numero_licencia = Column(String, nullable=True, unique=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
+    # Última modificación (UTC): base de los ETag del marketplace
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     user = relationship("User", back_populates="profile")
 
@@ -59,6 +75,11 @@ class Patient(Base):
     # Clave foránea al psicólogo (User) dueño de este paciente
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="patients")
+
+    # Listados por psicólogo ordenados por id
+    __table_args__ = (
+        Index("ix_patients_owner_id_id", "owner_id", "id"),
+    )
     
     # Un paciente puede tener muchas citas
     appointments = relationship("Appointment", back_populates="patient", cascade="all, delete-orphan")
@@ -72,6 +93,11 @@ class Appointment(Base):
     status = Column(String, default=AppointmentStatus.AGENDADA.value, nullable=False)
     notes = Column(Text, nullable=True) # Notas pre o post sesión
     video_call_link = Column(String, nullable=True) # Para el Módulo 2
+
+    # Control de concurrencia optimista: cada UPDATE exige la versión leída
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Clave enviada por el cliente (cabecera Idempotency-Key) para reintentos seguros
+    idempotency_key = Column(String, nullable=True)
     
     # Clave foránea al psicólogo
     psychologist_id = Column(Integer, ForeignKey("users.id"))
@@ -81,6 +107,26 @@ class Appointment(Base):
     # Relaciones inversas
     psychologist = relationship("User", back_populates="appointments")
     patient = relationship("Patient", back_populates="appointments")
+
+    # Consultas por rango de fechas de un psicólogo o de un paciente
+    __table_args__ = (
+        Index("ix_appointments_psychologist_id_start_time", "psychologist_id", "start_time"),
+        Index("ix_appointments_patient_id_start_time", "patient_id", "start_time"),
+        # Solo citas activas: lo usa la detección de choques (conflicts.py)
+        Index(
+            "ix_appointments_active_psychologist_id_start_time",
+            "psychologist_id",
+            "start_time",
+            sqlite_where=ACTIVE_APPOINTMENT_CONDITION,
+            postgresql_where=ACTIVE_APPOINTMENT_CONDITION,
+        ),
+        # Una misma clave de idempotencia solo puede crear una cita por psicólogo
+        Index("ux_appointments_psychologist_id_idempotency_key", "psychologist_id", "idempotency_key", unique=True),
+        # Sin AUTOINCREMENT, SQLite reutiliza el id más alto tras un borrado
+        # y podría repetir el de una cita ya archivada
+        {"sqlite_autoincrement": True},
+    )
+    __mapper_args__ = {"version_id_col": version}
     # En tu archivo models.py, añade esta nueva clase al final
 
 class AvailabilityBlock(Base):
@@ -91,7 +137,116 @@ class AvailabilityBlock(Base):
     
     # Clave foránea al psicólogo que define esta disponibilidad
     psychologist_id = Column(Integer, ForeignKey("users.id"))
+
+    # Serie semanal que generó el bloque (None si se creó a mano)
+    schedule_id = Column(Integer, ForeignKey("recurring_schedules.id", ondelete="CASCADE"), nullable=True, index=True)
+
+    # Última modificación (UTC): base de los ETag de disponibilidad
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relación para poder acceder desde el usuario
     psychologist = relationship("User", back_populates="availability_blocks")
 
+    # Todas las consultas de disponibilidad filtran por psicólogo + rango
+    __table_args__ = (
+        Index("ix_availability_blocks_psychologist_id_start_time", "psychologist_id", "start_time"),
+        {"sqlite_autoincrement": True}, # Ver Appointment
+    )
+
+# --- HORARIOS SEMANALES RECURRENTES ---
+# Una regla "Lun/Mié 09:00–13:00 desde X hasta Y" se expande en filas de
+# AvailabilityBlock. Solo se materializan las semanas hasta
+# `materialized_until` (exclusivo); el resto se genera a medida que avanza el tiempo.
+class RecurringSchedule(Base):
+    __tablename__ = "recurring_schedules"
+    id = Column(Integer, primary_key=True, index=True)
+    psychologist_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    weekdays = Column(String, nullable=False) # "0,2" = lunes y miércoles (0 = lunes)
+    start_time = Column(Time, nullable=False) # Hora del día en que empieza cada bloque
+    end_time = Column(Time, nullable=False)
+    valid_from = Column(Date, nullable=False)
+    until = Column(Date, nullable=True) # None = sin fecha de fin
+    materialized_until = Column(Date, nullable=False)
+
+    psychologist = relationship("User")
+
+# --- ARCHIVO HISTÓRICO ---
+# Citas terminadas y bloques pasados que archive.py saca de las tablas
+# calientes. Conservan el id original; no se modifican después de archivar.
+class ArchivedAppointment(Base):
+    __tablename__ = "appointments_archive"
+    id = Column(Integer, primary_key=True)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False)
+    notes = Column(Text, nullable=True)
+    video_call_link = Column(String, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    idempotency_key = Column(String, nullable=True)
+    psychologist_id = Column(Integer, ForeignKey("users.id"))
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"))
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    patient = relationship("Patient")
+
+    __table_args__ = (
+        Index("ix_appointments_archive_psychologist_id_start_time", "psychologist_id", "start_time"),
+        Index("ix_appointments_archive_patient_id_start_time", "patient_id", "start_time"),
+    )
+
+class ArchivedAvailabilityBlock(Base):
+    __tablename__ = "availability_blocks_archive"
+    id = Column(Integer, primary_key=True)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    psychologist_id = Column(Integer, ForeignKey("users.id"))
+    # Sin clave foránea: el bloque archivado sobrevive a la baja de su serie
+    schedule_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_availability_blocks_archive_psychologist_id_start_time", "psychologist_id", "start_time"),
+    )
+
+# --- RESUMEN PRECALCULADO DEL PANEL DEL PSICÓLOGO ---
+# Los mantienen triggers de la base en cada escritura sobre citas, bloques
+# y pacientes, y se reconstruyen periódicamente. Ver dashboard.py.
+class DashboardWeek(Base):
+    __tablename__ = "dashboard_weeks"
+    psychologist_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    week_start = Column(Date, primary_key=True) # Lunes de la semana (por start_time)
+    appointments = Column(Integer, nullable=False, default=0, server_default="0")
+    cancelled = Column(Integer, nullable=False, default=0, server_default="0")
+    scheduled = Column(Integer, nullable=False, default=0, server_default="0") # Estado "agendada"
+    booked_minutes = Column(Integer, nullable=False, default=0, server_default="0") # Citas activas
+    available_minutes = Column(Integer, nullable=False, default=0, server_default="0") # Bloques
+
+class DashboardSummary(Base):
+    __tablename__ = "dashboard_summaries"
+    psychologist_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    patient_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+# --- COLA DE TAREAS EN SEGUNDO PLANO ---
+# Efectos secundarios que corren después del COMMIT (mails, links de
+# videollamada). Ver jobs.py.
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="{}") # JSON
+    status = Column(String, default=JobStatus.PENDIENTE.value, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow) # Próximo intento (UTC)
+    locked_until = Column(DateTime, nullable=True) # Vence el turno del worker que la tomó
+    last_error = Column(Text, nullable=True)
+    # Usuario que la originó: solo él puede consultar su estado
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+    # Los workers buscan las pendientes más antiguas ya vencidas
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
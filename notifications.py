@@ -0,0 +1,58 @@
+# notifications.py - MAILER Y GENERADOR DE LINKS DE VIDEOLLAMADA (LOCALES)
+#
+# Implementaciones de desarrollo para los efectos secundarios que corren en
+# la cola de tareas (jobs.py). El mailer no envía nada: deja el mensaje en
+# `outbox` y en el log. El link de videollamada es una URL con un token
+# aleatorio bajo VIDEO_CALL_BASE_URL. Cuando exista un proveedor real, se
+# reemplazan estas funciones sin tocar los handlers.
+#
+# FAKE_MAILER_FAILURE_RATE  fracción de envíos que fallan a propósito (0 a 1),
+#                           para ver los reintentos con backoff
+# FAKE_MAILER_FAIL_FIRST    intentos que fallan a propósito por mensaje antes de
+#                           salir (determinista, para pruebas)
+# VIDEO_CALL_BASE_URL       prefijo de los links generados
+
+import os
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+import observability
+
+FAKE_MAILER_FAILURE_RATE = float(os.getenv("FAKE_MAILER_FAILURE_RATE", "0"))
+FAKE_MAILER_FAIL_FIRST = int(os.getenv("FAKE_MAILER_FAIL_FIRST", "0"))
+VIDEO_CALL_BASE_URL = os.getenv("VIDEO_CALL_BASE_URL", "https://meet.notaio.local")
+
+@dataclass(frozen=True)
+class Email:
+    to: str
+    subject: str
+    body: str
+    sent_at: float
+
+class MailerError(Exception):
+    pass
+
+# Últimos mensajes "enviados", para inspeccionarlos en desarrollo
+outbox = deque(maxlen=1000)
+_outbox_lock = threading.Lock()
+# Intentos fallidos por mensaje (FAKE_MAILER_FAIL_FIRST)
+_failed_attempts = {}
+
+def send_email(to: str, subject: str, body: str):
+    if FAKE_MAILER_FAIL_FIRST:
+        with _outbox_lock:
+            failures = _failed_attempts.get((to, subject, body), 0)
+            if failures < FAKE_MAILER_FAIL_FIRST:
+                _failed_attempts[(to, subject, body)] = failures + 1
+                raise MailerError(f"Fallo simulado enviando a {to} (intento {failures + 1})")
+    if FAKE_MAILER_FAILURE_RATE and random.random() < FAKE_MAILER_FAILURE_RATE:
+        raise MailerError(f"Fallo simulado enviando a {to}")
+    with _outbox_lock:
+        outbox.append(Email(to=to, subject=subject, body=body, sent_at=time.time()))
+    observability.logger.info("email enviado", extra={"to": to, "subject": subject})
+
+def generate_video_call_link(appointment_id: int) -> str:
+    return f"{VIDEO_CALL_BASE_URL}/{appointment_id}-{secrets.token_urlsafe(12)}"
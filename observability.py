@@ -0,0 +1,273 @@
+# observability.py - LOGGING ESTRUCTURADO, MÉTRICAS Y CONTEO DE CONSULTAS
+#
+# - configure_logging(): logs en JSON (o texto) con nivel desde LOG_LEVEL.
+# - Middleware HTTP: histograma de latencia y contador de estados por ruta.
+# - Hooks de SQLAlchemy: cuántas consultas hace cada petición y cuánto tardan,
+#   para que los patrones N+1 se vean en las métricas y en los logs.
+# - render_metrics(): todo lo anterior en formato de texto de Prometheus.
+
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("notaio")
+
+# Peticiones con más consultas que esto se loguean como posible N+1
+QUERY_COUNT_WARNING = int(os.getenv("QUERY_COUNT_WARNING", "20"))
+
+# --- Logging ---
+
+class JsonFormatter(logging.Formatter):
+    """
+    Una línea JSON por evento, con los campos pasados en `extra=`.
+    """
+
+    _RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update({key: value for key, value in vars(record).items() if key not in self._RESERVED})
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+def configure_logging():
+    """
+    LOG_LEVEL (por defecto INFO) y LOG_FORMAT ("json" o "text").
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.handlers[:] = [handler]
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+# --- Métricas en memoria ---
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+def _header(name, kind, documentation):
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [f"{self.name}{_labels(self.labelnames, labels)} {value}"
+                    for labels, value in sorted(self._values.items())]
+
+    def render(self):
+        return _header(self.name, self.kind, self.documentation) + self.samples()
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [conteos por bucket, cantidad de observaciones, suma]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            for labels, (bucket_counts, count, total) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le=bound)} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le='+Inf')} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+    def render(self):
+        return _header(self.name, self.kind, self.documentation) + self.samples()
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        `collector()` devuelve familias (nombre, tipo, descripción, muestras)
+        calculadas en el momento del scrape, como el estado del pool.
+        """
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        # Un solo HELP/TYPE por familia y sus muestras juntas, aunque
+        # lleguen de varios collectors
+        families = {}
+        for metric in self._metrics:
+            families[metric.name] = (metric.kind, metric.documentation, metric.samples())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                if name in families:
+                    families[name][2].extend(samples)
+                else:
+                    families[name] = (kind, documentation, list(samples))
+        lines = []
+        for name, (kind, documentation, samples) in families.items():
+            lines.extend(_header(name, kind, documentation))
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "notaio_http_requests_total", "Peticiones HTTP por ruta y código de estado", ("method", "route", "status"),
+))
+http_latency = registry.register(Histogram(
+    "notaio_http_request_duration_seconds", "Latencia de las peticiones HTTP", ("method", "route"),
+))
+db_queries = registry.register(Histogram(
+    "notaio_db_queries_per_request", "Consultas SQL por petición", ("method", "route"), buckets=QUERY_COUNT_BUCKETS,
+))
+db_query_time = registry.register(Histogram(
+    "notaio_db_query_seconds_per_request", "Tiempo total en SQL por petición", ("method", "route"),
+))
+
+def render_metrics():
+    return registry.render()
+
+# --- Conteo de consultas por petición ---
+
+class QueryStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# El middleware crea un QueryStats por petición; los hooks lo actualizan.
+# Los endpoints síncronos corren en el threadpool con una copia del contexto,
+# que apunta al mismo objeto, así que también quedan contados.
+current_query_stats = contextvars.ContextVar("current_query_stats", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_times"].pop()
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # Si la sentencia falla no hay after_cursor_execute: descartamos su inicio
+    connection = context.connection
+    if connection is not None and connection.info.get("query_start_times"):
+        connection.info["query_start_times"].pop()
+
+# --- Middleware HTTP ---
+
+async def metrics_middleware(request, call_next):
+    """
+    Mide latencia, estado y consultas SQL de cada petición, agrupando por
+    la plantilla de la ruta (ej. /patients/{patient_id}) y no por la URL.
+    """
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        current_query_stats.reset(token)
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "sin_ruta")
+        method = request.method
+        http_requests.inc(method, route_path, status_code)
+        http_latency.observe(elapsed, method, route_path)
+        db_queries.observe(stats.count, method, route_path)
+        db_query_time.observe(stats.seconds, method, route_path)
+        if stats.count > QUERY_COUNT_WARNING:
+            logger.warning(
+                "Demasiadas consultas en una petición (¿N+1?)",
+                extra={"method": method, "route": route_path, "queries": stats.count},
+            )
+        logger.debug(
+            "petición atendida",
+            extra={
+                "method": method,
+                "route": route_path,
+                "status": status_code,
+                "duration_ms": round(elapsed * 1000, 2),
+                "queries": stats.count,
+                "query_ms": round(stats.seconds * 1000, 2),
+            },
+        )
+
+def gauges_from(prefix, label, source, documentation):
+    """
+    Collector que convierte `source()` -> {valor_etiqueta: {campo: número}}
+    en una familia de gauges `<prefix>_<campo>` por campo, con una muestra
+    `{<label>="valor_etiqueta"}` por cada valor de la etiqueta.
+    """
+    def collect():
+        samples = {}
+        for label_value, fields in source().items():
+            for field, value in fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    samples.setdefault(field, []).append(f'{prefix}_{field}{{{label}="{label_value}"}} {value}')
+        return [(f"{prefix}_{field}", "gauge", f"{documentation} ({field})", lines)
+                for field, lines in samples.items()]
+    return collect
@@ -0,0 +1,86 @@
+# pagination.py - PAGINACIÓN POR CURSOR (KEYSET) Y CONTEOS EN CACHÉ
+
+import base64
+import itertools
+import json
+import threading
+from datetime import datetime
+from fastapi import HTTPException, status
+from cache import TTLCache
+
+# --- Cursores opacos ---
+# El cursor es la clave de ordenamiento de la última fila devuelta, en JSON
+# y codificada en base64. El cliente solo lo reenvía tal cual.
+
+def encode_cursor(*values) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types):
+    """
+    Decodifica un cursor y convierte cada valor al tipo indicado
+    (int o datetime). Un cursor manipulado o de otro endpoint da 400.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(
+            datetime.fromisoformat(value) if kind is datetime else kind(value)
+            for kind, value in zip(types, values)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+
+def split_page(rows, limit):
+    """
+    Las consultas piden `limit + 1` filas: si llega la extra, hay otra página.
+    Devuelve (filas de esta página, hay_más).
+    """
+    return rows[:limit], len(rows) > limit
+
+# --- Conteos totales en caché ---
+
+class CountCache:
+    """
+    Guarda conteos totales (ej. pacientes de un psicólogo) durante `ttl`
+    segundos. Cada ámbito tiene una generación: invalidar la incrementa y
+    las entradas viejas dejan de usarse hasta que expiran solas.
+
+    Las generaciones también viven en una TTLCache, así que no crecen con
+    cada psicólogo visto. Si una expira o se descarta, el ámbito recibe un
+    número nuevo del contador: sus conteos viejos nunca vuelven a usarse.
+    """
+
+    def __init__(self, ttl=30.0, maxsize=10_000):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _generation(self, scope):
+        with self._lock:
+            generation = self._generations.get(scope)
+            if generation is None:
+                generation = next(self._counter)
+                self._generations.set(scope, generation)
+            return generation
+
+    def get_or_compute(self, scope, key, compute):
+        cache_key = (scope, self._generation(scope), key)
+        total = self._cache.get(cache_key)
+        if total is None:
+            total = compute()
+            self._cache.set(cache_key, total)
+        return total
+
+    def invalidate(self, scope):
+        with self._lock:
+            self._generations.set(scope, next(self._counter))
+
+    def stats(self):
+        return self._cache.stats()
+
+count_cache = CountCache()
@@ -0,0 +1,131 @@
+# patients_io.py - IMPORTACIÓN Y EXPORTACIÓN MASIVA DE PACIENTES (CSV / NDJSON)
+
+import codecs
+import csv
+import io
+import json
+from typing import AsyncIterator, Dict, Iterator, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+import database
+import models
+import schemas
+
+# Filas por INSERT multi-fila y por lote de exportación
+BATCH_SIZE = 1000
+
+# Como mucho devolvemos este número de errores detallados en la respuesta
+MAX_REPORTED_ERRORS = 500
+
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+EXPORT_COLUMNS = ("id", "nombre", "edad", "dni", "telefono")
+
+# --- Lectura en streaming ---
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Convierte el cuerpo de la petición (trozos de bytes) en líneas de texto
+    sin cargarlo entero en memoria.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+async def iter_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Tuple[int, Dict]]:
+    """
+    Devuelve (número de línea, registro) para cada fila no vacía.
+    En CSV la primera línea es la cabecera; los campos no pueden contener
+    saltos de línea. Si una línea no se puede interpretar, el registro es
+    la excepción correspondiente.
+    """
+    header = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip().lower() for name in values]
+                continue
+            if len(values) != len(header):
+                yield line_number, ValueError(f"Se esperaban {len(header)} columnas y llegaron {len(values)}")
+                continue
+            # En CSV una celda vacía significa "sin dato"
+            yield line_number, {key: (value if value != "" else None) for key, value in zip(header, values)}
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f"JSON inválido: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield line_number, ValueError("Cada línea debe ser un objeto JSON")
+                continue
+            yield line_number, record
+
+def validate_record(record) -> schemas.PatientCreate:
+    if isinstance(record, Exception):
+        raise record
+    return schemas.PatientCreate.model_validate(record)
+
+def describe_error(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in item['loc']) or 'fila'}: {item['msg']}"
+            for item in error.errors()
+        )
+    return str(error)
+
+def insert_batch(db, rows):
+    """
+    Inserta un lote con una sola sentencia multi-fila y confirma.
+    """
+    if rows:
+        db.execute(insert(models.Patient), rows)
+        db.commit()
+
+# --- Exportación en streaming ---
+
+def iter_export(owner_id: int, fmt: str) -> Iterator[str]:
+    """
+    Genera la exportación por trozos leyendo con un cursor del lado del
+    servidor, de a BATCH_SIZE filas. Abre su propia sesión porque la
+    respuesta se sigue enviando después de que termina el endpoint.
+    """
+    columns = [getattr(models.Patient, name) for name in EXPORT_COLUMNS]
+    stmt = (
+        select(*columns)
+        .where(models.Patient.owner_id == owner_id)
+        .order_by(models.Patient.id)
+        .execution_options(stream_results=True, yield_per=BATCH_SIZE)
+    )
+    db = database.get_session()
+    try:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+        for partition in db.execute(stmt).partitions():
+            if fmt == "csv":
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(partition)
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n"
+                    for row in partition
+                )
+    finally:
+        db.close()
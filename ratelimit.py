@@ -0,0 +1,212 @@
+# ratelimit.py - LIMITE DE INTENTOS (TOKEN BUCKET) PARA /token Y /register
+#
+# Verificar bcrypt es caro a propósito, así que una ráfaga de credential
+# stuffing contra /token se vuelve un DoS de CPU para toda la API. Antes de
+# buscar al usuario o de hashear nada, cada intento saca una ficha de dos
+# cubetas: una por IP de origen y otra por email. Si alguna está vacía se
+# responde 429 con Retry-After.
+#
+# Cada cubeta guarda hasta `burst` fichas y se recarga a `per_minute` fichas
+# por minuto. El backend por defecto vive en memoria (una cubeta por worker);
+# con RATE_LIMIT_REDIS_URL las cubetas se comparten entre workers (requiere
+# el paquete `redis`). Cualquier otro backend solo necesita take().
+#
+# RATE_LIMIT_ENABLED                             1/0 (por defecto 1)
+# LOGIN_IP_BURST / LOGIN_IP_PER_MINUTE           por IP en /token (20 / 30)
+# LOGIN_EMAIL_BURST / LOGIN_EMAIL_PER_MINUTE     por email en /token (5 / 5)
+# REGISTER_IP_BURST / REGISTER_IP_PER_MINUTE     por IP en /register (5 / 10)
+# REGISTER_EMAIL_BURST / REGISTER_EMAIL_PER_MINUTE por email en /register (3 / 3)
+# RATE_LIMIT_TRUSTED_PROXIES  IPs o redes (CIDR) de los proxies propios, separadas
+#                             por coma; solo si la conexión viene de una de ellas se
+#                             lee X-Forwarded-For
+# RATE_LIMIT_PROXY_HOPS       proxies propios en la cadena (por defecto 1): la IP del
+#                             cliente es la entrada número N contando desde la derecha
+# RATE_LIMIT_REDIS_URL        backend compartido, ej. redis://localhost:6379/0
+
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import HTTPException, Request, status
+import observability
+
+try:
+    import redis
+except ImportError:  # redis es opcional: solo hace falta con RATE_LIMIT_REDIS_URL
+    redis = None
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    Una familia de cubetas: `burst` fichas, recargadas a `per_minute` por minuto.
+    """
+    name: str
+    burst: int
+    per_minute: float
+
+    @property
+    def per_second(self):
+        return self.per_minute / 60.0
+
+def _rule(name, prefix, burst, per_minute):
+    return Rule(
+        name=name,
+        burst=int(os.getenv(f"{prefix}_BURST", burst)),
+        per_minute=float(os.getenv(f"{prefix}_PER_MINUTE", per_minute)),
+    )
+
+LOGIN_IP = _rule("login_ip", "LOGIN_IP", 20, 30)
+LOGIN_EMAIL = _rule("login_email", "LOGIN_EMAIL", 5, 5)
+REGISTER_IP = _rule("register_ip", "REGISTER_IP", 5, 10)
+REGISTER_EMAIL = _rule("register_email", "REGISTER_EMAIL", 3, 3)
+
+RATE_LIMIT_TRUSTED_PROXIES = tuple(
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if proxy.strip()
+)
+RATE_LIMIT_PROXY_HOPS = max(1, int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1")))
+
+rate_limited = observability.registry.register(observability.Counter(
+    "notaio_rate_limited_total", "Intentos rechazados por el limitador", ("endpoint", "rule"),
+))
+
+# --- Backends ---
+
+class MemoryBackend:
+    """
+    Cubetas en un diccionario del proceso. Las menos usadas se descartan al
+    superar `maxsize` (una cubeta descartada vuelve a empezar llena).
+    """
+
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, per_second):
+        """
+        Saca una ficha. Devuelve (permitido, segundos hasta la próxima ficha).
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / per_second
+
+class RedisBackend:
+    """
+    Las mismas cubetas en Redis, compartidas por todos los workers. El
+    script corre atómico en el servidor y usa su reloj, así que no importa
+    si los relojes de los workers difieren.
+    """
+
+    SCRIPT = """
+    local burst = tonumber(ARGV[1])
+    local per_second = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local data = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(data[1]) or burst
+    local updated = tonumber(data[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * per_second)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / per_second) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url, prefix="notaio:ratelimit:"):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL requiere el paquete `redis` (pip install redis)")
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._take = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, burst, per_second):
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[burst, per_second])
+        return bool(allowed), 0.0 if allowed else (1 - float(tokens)) / per_second
+
+def backend_from_env():
+    url = os.getenv("RATE_LIMIT_REDIS_URL")
+    return RedisBackend(url) if url else MemoryBackend()
+
+# --- Limitador ---
+
+class Limiter:
+    def __init__(self, backend, enabled=True):
+        self.backend = backend
+        self.enabled = enabled
+
+    def check(self, endpoint, *limits):
+        """
+        `limits` son pares (Rule, valor). Se consumen en orden y se corta en
+        la primera cubeta vacía, así un rechazo por IP no gasta las fichas
+        del email. Lanza 429 si algún límite se superó.
+        """
+        if not self.enabled:
+            return
+        for rule, value in limits:
+            try:
+                allowed, retry_after = self.backend.take(f"{rule.name}:{value}", rule.burst, rule.per_second)
+            except Exception:
+                # Si el backend compartido no responde, dejamos pasar: peor
+                # sería bloquear todos los logins
+                observability.logger.exception("rate_limit_backend_error", extra={"rule": rule.name})
+                return
+            if not allowed:
+                rate_limited.inc(endpoint, rule.name)
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Demasiados intentos, pruebe de nuevo más tarde",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+
+limiter = Limiter(
+    backend_from_env(),
+    enabled=os.getenv("RATE_LIMIT_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on"),
+)
+
+def _is_trusted_proxy(host) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in RATE_LIMIT_TRUSTED_PROXIES)
+
+def client_ip(request: Request) -> str:
+    """
+    IP de origen para las cubetas. X-Forwarded-For solo cuenta si la conexión
+    viene de un proxy propio, y se lee desde la derecha: las entradas de la
+    izquierda las escribe el cliente y podría inventarlas para cambiar de cubeta.
+    """
+    peer = request.client.host if request.client else None
+    if peer is None:
+        return "desconocida"
+    if _is_trusted_proxy(peer):
+        chain = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if chain:
+            return chain[max(0, len(chain) - RATE_LIMIT_PROXY_HOPS)]
+    return peer
+
+def _normalize_email(email):
+    return (email or "").strip().lower()
+
+def check_login(request: Request, email: str):
+    limiter.check("login", (LOGIN_IP, client_ip(request)), (LOGIN_EMAIL, _normalize_email(email)))
+
+def check_register(request: Request, email: str):
+    limiter.check("register", (REGISTER_IP, client_ip(request)), (REGISTER_EMAIL, _normalize_email(email)))
@@ -0,0 +1,320 @@
+# routers/appointments.py
+
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
+from typing import List, Optional
+import archive
+import conflicts
+import jobs
+import models
+import schemas
+import serialization
+from auth import get_db, get_read_db, get_token_claims, TokenClaims
+from pagination import count_cache, decode_cursor, encode_cursor, split_page
+
+router = APIRouter(
+    prefix="/appointments",
+    tags=["Appointments"],
+    responses={404: {"description": "Not found"}},
+)
+
+# --- Utilidades ---
+
+def _get_own_appointment(db: Session, appointment_id: int, claims: TokenClaims, archived: bool = False) -> models.Appointment:
+    appointment = db.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
+    if appointment is None and archived:
+        # Las citas archivadas se pueden leer pero no modificar
+        appointment = db.query(models.ArchivedAppointment).filter(models.ArchivedAppointment.id == appointment_id).first()
+    if appointment is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cita no encontrada")
+    if appointment.psychologist_id != claims.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tiene permiso para acceder a esta cita")
+    return appointment
+
+def _find_by_key(db: Session, psychologist_id: int, idempotency_key: str) -> Optional[models.Appointment]:
+    return db.query(models.Appointment).filter(
+        models.Appointment.psychologist_id == psychologist_id,
+        models.Appointment.idempotency_key == idempotency_key,
+    ).first()
+
+def _replay(existing: models.Appointment, appointment: schemas.AppointmentCreate, response: Response):
+    """
+    Reintento con una clave ya usada: devuelve la cita original si el pedido
+    es el mismo; si la clave se reutiliza para otra cosa, es un error del cliente.
+    """
+    same_request = (
+        existing.patient_id == appointment.patient_id
+        and existing.start_time == appointment.start_time
+        and existing.end_time == appointment.end_time
+    )
+    if not same_request:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La Idempotency-Key ya se usó con otros datos",
+        )
+    response.status_code = status.HTTP_200_OK
+    response.headers["Idempotent-Replayed"] = "true"
+    return existing
+
+def _check_slot(db: Session, psychologist_id: int, start_time, end_time, exclude_id: Optional[int] = None):
+    """
+    El turno debe caer dentro de un bloque de disponibilidad y no chocar con
+    otra cita activa. Bloquea la fila del bloque hasta el COMMIT.
+    """
+    if conflicts.lock_containing_block(db, psychologist_id, start_time, end_time) is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="El horario está fuera de la disponibilidad del psicólogo",
+        )
+    conflict = conflicts.find_appointment_conflict(db, psychologist_id, start_time, end_time, exclude_id)
+    if conflict is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"El horario ya está reservado ({conflict.start_time} - {conflict.end_time})",
+        )
+
+def _attach_patients(db: Session, appointments, patient: Optional[models.Patient] = None):
+    """
+    Carga los pacientes de la página con una sola consulta (ninguna si ya se
+    conoce el paciente) y los deja como ya cargados, sin lazy load por cita.
+    """
+    if patient is not None:
+        by_id = {patient.id: patient}
+    else:
+        ids = {appointment.patient_id for appointment in appointments}
+        by_id = {p.id: p for p in db.query(models.Patient).filter(models.Patient.id.in_(ids))} if ids else {}
+    for appointment in appointments:
+        set_committed_value(appointment, "patient", by_id.get(appointment.patient_id))
+
+def _history_page(
+    db: Session,
+    psychologist_id: int,
+    patient: Optional[models.Patient],
+    statuses: Optional[List[models.AppointmentStatus]],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    cursor: Optional[str],
+    limit: int,
+    include_total: bool,
+):
+    """
+    Página de citas de la más reciente a la más antigua, por (start_time, id).
+    Si el rango llega antes del horizonte de archivo se lee también
+    appointments_archive y se mezclan las dos páginas. Los pacientes se
+    cargan aparte con una sola consulta, sin importar cuántas citas traiga.
+    """
+    sources = [models.Appointment]
+    if archive.may_contain(start_date):
+        sources.append(models.ArchivedAppointment)
+    patient_id = patient.id if patient is not None else None
+
+    def filters(appointment):
+        conditions = [appointment.psychologist_id == psychologist_id]
+        if patient_id is not None:
+            conditions.append(appointment.patient_id == patient_id)
+        if statuses:
+            conditions.append(appointment.status.in_([s.value for s in statuses]))
+        if start_date is not None:
+            conditions.append(appointment.start_time >= start_date)
+        if end_date is not None:
+            conditions.append(appointment.start_time < end_date)
+        return conditions
+
+    def newest(appointment):
+        query = db.query(appointment).filter(*filters(appointment))
+        if cursor:
+            last_start, last_id = decode_cursor(cursor, datetime, int)
+            query = query.filter(or_(
+                appointment.start_time < last_start,
+                and_(appointment.start_time == last_start, appointment.id < last_id),
+            ))
+        return query.order_by(appointment.start_time.desc(), appointment.id.desc()).limit(limit + 1).all()
+
+    # Los ids se conservan al archivar: (start_time, id) ordena las dos tablas
+    rows = sorted((row for model in sources for row in newest(model)), key=lambda a: (a.start_time, a.id), reverse=True)
+    appointments, has_more = split_page(rows[:limit + 1], limit)
+    _attach_patients(db, appointments, patient)
+
+    total = None
+    if include_total:
+        total = count_cache.get_or_compute(
+            ("appointments", psychologist_id),
+            (patient_id, tuple(sorted(statuses or [])), start_date, end_date),
+            lambda: sum(db.query(func.count(model.id)).filter(*filters(model)).scalar() for model in sources),
+        )
+    page = schemas.Page[schemas.AppointmentResponse](
+        items=appointments,
+        next_cursor=encode_cursor(appointments[-1].start_time, appointments[-1].id) if has_more else None,
+        total=total,
+    )
+    return serialization.render(schemas.Page[schemas.AppointmentResponse], page)
+
+# --- Endpoints ---
+
+@router.post("/", response_model=schemas.AppointmentResponse, status_code=status.HTTP_201_CREATED)
+def book_appointment(
+    appointment: schemas.AppointmentCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: Session = Depends(get_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Reserva un turno para uno de los pacientes del psicólogo autenticado.
+    Si se envía la cabecera `Idempotency-Key`, los reintentos con la misma
+    clave devuelven la cita ya creada (200) en lugar de duplicarla.
+    """
+    patient = db.query(models.Patient).filter(models.Patient.id == appointment.patient_id).first()
+    if patient is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Paciente no encontrado")
+    if patient.owner_id != claims.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tiene permiso para agendar a este paciente")
+
+    if idempotency_key:
+        existing = _find_by_key(db, claims.id, idempotency_key)
+        if existing is not None:
+            return _replay(existing, appointment, response)
+
+    _check_slot(db, claims.id, appointment.start_time, appointment.end_time)
+
+    db_appointment = models.Appointment(
+        **appointment.model_dump(),
+        psychologist_id=claims.id,
+        idempotency_key=idempotency_key,
+    )
+    db.add(db_appointment)
+    try:
+        db.flush()
+        # El link de videollamada (y luego el mail de confirmación) los
+        # genera la cola, después del COMMIT
+        jobs.enqueue(db, "video_call_link", {"appointment_id": db_appointment.id, "owner_id": claims.id},
+                     owner_id=claims.id)
+        db.commit()
+    except IntegrityError:
+        # Perdimos una carrera: otra petición con la misma clave, o un turno
+        # solapado que la base de datos rechazó (trigger / EXCLUDE)
+        db.rollback()
+        if idempotency_key:
+            existing = _find_by_key(db, claims.id, idempotency_key)
+            if existing is not None:
+                return _replay(existing, appointment, response)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El horario ya está reservado")
+    jobs.wake()
+    count_cache.invalidate(("appointments", claims.id))
+    db.refresh(db_appointment)
+    return db_appointment
+
+@router.get("/", response_model=schemas.Page[schemas.AppointmentResponse])
+def read_appointments(
+    status_: Optional[List[models.AppointmentStatus]] = Query(None, alias="status"),
+    start_date: Optional[schemas.UTCDateTime] = None,
+    end_date: Optional[schemas.UTCDateTime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Historial de citas del psicólogo autenticado, de la más reciente a la
+    más antigua. Se puede filtrar por uno o más `status` y por un rango de
+    fechas de inicio [start_date, end_date).
+    """
+    return _history_page(db, claims.id, None, status_, start_date, end_date, cursor, limit, include_total)
+
+@router.get("/patients/{patient_id}", response_model=schemas.Page[schemas.AppointmentResponse])
+def read_patient_appointments(
+    patient_id: int,
+    status_: Optional[List[models.AppointmentStatus]] = Query(None, alias="status"),
+    start_date: Optional[schemas.UTCDateTime] = None,
+    end_date: Optional[schemas.UTCDateTime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Historial de citas de uno de los pacientes del psicólogo autenticado,
+    con los mismos filtros que el historial general.
+    """
+    patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+    if patient is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Paciente no encontrado")
+    if patient.owner_id != claims.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tiene permiso para acceder a este paciente")
+    return _history_page(db, claims.id, patient, status_, start_date, end_date, cursor, limit, include_total)
+
+@router.get("/{appointment_id}", response_model=schemas.AppointmentResponse)
+def read_appointment(
+    appointment_id: int,
+    db: Session = Depends(get_read_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Obtiene una cita del psicólogo autenticado, también si ya está archivada.
+    """
+    return _get_own_appointment(db, appointment_id, claims, archived=True)
+
+@router.patch("/{appointment_id}", response_model=schemas.AppointmentResponse)
+def update_appointment(
+    appointment_id: int,
+    appointment_update: schemas.AppointmentUpdate,
+    db: Session = Depends(get_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Reprograma, cancela o anota una cita. Si se envía `version` y la cita
+    cambió desde que se leyó, responde 409 en lugar de pisar el cambio ajeno.
+    """
+    db_appointment = _get_own_appointment(db, appointment_id, claims)
+
+    update_data = appointment_update.model_dump(exclude_unset=True)
+    expected_version = update_data.pop("version", None)
+    if expected_version is not None and expected_version != db_appointment.version:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="La cita fue modificada por otra petición")
+    if "status" in update_data and update_data["status"] is not None:
+        update_data["status"] = update_data["status"].value
+
+    start_time = update_data.get("start_time") or db_appointment.start_time
+    end_time = update_data.get("end_time") or db_appointment.end_time
+    if start_time >= end_time:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="start_time debe ser anterior a end_time")
+
+    # Solo hace falta revisar el horario si la cita queda activa y cambió de lugar o de estado
+    new_status = update_data.get("status") or db_appointment.status
+    moves = any(update_data.get(field) not in (None, getattr(db_appointment, field)) for field in ("start_time", "end_time", "status"))
+    if moves and new_status not in models.CANCELLED_STATUSES:
+        _check_slot(db, claims.id, start_time, end_time, exclude_id=db_appointment.id)
+
+    # Aviso por mail si la cita se cancela o cambia de horario
+    event = None
+    if new_status in models.CANCELLED_STATUSES and db_appointment.status not in models.CANCELLED_STATUSES:
+        event = "cancelada"
+    elif new_status not in models.CANCELLED_STATUSES and (start_time, end_time) != (db_appointment.start_time, db_appointment.end_time):
+        event = "reprogramada"
+
+    for key, value in update_data.items():
+        if value is not None:
+            setattr(db_appointment, key, value)
+    if event:
+        jobs.enqueue(db, "appointment_email", {"appointment_id": db_appointment.id, "event": event}, owner_id=claims.id)
+    try:
+        # El UPDATE lleva "WHERE version = <leída>": si otro lo cambió, no toca filas
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="La cita fue modificada por otra petición")
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El horario ya está reservado")
+    if event:
+        jobs.wake()
+    count_cache.invalidate(("appointments", claims.id))
+    db.refresh(db_appointment)
+    return db_appointment
@@ -1,61 +1,121 @@
 # routers/availability.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
 from datetime import datetime
+import archive
+import conflicts
+import http_cache
 import models
 import schemas
-from auth import get_current_user, get_db
+import serialization
+import slots
+from pagination import count_cache, decode_cursor, encode_cursor, split_page
+from auth import get_current_user, get_db, get_read_db, get_async_read_db, get_token_claims, TokenClaims
 
 router = APIRouter(
     prefix="/availability",
     tags=["Availability"],
 )
 
+# Máximo de psicólogos por consulta en lote (una pantalla del marketplace)
+MAX_BATCH_PSYCHOLOGISTS = 100
+
 # --- Endpoints para que el Psicólogo gestione su disponibilidad ---
 
 @router.post("/blocks", response_model=schemas.AvailabilityBlockResponse, status_code=status.HTTP_201_CREATED)
 def create_availability_block(
     block: schemas.AvailabilityBlockCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    claims: TokenClaims = Depends(get_token_claims)
 ):
     """
     Permite a un psicólogo (autenticado) crear un nuevo bloque
     de tiempo en el que está disponible.
     """
-    if current_user.role != models.UserRole.PSICOLOGO:
+    if claims.role != models.UserRole.PSICOLOGO:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo los psicólogos pueden definir su disponibilidad")
 
-    # TODO: Añadir validación para que start_time sea anterior a end_time
+    # start_time < end_time ya lo valida AvailabilityBlockCreate
+    conflict = conflicts.find_block_conflict(db, claims.id, block.start_time, block.end_time)
+    if conflict is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"El bloque se solapa con el bloque {conflict.id} ({conflict.start_time} - {conflict.end_time})",
+        )
     
     db_block = models.AvailabilityBlock(
-        **block.dict(), 
-        psychologist_id=current_user.id
+        **block.model_dump(),
+        psychologist_id=claims.id
     )
     db.add(db_block)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otra petición creó un bloque solapado entre la verificación y el INSERT
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El bloque se solapa con otro bloque existente")
     db.refresh(db_block)
+    count_cache.invalidate(("blocks", claims.id))
     return db_block
 
-@router.get("/my-blocks", response_model=List[schemas.AvailabilityBlockResponse])
+@router.get("/my-blocks", response_model=schemas.Page[schemas.AvailabilityBlockResponse])
 def get_my_availability_blocks(
-    start_date: datetime,
-    end_date: datetime,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    start_date: schemas.UTCDateTime,
+    end_date: schemas.UTCDateTime,
+    cursor: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=1000),
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+    claims: TokenClaims = Depends(get_token_claims)
 ):
     """
     Obtiene los bloques de disponibilidad del psicólogo autenticado
-    dentro de un rango de fechas.
+    dentro de un rango de fechas, paginados por (start_time, id). Las series
+    semanales aparecen hasta donde las materializó la tarea periódica.
     """
-    blocks = db.query(models.AvailabilityBlock).filter(
-        models.AvailabilityBlock.psychologist_id == current_user.id,
-        models.AvailabilityBlock.start_time >= start_date,
-        models.AvailabilityBlock.end_time <= end_date
-    ).all()
-    return blocks
+    # Los rangos que llegan antes del horizonte de archivo leen también el archivo
+    sources = [models.AvailabilityBlock]
+    if archive.may_contain(start_date):
+        sources.append(models.ArchivedAvailabilityBlock)
+
+    def in_range(block):
+        return (
+            block.psychologist_id == claims.id,
+            block.start_time >= start_date,
+            block.end_time <= end_date,
+        )
+
+    def oldest(block):
+        query = db.query(block).filter(*in_range(block))
+        if cursor:
+            last_start, last_id = decode_cursor(cursor, datetime, int)
+            query = query.filter(or_(
+                block.start_time > last_start,
+                and_(block.start_time == last_start, block.id > last_id),
+            ))
+        return query.order_by(block.start_time, block.id).limit(limit + 1).all()
+
+    rows = sorted((row for model in sources for row in oldest(model)), key=lambda b: (b.start_time, b.id))
+    blocks, has_more = split_page(rows[:limit + 1], limit)
+
+    total = None
+    if include_total:
+        total = count_cache.get_or_compute(
+            ("blocks", claims.id),
+            (start_date, end_date),
+            lambda: sum(db.query(func.count(model.id)).filter(*in_range(model)).scalar() for model in sources),
+        )
+    page = schemas.Page[schemas.AvailabilityBlockResponse](
+        items=blocks,
+        next_cursor=encode_cursor(blocks[-1].start_time, blocks[-1].id) if has_more else None,
+        total=total,
+    )
+    return serialization.render(schemas.Page[schemas.AvailabilityBlockResponse], page)
 
 @router.delete("/blocks/{block_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_availability_block(
@@ -76,27 +136,68 @@ def delete_availability_block(
 
     db.delete(db_block)
     db.commit()
+    count_cache.invalidate(("blocks", current_user.id))
     return
 
 # --- Endpoint público para que los Pacientes vean la disponibilidad ---
 
-@router.get("/psychologist/{psychologist_id}", response_model=List[schemas.AvailabilityBlockResponse])
-def get_psychologist_availability(
+@router.get("/psychologists", response_model=Dict[int, List[schemas.FreeSlot]])
+async def get_many_psychologists_availability(
+    start_date: schemas.UTCDateTime,
+    end_date: schemas.UTCDateTime,
+    psychologist_ids: List[int] = Query(..., alias="psychologist_id", min_length=1, max_length=MAX_BATCH_PSYCHOLOGISTS),
+    slot_minutes: int = Query(60, ge=5, le=480),
+    read_db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Endpoint PÚBLICO en lote para la grilla del marketplace: los turnos
+    libres de varios psicólogos (`?psychologist_id=1&psychologist_id=2...`)
+    en un rango de fechas, con una sola consulta a la base. Devuelve un
+    objeto {psychologist_id: [turnos]}; quien no tenga huecos aparece con
+    una lista vacía. Solo lee: las series semanales se ven hasta donde ya
+    las materializó la tarea periódica (ver schedules.py).
+    """
+    if start_date >= end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date debe ser anterior a end_date")
+
+    ids = list(dict.fromkeys(psychologist_ids))
+    intervals = await slots.load_intervals_many(read_db, ids, start_date, end_date)
+    return serialization.render(Dict[int, List[schemas.FreeSlot]], {
+        psychologist_id: [
+            schemas.FreeSlot(start_time=start, end_time=end)
+            for start, end in slots.compute_free_slots(blocks, busy, slot_minutes, start_date, end_date)
+        ]
+        for psychologist_id, (blocks, busy) in intervals.items()
+    })
+
+@router.get("/psychologist/{psychologist_id}", response_model=List[schemas.FreeSlot])
+async def get_psychologist_availability(
     psychologist_id: int,
-    start_date: datetime,
-    end_date: datetime,
-    db: Session = Depends(get_db)
+    start_date: schemas.UTCDateTime,
+    end_date: schemas.UTCDateTime,
+    request: Request,
+    response: Response,
+    slot_minutes: int = Query(60, ge=5, le=480),
+    read_db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Endpoint PÚBLICO para que cualquier usuario (ej. un paciente) vea
-    los bloques de disponibilidad de un psicólogo específico en un rango de fechas.
+    los turnos realmente libres de un psicólogo en un rango de fechas:
+    los bloques de disponibilidad menos las citas ya agendadas, divididos
+    en turnos de `slot_minutes` minutos. Como el lote, solo lee.
     """
-    # TODO: En un futuro, aquí cruzaremos esta info con las citas ya agendadas
-    # para mostrar solo los huecos realmente libres.
-    
-    blocks = db.query(models.AvailabilityBlock).filter(
-        models.AvailabilityBlock.psychologist_id == psychologist_id,
-        models.AvailabilityBlock.start_time >= start_date,
-        models.AvailabilityBlock.end_time <= end_date
-    ).all()
-    return blocks
\ No newline at end of file
+    if start_date >= end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date debe ser anterior a end_date")
+
+    # Solo ETag: una reserva cambia los turnos libres sin tocar el updated_at
+    # de los bloques, así que un Last-Modified podría dar 304 con datos viejos
+    fingerprint = await slots.availability_fingerprint(read_db, psychologist_id, start_date, end_date)
+    etag = http_cache.make_etag("availability", psychologist_id, start_date, end_date, slot_minutes, *fingerprint)
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
+
+    blocks, busy = await slots.load_intervals(read_db, psychologist_id, start_date, end_date)
+    free_slots = slots.compute_free_slots(blocks, busy, slot_minutes, start_date, end_date)
+    return http_cache.attach(serialization.render(
+        List[schemas.FreeSlot], [schemas.FreeSlot(start_time=start, end_time=end) for start, end in free_slots]
+    ), response, etag)
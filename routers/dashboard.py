@@ -0,0 +1,59 @@
+# routers/dashboard.py
+
+from datetime import date, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+import dashboard
+import models
+import schemas
+import serialization
+from auth import get_read_db, get_token_claims, TokenClaims
+
+router = APIRouter(
+    prefix="/dashboard",
+    tags=["Dashboard"],
+)
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else None
+
+@router.get("/", response_model=schemas.DashboardResponse)
+def read_dashboard(
+    weeks_back: int = Query(8, ge=0, le=104),
+    weeks_ahead: int = Query(4, ge=0, le=52),
+    db: Session = Depends(get_read_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Panel del psicólogo: pacientes y, por semana, citas, cancelaciones y
+    utilización de su disponibilidad. Lee el resumen precalculado (ver
+    dashboard.py) con una sola consulta por clave primaria.
+    """
+    if claims.role != models.UserRole.PSICOLOGO:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo los psicólogos tienen panel")
+
+    current_week = dashboard.week_start(date.today())
+    first_week = current_week - timedelta(weeks=weeks_back)
+    last_week = current_week + timedelta(weeks=weeks_ahead)
+    patient_count, by_week = dashboard.load(db, claims.id, first_week, last_week)
+
+    weeks, upcoming = [], 0
+    for offset in range(weeks_back + weeks_ahead + 1):
+        monday = first_week + timedelta(weeks=offset)
+        row = by_week.get(monday)
+        # Semanas sin actividad no tienen fila: van en cero
+        values = {column: getattr(row, column) if row is not None else 0 for column in dashboard.WEEK_COLUMNS}
+        if monday >= current_week:
+            upcoming += values["scheduled"]
+        weeks.append(schemas.DashboardWeek(
+            week_start=monday,
+            appointments=values["appointments"],
+            cancelled=values["cancelled"],
+            scheduled=values["scheduled"],
+            booked_hours=round(values["booked_minutes"] / 60, 2),
+            available_hours=round(values["available_minutes"] / 60, 2),
+            utilization=_ratio(values["booked_minutes"], values["available_minutes"]),
+            cancellation_rate=_ratio(values["cancelled"], values["appointments"]),
+        ))
+    response = schemas.DashboardResponse(patient_count=patient_count, upcoming_sessions=upcoming, weeks=weeks)
+    return serialization.render(schemas.DashboardResponse, response)
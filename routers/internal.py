@@ -0,0 +1,58 @@
+# routers/internal.py
+
+import os
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Optional
+import auth
+import database
+import jobs
+import models
+
+def require_internal_token(x_internal_token: Optional[str] = Header(None)):
+    """
+    Protege los endpoints internos con el header X-Internal-Token, que debe
+    coincidir con la variable de entorno INTERNAL_API_TOKEN. Si la variable
+    no está definida, los endpoints internos quedan deshabilitados.
+    """
+    expected = os.getenv("INTERNAL_API_TOKEN")
+    if not expected or not x_internal_token or not secrets.compare_digest(x_internal_token, expected):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acceso interno no autorizado")
+
+# Endpoints de diagnóstico para operar la API; no aparecen en Swagger
+router = APIRouter(
+    prefix="/internal",
+    tags=["Internal"],
+    dependencies=[Depends(require_internal_token)],
+    include_in_schema=False,
+)
+
+@router.get("/cache-stats")
+def get_cache_stats():
+    """
+    Tasa de aciertos de las cachés de autenticación (tokens y usuarios).
+    """
+    return auth.cache_stats()
+
+@router.get("/pool-stats")
+def get_pool_stats():
+    """
+    Estado en vivo de los pools de conexiones: conexiones en uso, overflow
+    y tiempo de espera para obtener una conexión.
+    """
+    return database.pool_status()
+
+@router.get("/job-stats")
+def get_job_stats(db: Session = Depends(auth.get_db)):
+    """
+    Tareas de la cola por tipo y estado, y si este proceso tiene workers.
+    """
+    rows = db.query(models.Job.kind, models.Job.status, func.count(models.Job.id)).group_by(
+        models.Job.kind, models.Job.status
+    ).all()
+    counts = {}
+    for kind, job_status, count in rows:
+        counts.setdefault(kind, {})[job_status] = count
+    return {"workers": jobs.runner.workers if jobs.runner.started else 0, "jobs": counts}
@@ -0,0 +1,58 @@
+# routers/jobs.py
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Optional
+import models
+import schemas
+import serialization
+from auth import get_read_db, get_token_claims, TokenClaims
+from pagination import decode_cursor, encode_cursor, split_page
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+)
+
+@router.get("/", response_model=schemas.Page[schemas.JobResponse])
+def read_my_jobs(
+    status_: Optional[models.JobStatus] = Query(None, alias="status"),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Tareas en segundo plano originadas por el usuario autenticado (mails,
+    links de videollamada), de la más reciente a la más antigua.
+    """
+    query = db.query(models.Job).filter(models.Job.owner_id == claims.id)
+    if status_ is not None:
+        query = query.filter(models.Job.status == status_.value)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, int)
+        query = query.filter(models.Job.id < last_id)
+
+    rows, has_more = split_page(query.order_by(models.Job.id.desc()).limit(limit + 1).all(), limit)
+    page = schemas.Page[schemas.JobResponse](
+        items=rows,
+        next_cursor=encode_cursor(rows[-1].id) if has_more else None,
+    )
+    return serialization.render(schemas.Page[schemas.JobResponse], page)
+
+@router.get("/{job_id}", response_model=schemas.JobResponse)
+def read_job(
+    job_id: int,
+    db: Session = Depends(get_read_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Estado de una tarea: pendiente, en curso, hecho o fallido (con el
+    último error y cuándo será el próximo intento).
+    """
+    job = db.query(models.Job).filter(models.Job.id == job_id).first()
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tarea no encontrada")
+    if job.owner_id != claims.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tiene permiso para ver esta tarea")
+    return job
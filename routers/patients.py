@@ -1,11 +1,17 @@
 # routers/patients.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Optional
 import models
+import patients_io
 import schemas
-from auth import get_current_user, get_db
+import serialization
+from pagination import count_cache, decode_cursor, encode_cursor, split_page
+from auth import get_current_user, get_db, get_read_db, get_token_claims, TokenClaims
 
 # Creamos un router, es como una "mini-app" de FastAPI
 router = APIRouter(
@@ -25,25 +31,106 @@ def create_patient(
     actualmente autenticado.
     """
     # Creamos el objeto del modelo SQLAlchemy asignando el owner_id
-    db_patient = models.Patient(**patient.dict(), owner_id=current_user.id)
+    db_patient = models.Patient(**patient.model_dump(), owner_id=current_user.id)
     db.add(db_patient)
     db.commit()
     db.refresh(db_patient)
+    count_cache.invalidate(("patients", current_user.id))
     return db_patient
 
-@router.get("/", response_model=List[schemas.PatientResponse])
+@router.get("/", response_model=schemas.Page[schemas.PatientResponse])
 def read_patients(
-    skip: int = 0, 
-    limit: int = 100, 
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Obtiene una página de los pacientes asociados al psicólogo
+    actualmente autenticado, ordenados por id. Para la página siguiente
+    se envía el `next_cursor` recibido.
+    """
+    query = db.query(models.Patient).filter(models.Patient.owner_id == claims.id)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, int)
+        query = query.filter(models.Patient.id > last_id)
+
+    patients, has_more = split_page(query.order_by(models.Patient.id).limit(limit + 1).all(), limit)
+
+    total = None
+    if include_total:
+        total = count_cache.get_or_compute(
+            ("patients", claims.id),
+            None,
+            lambda: db.query(func.count(models.Patient.id)).filter(models.Patient.owner_id == claims.id).scalar(),
+        )
+    page = schemas.Page[schemas.PatientResponse](
+        items=patients,
+        next_cursor=encode_cursor(patients[-1].id) if has_more else None,
+        total=total,
+    )
+    return serialization.render(schemas.Page[schemas.PatientResponse], page)
+
+@router.post("/bulk", response_model=schemas.PatientBulkResult)
+async def bulk_create_patients(
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    claims: TokenClaims = Depends(get_token_claims)
 ):
     """
-    Obtiene una lista de todos los pacientes asociados al psicólogo
-    actualmente autenticado.
+    Importa pacientes en masa desde el cuerpo de la petición, leído en
+    streaming. Acepta CSV (text/csv, con cabecera) o NDJSON
+    (application/x-ndjson, un objeto por línea). Las filas válidas se
+    insertan en lotes multi-fila; las inválidas se reportan por número de línea.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in patients_io.CSV_CONTENT_TYPES:
+        fmt = "csv"
+    elif content_type in patients_io.NDJSON_CONTENT_TYPES:
+        fmt = "ndjson"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Formatos aceptados: text/csv o application/x-ndjson",
+        )
+
+    inserted, failed, errors, batch = 0, 0, [], []
+    lines = patients_io.iter_lines(request.stream())
+    async for line_number, record in patients_io.iter_records(lines, fmt):
+        try:
+            patient = patients_io.validate_record(record)
+        except ValueError as e:
+            failed += 1
+            if len(errors) < patients_io.MAX_REPORTED_ERRORS:
+                errors.append(schemas.PatientBulkError(line=line_number, error=patients_io.describe_error(e)))
+            continue
+        batch.append({**patient.model_dump(), "owner_id": claims.id})
+        if len(batch) >= patients_io.BATCH_SIZE:
+            await run_in_threadpool(patients_io.insert_batch, db, batch)
+            inserted += len(batch)
+            batch = []
+
+    await run_in_threadpool(patients_io.insert_batch, db, batch)
+    inserted += len(batch)
+    count_cache.invalidate(("patients", claims.id))
+    return schemas.PatientBulkResult(inserted=inserted, failed=failed, errors=errors)
+
+@router.get("/export")
+def export_patients(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Exporta todos los pacientes del psicólogo autenticado en CSV o NDJSON,
+    en streaming desde un cursor del servidor.
     """
-    patients = db.query(models.Patient).filter(models.Patient.owner_id == current_user.id).offset(skip).limit(limit).all()
-    return patients
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        patients_io.iter_export(claims.id, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="pacientes.{format}"'},
+    )
 
 @router.get("/{patient_id}", response_model=schemas.PatientResponse)
 def read_patient(
@@ -77,7 +164,7 @@ def update_patient(
     """
     db_patient = read_patient(patient_id, db, current_user) # Reutilizamos la lógica de permisos
     
-    update_data = patient_update.dict(exclude_unset=True)
+    update_data = patient_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_patient, key, value)
         
@@ -96,6 +183,12 @@ def delete_patient(
     """
     db_patient = read_patient(patient_id, db, current_user) # Reutilizamos la lógica de permisos
     
+    # La cascada del ORM solo alcanza a las citas de la tabla caliente
+    db.query(models.ArchivedAppointment).filter(
+        models.ArchivedAppointment.patient_id == db_patient.id
+    ).delete(synchronize_session=False)
     db.delete(db_patient)
     db.commit()
+    count_cache.invalidate(("patients", current_user.id))
+    count_cache.invalidate(("appointments", current_user.id))
     return {"ok": True}
\ No newline at end of file
@@ -0,0 +1,145 @@
+# routers/schedules.py
+
+from datetime import date, datetime, time
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import List
+import models
+import schedules
+import schemas
+from auth import get_db, get_read_db, get_token_claims, TokenClaims
+from pagination import count_cache
+
+router = APIRouter(
+    prefix="/availability/schedules",
+    tags=["Availability"],
+)
+
+def _require_psychologist(claims: TokenClaims):
+    if claims.role != models.UserRole.PSICOLOGO:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo los psicólogos pueden definir su disponibilidad")
+
+def _get_own_schedule(db: Session, schedule_id: int, claims: TokenClaims) -> models.RecurringSchedule:
+    schedule = db.query(models.RecurringSchedule).filter(models.RecurringSchedule.id == schedule_id).first()
+    if schedule is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Serie no encontrada")
+    if schedule.psychologist_id != claims.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tiene permiso para modificar esta serie")
+    return schedule
+
+def _after_change(psychologist_id: int):
+    count_cache.invalidate(("blocks", psychologist_id))
+
+def _materialize_and_commit(db: Session, schedule: models.RecurringSchedule):
+    """
+    Genera los bloques de las próximas semanas y confirma. Los choques con
+    bloques existentes se saltean antes del INSERT, pero otra petición puede
+    crear uno entretanto: entonces el trigger (o el EXCLUDE) lo rechaza -> 409.
+    """
+    try:
+        schedules.materialize(db, schedule, schedules.default_horizon())
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La serie se solapa con un bloque creado mientras se guardaba; intente nuevamente",
+        )
+
+@router.post("/", response_model=schemas.RecurringScheduleResponse, status_code=status.HTTP_201_CREATED)
+def create_recurring_schedule(
+    rule: schemas.RecurringScheduleCreate,
+    db: Session = Depends(get_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Crea una regla semanal (ej. lunes y miércoles de 09:00 a 13:00) y genera
+    de una vez, con un solo INSERT, los bloques de las próximas semanas.
+    Las semanas siguientes se generan solas a medida que avanza el tiempo.
+    """
+    _require_psychologist(claims)
+
+    schedule = models.RecurringSchedule(
+        psychologist_id=claims.id,
+        weekdays=schedules.format_weekdays(rule.weekdays),
+        start_time=rule.start_time,
+        end_time=rule.end_time,
+        valid_from=rule.valid_from,
+        until=rule.until,
+        materialized_until=rule.valid_from,
+    )
+    db.add(schedule)
+    db.flush()
+    _materialize_and_commit(db, schedule)
+    db.refresh(schedule)
+    _after_change(claims.id)
+    return schedule
+
+@router.get("/", response_model=List[schemas.RecurringScheduleResponse])
+def get_my_recurring_schedules(
+    db: Session = Depends(get_read_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Lista las series semanales del psicólogo autenticado.
+    """
+    return db.query(models.RecurringSchedule).filter(
+        models.RecurringSchedule.psychologist_id == claims.id
+    ).order_by(models.RecurringSchedule.id).all()
+
+@router.put("/{schedule_id}", response_model=schemas.RecurringScheduleResponse)
+def update_recurring_schedule(
+    schedule_id: int,
+    rule_update: schemas.RecurringScheduleUpdate,
+    db: Session = Depends(get_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Edita una serie completa. Los bloques futuros de la serie se borran con
+    una sola sentencia y se regeneran con la regla nueva; los pasados se conservan.
+    """
+    schedule = _get_own_schedule(db, schedule_id, claims)
+
+    current = schemas.RecurringScheduleResponse.model_validate(schedule).model_dump()
+    current.update(rule_update.model_dump(exclude_unset=True))
+    try:
+        rule = schemas.RecurringScheduleCreate.model_validate(current)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    cut = max(date.today(), schedule.valid_from)
+    schedules.delete_future_blocks(db, schedule.id, datetime.combine(cut, time.min))
+
+    schedule.weekdays = schedules.format_weekdays(rule.weekdays)
+    schedule.start_time = rule.start_time
+    schedule.end_time = rule.end_time
+    schedule.until = rule.until
+    schedule.materialized_until = cut
+    db.flush()
+    _materialize_and_commit(db, schedule)
+    db.refresh(schedule)
+    _after_change(claims.id)
+    return schedule
+
+@router.delete("/{schedule_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_recurring_schedule(
+    schedule_id: int,
+    db: Session = Depends(get_db),
+    claims: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Elimina una serie y, en una sola sentencia, todos sus bloques.
+    """
+    schedule = _get_own_schedule(db, schedule_id, claims)
+    db.execute(
+        delete(models.AvailabilityBlock)
+        .where(models.AvailabilityBlock.schedule_id == schedule.id)
+        .execution_options(synchronize_session=False)
+    )
+    db.delete(schedule)
+    db.commit()
+    _after_change(claims.id)
+    return
@@ -0,0 +1,151 @@
+# schedules.py - EXPANSIÓN DE HORARIOS SEMANALES EN BLOQUES DE DISPONIBILIDAD
+#
+# Las series se materializan hasta SCHEDULE_HORIZON_WEEKS por delante de hoy
+# al crearlas y después con la tarea periódica "schedules_extend", que corre
+# cada SCHEDULE_EXTEND_SECONDS. Las lecturas de disponibilidad no escriben:
+# ven lo que ya está materializado.
+#
+# SCHEDULE_HORIZON_WEEKS   semanas materializadas por delante de hoy
+# SCHEDULE_EXTEND_SECONDS  cada cuánto corre la tarea que corre el horizonte
+
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import conflicts
+import database
+import jobs
+import models
+from pagination import count_cache
+
+# Semanas que se mantienen materializadas por delante de hoy
+SCHEDULE_HORIZON_WEEKS = int(os.getenv("SCHEDULE_HORIZON_WEEKS", "8"))
+SCHEDULE_EXTEND_SECONDS = int(os.getenv("SCHEDULE_EXTEND_SECONDS", "3600"))
+
+def parse_weekdays(weekdays: str) -> List[int]:
+    return [int(day) for day in weekdays.split(",") if day != ""]
+
+def format_weekdays(weekdays) -> str:
+    return ",".join(str(day) for day in sorted(set(weekdays)))
+
+def expand(schedule: models.RecurringSchedule, from_date: date, to_date: date) -> List[Dict]:
+    """
+    Filas de AvailabilityBlock para los días de la regla en [from_date, to_date).
+    """
+    days = set(parse_weekdays(schedule.weekdays))
+    first = max(from_date, schedule.valid_from)
+    last = to_date if schedule.until is None else min(to_date, schedule.until + timedelta(days=1))
+    rows = []
+    day = first
+    while day < last:
+        if day.weekday() in days:
+            rows.append({
+                "start_time": datetime.combine(day, schedule.start_time),
+                "end_time": datetime.combine(day, schedule.end_time),
+                "psychologist_id": schedule.psychologist_id,
+                "schedule_id": schedule.id,
+            })
+        day += timedelta(days=1)
+    return rows
+
+def default_horizon(today: date = None) -> date:
+    return (today or date.today()) + timedelta(weeks=SCHEDULE_HORIZON_WEEKS)
+
+def materialize(db: Session, schedule: models.RecurringSchedule, until: date) -> int:
+    """
+    Genera los bloques entre `materialized_until` y `until` con un único
+    INSERT multi-fila. El UPDATE condicional sobre `materialized_until`
+    garantiza que, si dos peticiones lo intentan a la vez, solo una inserta.
+    Devuelve cuántos bloques se crearon. No confirma la transacción.
+    """
+    start = schedule.materialized_until
+    if until <= start:
+        return 0
+    claimed = db.execute(
+        update(models.RecurringSchedule)
+        .where(models.RecurringSchedule.id == schedule.id, models.RecurringSchedule.materialized_until == start)
+        .values(materialized_until=until)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        return 0
+    schedule.materialized_until = until
+    # Las fechas que chocan con bloques cargados a mano se saltean
+    rows = conflicts.drop_overlapping(db, schedule.psychologist_id, expand(schedule, start, until))
+    if rows:
+        db.execute(insert(models.AvailabilityBlock), rows)
+    return len(rows)
+
+def _pending(until: date):
+    """
+    Series a las que les faltan semanas hasta `until`.
+    """
+    return (
+        models.RecurringSchedule.materialized_until < until,
+        or_(
+            models.RecurringSchedule.until.is_(None),
+            models.RecurringSchedule.materialized_until <= models.RecurringSchedule.until,
+        ),
+    )
+
+def delete_future_blocks(db: Session, schedule_id: int, from_datetime: datetime) -> int:
+    """
+    Borra en una sola sentencia los bloques de la serie desde `from_datetime`.
+    """
+    return db.execute(
+        delete(models.AvailabilityBlock)
+        .where(models.AvailabilityBlock.schedule_id == schedule_id, models.AvailabilityBlock.start_time >= from_datetime)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+# --- Tarea periódica ---
+
+def extend_all(until: date = None, batch: int = 200) -> int:
+    """
+    Materializa hasta `until` (por defecto el horizonte) las series de todos
+    los psicólogos, `batch` series por transacción. Devuelve cuántos bloques
+    se crearon.
+    """
+    until = until or default_horizon()
+    created = 0
+    last_id = 0
+    while True:
+        db = database.get_session()
+        try:
+            pending = db.execute(
+                select(models.RecurringSchedule)
+                .where(models.RecurringSchedule.id > last_id, *_pending(until))
+                .order_by(models.RecurringSchedule.id)
+                .limit(batch)
+            ).scalars().all()
+            if not pending:
+                return created
+            changed = set()
+            for schedule in pending:
+                # Un bloque manual creado entretanto solo frena a su serie,
+                # que se vuelve a intentar en la próxima ejecución
+                try:
+                    with db.begin_nested():
+                        blocks = materialize(db, schedule, until)
+                except IntegrityError:
+                    db.expire(schedule)
+                    continue
+                if blocks:
+                    changed.add(schedule.psychologist_id)
+                    created += blocks
+            db.commit()
+            last_id = pending[-1].id
+        finally:
+            db.close()
+        for psychologist_id in changed:
+            count_cache.invalidate(("blocks", psychologist_id))
+
+@jobs.job("schedules_extend", max_attempts=3, concurrency=1, every=SCHEDULE_EXTEND_SECONDS)
+def extend_job(payload):
+    created = extend_all()
+    jobs.logger.info("schedules_extended", extra={"blocks": created})
+
+def schedule_extend():
+    jobs.schedule_periodic("schedules_extend", SCHEDULE_EXTEND_SECONDS)
@@ -1,17 +1,58 @@
 # schemas.py - ACTUALIZADO CON PACIENTES Y CITAS
 
-from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime
+from pydantic import AfterValidator, BaseModel, field_validator, model_validator
+from typing import Annotated, Optional, List, Generic, TypeVar
+from datetime import datetime, date, time, timezone
 import models # Importamos models para poder usar el Enum
 
+T = TypeVar("T")
+
+# --- Fechas: la base guarda todo en UTC sin zona horaria ---
+
+def naive_utc(value: datetime) -> datetime:
+    """
+    Pasa un datetime con zona (`...Z`, `+00:00`, `-03:00`) a UTC sin zona,
+    que es como se guardan y comparan en la base; los que no traen zona se
+    toman como UTC.
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def naive_utc_time(value: time) -> time:
+    """
+    Igual que naive_utc para las horas de las series semanales. Si al pasar
+    a UTC la hora cae en otro día, los días de la semana ya no coincidirían.
+    """
+    if value.tzinfo is None:
+        return value
+    moment = datetime.combine(date(2000, 1, 3), value)
+    utc = naive_utc(moment)
+    if utc.date() != moment.date():
+        raise ValueError("la hora en UTC cae en otro día; envíela en UTC")
+    return utc.time()
+
+# Para parámetros de consulta y campos de entrada
+UTCDateTime = Annotated[datetime, AfterValidator(naive_utc)]
+UTCTime = Annotated[time, AfterValidator(naive_utc_time)]
+
+# --- Sobre de respuesta para listados paginados por cursor ---
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None # None cuando no hay más páginas
+    total: Optional[int] = None # Solo si se pidió include_total
+
 # --- Schemas Base ---
 class AvailabilityBlockBase(BaseModel):
-    start_time: datetime
-    end_time: datetime
+    start_time: UTCDateTime
+    end_time: UTCDateTime
 
 class AvailabilityBlockCreate(AvailabilityBlockBase):
-    pass
+    @model_validator(mode="after")
+    def check_times(self):
+        if self.start_time >= self.end_time:
+            raise ValueError("start_time debe ser anterior a end_time")
+        return self
 
 class AvailabilityBlockResponse(AvailabilityBlockBase):
     id: int
@@ -20,6 +61,57 @@ class AvailabilityBlockResponse(AvailabilityBlockBase):
     class Config:
         from_attributes = True
         
+# --- Horarios semanales recurrentes ---
+class RecurringScheduleBase(BaseModel):
+    weekdays: List[int] # 0 = lunes ... 6 = domingo
+    start_time: UTCTime
+    end_time: UTCTime
+    valid_from: date
+    until: Optional[date] = None
+
+    @field_validator("weekdays")
+    @classmethod
+    def check_weekdays(cls, value):
+        if not value or any(day < 0 or day > 6 for day in value):
+            raise ValueError("weekdays debe contener días entre 0 (lunes) y 6 (domingo)")
+        return sorted(set(value))
+
+class RecurringScheduleCreate(RecurringScheduleBase):
+    @model_validator(mode="after")
+    def check_times(self):
+        if self.start_time >= self.end_time:
+            raise ValueError("start_time debe ser anterior a end_time")
+        if self.until is not None and self.until < self.valid_from:
+            raise ValueError("until no puede ser anterior a valid_from")
+        return self
+
+class RecurringScheduleUpdate(BaseModel):
+    weekdays: Optional[List[int]] = None
+    start_time: Optional[UTCTime] = None
+    end_time: Optional[UTCTime] = None
+    until: Optional[date] = None
+
+class RecurringScheduleResponse(RecurringScheduleBase):
+    id: int
+    psychologist_id: int
+    materialized_until: date
+
+    # En la BD los días se guardan como "0,2"
+    @field_validator("weekdays", mode="before")
+    @classmethod
+    def split_weekdays(cls, value):
+        if isinstance(value, str):
+            return [int(day) for day in value.split(",") if day != ""]
+        return value
+
+    class Config:
+        from_attributes = True
+
+# Turno libre calculado por el motor de huecos (no es una fila de la BD)
+class FreeSlot(BaseModel):
+    start_time: datetime
+    end_time: datetime
+
 class PatientBase(BaseModel):
     nombre: str
     edad: Optional[int] = None
@@ -27,8 +119,8 @@ class PatientBase(BaseModel):
     telefono: Optional[str] = None
 
 class AppointmentBase(BaseModel):
-    start_time: datetime
-    end_time: datetime
+    start_time: UTCDateTime
+    end_time: UTCDateTime
     notes: Optional[str] = None
 
 # --- Schemas para Creación (lo que recibe la API) ---
@@ -39,6 +131,12 @@ class PatientCreate(PatientBase):
 class AppointmentCreate(AppointmentBase):
     patient_id: int
 
+    @model_validator(mode="after")
+    def check_times(self):
+        if self.start_time >= self.end_time:
+            raise ValueError("start_time debe ser anterior a end_time")
+        return self
+
 # --- Schemas para Actualización (lo que recibe la API en un PUT/PATCH) ---
 
 class PatientUpdate(PatientBase):
@@ -46,10 +144,18 @@ class PatientUpdate(PatientBase):
     nombre: Optional[str] = None
 
 class AppointmentUpdate(BaseModel):
-    start_time: Optional[datetime] = None
-    end_time: Optional[datetime] = None
+    start_time: Optional[UTCDateTime] = None
+    end_time: Optional[UTCDateTime] = None
     status: Optional[models.AppointmentStatus] = None # Usamos el Enum para validar
     notes: Optional[str] = None
+    # Versión leída por el cliente; si la cita cambió desde entonces -> 409
+    version: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_times(self):
+        if self.start_time and self.end_time and self.start_time >= self.end_time:
+            raise ValueError("start_time debe ser anterior a end_time")
+        return self
 
 # --- Schemas de Respuesta (lo que devuelve la API) ---
 
@@ -60,10 +166,22 @@ class PatientResponse(PatientBase):
     class Config:
         from_attributes = True
 
+# Resultado de la importación masiva de pacientes
+class PatientBulkError(BaseModel):
+    line: int
+    error: str
+
+class PatientBulkResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[PatientBulkError] # Se reportan como mucho los primeros 500
+
 class AppointmentResponse(AppointmentBase):
     id: int
     status: models.AppointmentStatus
     psychologist_id: int
+    version: int
+    video_call_link: Optional[str] = None # Lo genera la cola de tareas tras reservar
     patient: PatientResponse # Anidamos la info del paciente en la respuesta
 
     class Config:
@@ -122,4 +240,37 @@ class PsychologistPublicProfile(BaseModel):
     # Podemos añadir más campos como especialidades si las guardamos en la BBDD
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- Cola de tareas en segundo plano ---
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: models.JobStatus
+    attempts: int
+    max_attempts: int
+    run_at: datetime # Próximo intento si está pendiente
+    last_error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# --- Panel del psicólogo (resumen precalculado) ---
+
+class DashboardWeek(BaseModel):
+    week_start: date # Lunes
+    appointments: int
+    cancelled: int
+    scheduled: int # Citas todavía "agendada"
+    booked_hours: float
+    available_hours: float
+    utilization: Optional[float] = None # Horas reservadas / disponibles; None sin disponibilidad
+    cancellation_rate: Optional[float] = None # None si no hubo citas
+
+class DashboardResponse(BaseModel):
+    patient_count: int
+    upcoming_sessions: int # Agendadas desde la semana actual dentro del rango
+    weeks: List[DashboardWeek]
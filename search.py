@@ -0,0 +1,92 @@
+# search.py - BÚSQUEDA DE TEXTO COMPLETO SOBRE PERFILES DE PSICÓLOGOS
+#
+# El índice vive en la base de datos y se actualiza solo en cada escritura
+# de `profiles` (ver la migración 6 en migrations.py):
+#   - SQLite: tabla virtual FTS5 `profiles_fts` mantenida por triggers.
+#   - Postgres: columna generada `search_vector` (tsvector) con índice GIN,
+#     más un índice de trigramas sobre el nombre para tolerar errores de tipeo.
+#
+# Ambos motores devuelven un `score` donde MENOR es MEJOR, así la paginación
+# por cursor es la misma: ORDER BY score, user_id.
+
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+
+# Palabras de la consulta: letras y números (incluye acentos y ñ)
+_TERM = re.compile(r"\w+", re.UNICODE)
+# Más términos no mejoran el ranking y encarecen la consulta
+MAX_TERMS = 8
+
+# Pesos de cada columna: el nombre pesa más que la descripción
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+def terms(query: str) -> List[str]:
+    return _TERM.findall(query.lower())[:MAX_TERMS]
+
+def _sqlite_match(words: List[str]) -> str:
+    # Cada palabra entre comillas (sin sintaxis FTS5 del usuario) y como prefijo
+    return " ".join(f'"{word}"*' for word in words)
+
+def _postgres_tsquery(words: List[str]) -> str:
+    return " & ".join(f"{word}:*" for word in words)
+
+_SQLITE_SEARCH = f"""
+    SELECT * FROM (
+        SELECT p.user_id, p.nombre_completo, p.foto_url, p.descripcion,
+               bm25(profiles_fts, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}) AS score
+        FROM profiles_fts
+        JOIN profiles p ON p.id = profiles_fts.rowid
+        JOIN users u ON u.id = p.user_id
+        WHERE profiles_fts MATCH :match AND u.role = :role
+    ) ranked
+    WHERE :last_score IS NULL OR score > :last_score OR (score = :last_score AND user_id > :last_id)
+    ORDER BY score, user_id
+    LIMIT :limit
+"""
+
+_POSTGRES_SEARCH = f"""
+    SELECT * FROM (
+        SELECT p.user_id, p.nombre_completo, p.foto_url, p.descripcion,
+               -(ts_rank_cd(p.search_vector, to_tsquery('spanish', :tsquery))
+                 + similarity(p.nombre_completo, :raw)) AS score
+        FROM profiles p
+        JOIN users u ON u.id = p.user_id
+        WHERE (p.search_vector @@ to_tsquery('spanish', :tsquery) OR p.nombre_completo % :raw)
+          AND u.role = :role
+    ) ranked
+    WHERE CAST(:last_score AS double precision) IS NULL OR score > :last_score
+       OR (score = :last_score AND user_id > :last_id)
+    ORDER BY score, user_id
+    LIMIT :limit
+"""
+
+async def search_profiles(
+    db: AsyncSession, query: str, limit: int, after: Optional[Tuple[float, int]] = None
+):
+    """
+    Perfiles de psicólogos que coinciden con `query`, del más relevante al
+    menos. `after` es el (score, user_id) de la última fila de la página
+    anterior. Devuelve filas con user_id, nombre_completo, foto_url,
+    descripcion y score.
+    """
+    words = terms(query)
+    if not words:
+        return []
+    last_score, last_id = after if after is not None else (None, None)
+    params = {
+        "role": models.UserRole.PSICOLOGO.value,
+        "last_score": last_score,
+        "last_id": last_id,
+        "limit": limit,
+    }
+    if db.bind.dialect.name == "postgresql":
+        sql = _POSTGRES_SEARCH
+        params.update(tsquery=_postgres_tsquery(words), raw=" ".join(words))
+    else:
+        sql = _SQLITE_SEARCH
+        params.update(match=_sqlite_match(words))
+    return (await db.execute(text(sql), params)).all()
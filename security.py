@@ -1,13 +1,13 @@
 # security.py
-from passlib.context import CryptContext
+import hashing
 
-# Configura el contexto para el hashing de contraseñas.
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Usamos el mismo contexto y el mismo pool de procesos que auth.py.
+pwd_context = hashing.pwd_context
 
 # Función para verificar una contraseña.
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.verify_password(plain_password, hashed_password)
 
 # Función para "hashear" una contraseña.
 def get_password_hash(password):
-    return pwd_context.hash(password)
\ No newline at end of file
+    return hashing.hash_password(password)
\ No newline at end of file
@@ -0,0 +1,62 @@
+# serialization.py - SERIALIZACIÓN RÁPIDA DE RESPUESTAS
+#
+# Camino por defecto de FastAPI para un `response_model=List[X]`:
+#   validar cada objeto -> convertirlo a dict "jsonable" -> json.dumps.
+# Son tres recorridos en Python sobre la lista completa.
+#
+# Con FAST_SERIALIZATION=1:
+#   - Los listados grandes usan un TypeAdapter de pydantic v2 compilado una
+#     vez por modelo: valida desde los atributos y escribe los bytes JSON en
+#     Rust, de una sola pasada (`render`).
+#   - El resto de las respuestas usa orjson en lugar de json.dumps
+#     (`response_class`).
+# Sin la variable (o sin orjson instalado) todo sigue por el camino estándar.
+
+import os
+from functools import lru_cache
+from typing import Any
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "0").lower() in ("1", "true", "yes")
+
+def enabled() -> bool:
+    return FAST_SERIALIZATION
+
+def response_class():
+    """
+    Clase de respuesta por defecto de la app: orjson si el modo rápido está
+    activo y la librería está disponible.
+    """
+    return ORJSONResponse if FAST_SERIALIZATION and orjson is not None else JSONResponse
+
+@lru_cache(maxsize=None)
+def adapter_for(type_) -> TypeAdapter:
+    """
+    TypeAdapter por tipo de respuesta. Construirlo compila el validador y el
+    serializador, así que se hace una sola vez por tipo.
+    """
+    return TypeAdapter(type_)
+
+def dump_json(type_, data: Any) -> bytes:
+    """
+    Valida `data` (objetos ORM, filas o dicts) contra `type_` y devuelve los
+    bytes JSON, sin pasar por dicts intermedios ni json.dumps.
+    """
+    adapter = adapter_for(type_)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+def render(type_, data: Any, status_code: int = 200):
+    """
+    Para devolver desde un endpoint: en modo rápido, una Response con el JSON
+    ya serializado (FastAPI no vuelve a validarla); si no, los datos tal cual
+    para que FastAPI siga su camino normal con el `response_model`.
+    """
+    if not FAST_SERIALIZATION:
+        return data
+    return Response(content=dump_json(type_, data), status_code=status_code, media_type="application/json")
@@ -0,0 +1,164 @@
+# slots.py - MOTOR DE HUECOS LIBRES PARA LA DISPONIBILIDAD
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Sequence, Tuple
+from sqlalchemy import func, select, true, union_all, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+
+# Un intervalo es simplemente una tupla (inicio, fin) con inicio < fin
+Interval = Tuple[datetime, datetime]
+
+# --- Aritmética de intervalos ---
+# Todas las funciones asumen (y devuelven) intervalos ordenados por inicio.
+# Así cada paso es un único barrido lineal sobre la lista.
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """
+    Fusiona los intervalos que se solapan o se tocan.
+    Si la entrada ya viene ordenada (como la devuelve la consulta), el
+    ordenamiento de Python es lineal y todo el proceso es O(n).
+    """
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def subtract_intervals(free: List[Interval], busy: List[Interval]) -> List[Interval]:
+    """
+    Resta los intervalos ocupados a los libres con un barrido de dos punteros.
+    Ambas listas deben estar fusionadas y ordenadas.
+    """
+    result: List[Interval] = []
+    j = 0
+    for start, end in free:
+        # Saltamos los ocupados que terminan antes de este hueco
+        while j < len(busy) and busy[j][1] <= start:
+            j += 1
+        cursor = start
+        k = j
+        while k < len(busy) and busy[k][0] < end:
+            busy_start, busy_end = busy[k]
+            if busy_start > cursor:
+                result.append((cursor, busy_start))
+            if busy_end > cursor:
+                cursor = busy_end
+            if cursor >= end:
+                break
+            k += 1
+        if cursor < end:
+            result.append((cursor, end))
+    return result
+
+def split_into_slots(intervals: List[Interval], slot_minutes: int) -> List[Interval]:
+    """
+    Parte cada hueco libre en turnos consecutivos de `slot_minutes` minutos.
+    El resto que no llega a completar un turno se descarta.
+    """
+    step = timedelta(minutes=slot_minutes)
+    slots: List[Interval] = []
+    for start, end in intervals:
+        cursor = start
+        while cursor + step <= end:
+            slots.append((cursor, cursor + step))
+            cursor += step
+    return slots
+
+def compute_free_slots(
+    blocks: Iterable[Interval],
+    busy: Iterable[Interval],
+    slot_minutes: int,
+    window_start: datetime,
+    window_end: datetime,
+) -> List[Interval]:
+    """
+    Calcula los turnos reservables: fusiona los bloques, los recorta a la
+    ventana pedida, resta las citas y divide el resultado en turnos.
+    """
+    free = [
+        (max(start, window_start), min(end, window_end))
+        for start, end in merge_intervals(blocks)
+    ]
+    free = [(start, end) for start, end in free if start < end]
+    return split_into_slots(subtract_intervals(free, merge_intervals(busy)), slot_minutes)
+
+# --- Acceso a datos ---
+
+async def load_intervals(db: AsyncSession, psychologist_id: int, start_date: datetime, end_date: datetime):
+    """
+    Trae en UNA sola consulta los bloques de disponibilidad y las citas
+    no canceladas que se solapan con el rango pedido.
+    Devuelve (bloques, ocupados) como listas de intervalos ordenadas.
+    """
+    intervals = await load_intervals_many(db, [psychologist_id], start_date, end_date)
+    return intervals[psychologist_id]
+
+async def availability_fingerprint(db: AsyncSession, psychologist_id: int, start_date: datetime, end_date: datetime):
+    """
+    Huella barata de todo lo que define los turnos libres del rango, en una
+    sola consulta de agregados sobre los índices (psicólogo, inicio):
+    (bloques, último updated_at de bloque, citas activas, máximo id de cita,
+    suma de versiones de cita). Cualquier alta, baja o edición la cambia:
+    las citas suben `version` en cada UPDATE.
+    """
+    block = models.AvailabilityBlock
+    appointment = models.Appointment
+    blocks = select(func.count().label("blocks"), func.max(block.updated_at).label("blocks_updated_at")).where(
+        block.psychologist_id == psychologist_id,
+        block.start_time < end_date,
+        block.end_time > start_date,
+    ).subquery()
+    appointments = select(
+        func.count().label("appointments"),
+        func.max(appointment.id).label("appointments_max_id"),
+        func.sum(appointment.version).label("appointments_versions"),
+    ).where(
+        appointment.psychologist_id == psychologist_id,
+        appointment.status.notin_(models.CANCELLED_STATUSES),
+        appointment.start_time < end_date,
+        appointment.end_time > start_date,
+    ).subquery()
+    # Dos agregados de una fila cada uno: el JOIN incondicional los une en una
+    query = select(blocks, appointments).select_from(blocks.join(appointments, true()))
+    return tuple((await db.execute(query)).one())
+
+async def load_intervals_many(
+    db: AsyncSession, psychologist_ids: Sequence[int], start_date: datetime, end_date: datetime
+) -> Dict[int, Tuple[List[Interval], List[Interval]]]:
+    """
+    Igual que load_intervals pero para varios psicólogos a la vez: una sola
+    consulta con `psychologist_id IN (...)`, ordenada por psicólogo y luego
+    por inicio, que se reparte en un barrido. Devuelve
+    {psychologist_id: (bloques, ocupados)}, con listas vacías para quien
+    no tenga nada en el rango.
+    """
+    block = models.AvailabilityBlock
+    appointment = models.Appointment
+
+    blocks_q = select(block.psychologist_id, block.start_time, block.end_time, literal(False).label("busy")).where(
+        block.psychologist_id.in_(psychologist_ids),
+        block.start_time < end_date,
+        block.end_time > start_date,
+    )
+    busy_q = select(appointment.psychologist_id, appointment.start_time, appointment.end_time, literal(True).label("busy")).where(
+        appointment.psychologist_id.in_(psychologist_ids),
+        appointment.status.notin_(models.CANCELLED_STATUSES),
+        appointment.start_time < end_date,
+        appointment.end_time > start_date,
+    )
+    combined = union_all(blocks_q, busy_q).subquery()
+    rows = (await db.execute(
+        select(combined).order_by(combined.c.psychologist_id, combined.c.start_time)
+    )).all()
+
+    intervals: Dict[int, Tuple[List[Interval], List[Interval]]] = {pid: ([], []) for pid in psychologist_ids}
+    for psychologist_id, start, end, is_busy in rows:
+        blocks, busy = intervals[psychologist_id]
+        (busy if is_busy else blocks).append((start, end))
+    return intervals
@@ -0,0 +1,17 @@
+# tests/conftest.py - CONFIGURACIÓN COMÚN DE PYTEST
+#
+# Los módulos de la app viven en la raíz del repo y leen el entorno al
+# importarse, así que todo se fija acá antes de que un test importe nada:
+# base SQLite temporal, bcrypt barato y sin workers de fondo.
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}"
+os.environ.setdefault("HASH_WORKERS", "0")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("JOB_WORKERS", "0")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
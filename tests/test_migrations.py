@@ -0,0 +1,47 @@
+# tests/test_migrations.py - LAS MIGRACIONES LLEGAN AL ESQUEMA DE LOS MODELOS
+#
+# La migración 1 crea el esquema original congelado y las siguientes agregan
+# el resto. Una base nueva migrada tiene que quedar igual a la que crearía
+# `create_all` con los modelos actuales: si un cambio de modelo no tiene su
+# migración, este test lo marca.
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+import migrations
+import models
+
+def _schema(engine):
+    inspector = inspect(engine)
+    schema = {}
+    for table in inspector.get_table_names():
+        if table == "schema_migrations" or table.startswith("profiles_fts"):
+            continue
+        schema[table] = {
+            "columns": {column["name"]: (str(column["type"]), column["nullable"], str(column["default"]))
+                        for column in inspector.get_columns(table)},
+            "indexes": sorted((index["name"], tuple(index["column_names"]), bool(index["unique"]))
+                              for index in inspector.get_indexes(table)),
+            "foreign_keys": sorted((tuple(fk["constrained_columns"]), fk["referred_table"])
+                                   for fk in inspector.get_foreign_keys(table)),
+        }
+    return schema
+
+@pytest.fixture(scope="module")
+def schemas(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("schema")
+    migrated = create_engine(f"sqlite:///{directory / 'migrated.db'}")
+    created = create_engine(f"sqlite:///{directory / 'created.db'}")
+    try:
+        migrations.upgrade(migrated)
+        models.Base.metadata.create_all(bind=created)
+        yield _schema(migrated), _schema(created)
+    finally:
+        migrated.dispose()
+        created.dispose()
+
+def test_migrated_schema_matches_models(schemas):
+    migrated, created = schemas
+    assert sorted(migrated) == sorted(created)
+    for table in created:
+        assert migrated[table] == created[table], table
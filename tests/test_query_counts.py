@@ -0,0 +1,85 @@
+# tests/test_query_counts.py - LOS HISTORIALES NO HACEN UNA CONSULTA POR FILA
+#
+# Los historiales de citas anidan el paciente de cada cita. Se cuentan las
+# sentencias SQL de cada petición con la base chica y de nuevo después de
+# multiplicar las filas (en caliente y en el archivo): si los pacientes se
+# cargaran por la relación perezosa, la cuenta crecería con la página.
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+
+import database
+import main
+import migrations
+import models
+
+@pytest.fixture(scope="module")
+def client():
+    migrations.upgrade(database.get_engine())
+    return TestClient(main.app)
+
+@pytest.fixture(scope="module")
+def psychologist(client):
+    user = {"email": "historial@test.local", "password": "historial-password", "full_name": "Historial", "role": "psicologo"}
+    client.post("/register", json=user).raise_for_status()
+    token = client.post("/token", data={"username": user["email"], "password": user["password"]}).json()
+    auth = {"Authorization": f"Bearer {token['access_token']}"}
+    me = client.get("/users/me", headers=auth).json()
+    patient = client.post("/patients/", headers=auth, json={"nombre": "Paciente"}).json()
+    return auth, me["id"], patient["id"]
+
+def add_history(psychologist_id, patient_id, patients, count, first_day):
+    """
+    `count` citas completadas repartidas entre `patient_id` y `patients`
+    pacientes nuevos, la mitad en el archivo. Con pacientes nuevos, una carga
+    perezosa por cita también haría crecer la cuenta.
+    """
+    with database.get_engine().begin() as conn:
+        patient_ids = [patient_id] + [
+            conn.execute(insert(models.Patient).values(nombre=f"Paciente {first_day:%Y%m%d}-{n}", owner_id=psychologist_id))
+            .inserted_primary_key[0]
+            for n in range(patients)
+        ]
+    rows = [{
+        "psychologist_id": psychologist_id, "patient_id": patient_ids[n % len(patient_ids)],
+        "start_time": first_day + timedelta(hours=n), "end_time": first_day + timedelta(hours=n, minutes=50),
+        "status": models.AppointmentStatus.COMPLETADA.value, "version": 1,
+    } for n in range(count)]
+    with database.get_engine().begin() as conn:
+        conn.execute(insert(models.Appointment), rows[::2])
+        conn.execute(insert(models.ArchivedAppointment), [{**row, "archived_at": datetime.utcnow()} for row in rows[1::2]])
+
+def count_queries(client, url, auth):
+    """
+    (sentencias ejecutadas, citas devueltas) de un GET con página de 200.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url, headers=auth, params={"limit": 200})
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    response.raise_for_status()
+    return len(statements), len(response.json()["items"])
+
+def test_history_query_count_does_not_depend_on_rows(client, psychologist):
+    auth, psychologist_id, patient_id = psychologist
+    urls = ["/appointments/", f"/appointments/patients/{patient_id}"]
+
+    add_history(psychologist_id, patient_id, 1, 8, datetime(2024, 1, 1, 9))
+    small = {url: count_queries(client, url, auth) for url in urls}
+    add_history(psychologist_id, patient_id, 30, 300, datetime(2024, 6, 1, 9))
+    large = {url: count_queries(client, url, auth) for url in urls}
+
+    for url in urls:
+        (small_queries, small_rows), (large_queries, large_rows) = small[url], large[url]
+        assert large_rows > small_rows
+        assert small_queries == large_queries, f"{url}: {small_queries} consultas con {small_rows} citas, {large_queries} con {large_rows}"
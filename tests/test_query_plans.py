@@ -0,0 +1,25 @@
+# tests/test_query_plans.py - LAS CONSULTAS CALIENTES USAN SUS ÍNDICES
+#
+# Arma una base SQLite vacía solo con las migraciones y corre EXPLAIN QUERY
+# PLAN sobre migrations.HOT_QUERIES: si una migración pierde un índice o una
+# consulta deja de poder usarlo, el plan vuelve a ser un SCAN de la tabla.
+
+import pytest
+from sqlalchemy import create_engine
+
+import migrations
+
+@pytest.fixture(scope="module")
+def plans(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+    migrations.upgrade(engine)
+    try:
+        yield {description: (index_name, used, plan)
+               for description, index_name, used, plan in migrations.explain_hot_queries(engine)}
+    finally:
+        engine.dispose()
+
+@pytest.mark.parametrize("description", [description for description, _, _ in migrations.HOT_QUERIES])
+def test_hot_query_uses_index(plans, description):
+    index_name, used, plan = plans[description]
+    assert used, f"{description}: se esperaba {index_name}, plan: {plan}"